@@ -15,7 +15,7 @@ import cv2
 
 from .config import get_config
 from .imgutils import (
-    crop, Frame, _frame_repr, _image_region, pixel_bounding_box)
+    Frame, _frame_repr, _image_region, pixel_bounding_box, _to_grayscale)
 from .logging import debug, draw_source_region, ImageLogger
 from .mask import load_mask, MaskTypes
 from .types import Region
@@ -82,7 +82,7 @@ def is_screen_black(frame: Optional[Frame] = None,
     imglog = ImageLogger("is_screen_black", region=region, threshold=threshold)
     imglog.imwrite("source", frame)
 
-    grayframe = cv2.cvtColor(crop(frame, region), cv2.COLOR_BGR2GRAY)
+    grayframe = _to_grayscale(frame, region)
     if mask_ is not None:
         imglog.imwrite("mask", mask_)
         cv2.bitwise_and(grayframe, mask_, dst=grayframe)
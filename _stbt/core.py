@@ -11,6 +11,7 @@ from __future__ import annotations
 
 import argparse
 import datetime
+import functools
 import sys
 import typing
 import threading
@@ -22,14 +23,17 @@ from enum import Enum
 
 import cv2
 import gi
+import numpy
 
 from _stbt import cv2_compat
 from _stbt import logging
-from _stbt.config import get_config
-from _stbt.gst_utils import array_from_sample, gst_sample_make_writable
-from _stbt.imgutils import Frame
-from _stbt.logging import _Annotation, debug, warn
-from _stbt.types import Keypress, NoVideo, Region
+from _stbt.config import ConfigurationError, get_config
+from _stbt.gst_utils import (
+    array_from_sample, bgr_frame_from_sample, gst_sample_copy,
+    gst_sample_make_writable, luma_from_sample, yuv_planes_from_sample)
+from _stbt.imgutils import _LazyFrame, Frame
+from _stbt.logging import _Annotation, ddebug, debug, warn
+from _stbt.types import CaptureStats, Keypress, NoVideo, Region
 from _stbt.utils import to_unicode
 
 gi.require_version("Gst", "1.0")
@@ -81,7 +85,10 @@ def new_device_under_test_from_config(parsed_args=None):
         sink_pipeline = SinkPipeline(  # pylint: disable=redefined-variable-type
             args.sink_pipeline, raise_in_user_thread, args.save_video)
 
-    display[0] = Display(args.source_pipeline, sink_pipeline)
+    display[0] = Display(
+        args.source_pipeline, sink_pipeline,
+        analysis_size=_parse_size(get_config('frames', 'analysis_size')),
+        capture_format=get_config('frames', 'capture_format'))
     return DeviceUnderTest(
         display=display[0], control=uri_to_control(args.control, display[0]),
         sink_pipeline=sink_pipeline, mainloop=mainloop)
@@ -239,21 +246,41 @@ class DeviceUnderTest():
         timestamp = None
         first = True
 
-        while True:
-            if self._display is None:
-                debug("stbt.frames(): Video capture not initialised "
-                      "(tearing down?)")
-                return
-            frame = self._display.get_frame(
-                max(10, timeout_secs or 0), since=timestamp)
-            timestamp = frame.time
-
-            if not first and timeout_secs is not None and timestamp > end_time:
-                debug("timed out: %.3f > %.3f" % (timestamp, end_time))
-                return
+        if self._display is None:
+            debug("stbt.frames(): Video capture not initialised "
+                  "(tearing down?)")
+            return
 
-            yield frame
-            first = False
+        # Subscribe before getting the first frame so that we don't miss any
+        # frames in between.
+        with self._display.frame_bus.subscribe(
+                get_config("frames", "buffer_size", type_=int)) as frames:
+            while True:
+                if self._display is None:
+                    debug("stbt.frames(): Video capture not initialised "
+                          "(tearing down?)")
+                    return
+                if first:
+                    frame = self._display.get_frame(
+                        max(10, timeout_secs or 0))
+                else:
+                    frame = frames.get(max(10, timeout_secs or 0))
+                    if frame.time <= timestamp:
+                        # Buffered before we got the first frame
+                        continue
+                    # For the screenshot if the test fails. `get_frame` does
+                    # this for the first frame.
+                    self._display.last_used_frame = frame
+                    self._display.capture_stats.on_consumed(frame)
+                timestamp = frame.time
+
+                if (not first and timeout_secs is not None and
+                        timestamp > end_time):
+                    debug("timed out: %.3f > %.3f" % (timestamp, end_time))
+                    return
+
+                yield frame
+                first = False
 
     def get_frame(self):
         if self._display is None:
@@ -261,6 +288,12 @@ class DeviceUnderTest():
                 "stbt.get_frame(): Video capture has not been initialised")
         return self._display.get_frame()
 
+    def capture_stats(self):
+        if self._display is None:
+            raise RuntimeError(
+                "stbt.capture_stats(): Video capture has not been initialised")
+        return self._display.capture_stats.get()
+
 
 # stbt-run initialisation and convenience functions
 # (you will need these if writing your own version of stbt-run)
@@ -295,6 +328,18 @@ def argparser():
 # ===========================================================================
 
 
+def _parse_size(size):
+    """Parses "1280x720" to (1280, 720). Empty means None."""
+    if not size:
+        return None
+    try:
+        width, height = (int(x) for x in size.lower().split("x"))
+    except ValueError:
+        raise ConfigurationError(
+            "Invalid size %r: Expected WIDTHxHEIGHT, like 1280x720" % size)
+    return width, height
+
+
 @contextmanager
 def _mainloop():
     mainloop = GLib.MainLoop.new(context=None, is_running=False)
@@ -315,7 +360,7 @@ def _mainloop():
 def _draw_annotation(img, annotation):
     if not annotation.region:
         return
-    cv2.rectangle(
+    _rectangle(
         img, (annotation.region.x, annotation.region.y),
         (annotation.region.right, annotation.region.bottom), annotation.colour,
         thickness=3)
@@ -326,6 +371,62 @@ def _draw_annotation(img, annotation):
                font_scale=0.5)
 
 
+class _YUVImage():
+    """The planes of an I420 or NV12 frame, for `_draw_text` and
+    `_draw_annotation` to draw on without converting the frame to BGR.
+    """
+    def __init__(self, planes):
+        self.luma = planes[0]
+        self.chroma = planes[1:]  # (U, V) for I420, or (UV,) for NV12
+
+
+@functools.lru_cache(maxsize=32)
+def _yuv_colour(colour):
+    """Converts a BGR colour to (Y, U, V)."""
+    yuv = cv2.cvtColor(numpy.full((2, 2, 3), colour, dtype=numpy.uint8),
+                       cv2.COLOR_BGR2YUV_I420)
+    return int(yuv[0, 0]), int(yuv[2, 0]), int(yuv[2, 1])
+
+
+def _chroma_colours(img, colour):
+    _, u, v = _yuv_colour(tuple(colour))
+    if len(img.chroma) == 2:
+        return zip(img.chroma, [u, v])
+    else:
+        return [(img.chroma[0], (u, v))]
+
+
+def _half(point):
+    return (point[0] // 2, point[1] // 2)
+
+
+def _rectangle(img, pt1, pt2, color, thickness):
+    if not isinstance(img, _YUVImage):
+        cv2.rectangle(img, pt1, pt2, color, thickness=thickness)
+        return
+    cv2.rectangle(img.luma, pt1, pt2, _yuv_colour(tuple(color))[0],
+                  thickness=thickness)
+    for plane, c in _chroma_colours(img, color):
+        cv2.rectangle(plane, _half(pt1), _half(pt2), c,
+                      thickness=thickness if thickness < 0 else
+                      (thickness + 1) // 2)
+
+
+def _put_text(img, text, origin, font_scale, color):
+    if not isinstance(img, _YUVImage):
+        cv2.putText(img, text, origin, cv2.FONT_HERSHEY_DUPLEX,
+                    fontScale=font_scale, color=color,
+                    lineType=cv2_compat.LINE_AA)
+        return
+    cv2.putText(img.luma, text, origin, cv2.FONT_HERSHEY_DUPLEX,
+                fontScale=font_scale, color=_yuv_colour(tuple(color))[0],
+                lineType=cv2_compat.LINE_AA)
+    for plane, c in _chroma_colours(img, color):
+        cv2.putText(plane, text, _half(origin), cv2.FONT_HERSHEY_DUPLEX,
+                    fontScale=font_scale / 2, color=c,
+                    lineType=cv2_compat.LINE_AA)
+
+
 class _TextAnnotation(namedtuple("_TextAnnotation", "time text duration")):
     @property
     def end_time(self):
@@ -460,6 +561,14 @@ class SinkPipeline():
         Called from `Display` for each frame.
         """
         now = sample.time
+        if sample.get_caps().get_structure(0).get_value("format") != "BGR":
+            # Captured in YUV format (see `capture_format` in the `[frames]`
+            # section of stbt.conf). We draw the annotations on the YUV planes
+            # and the sink pipeline's `videoconvert` converts them, so we
+            # don't convert to BGR here. We copy the sample because we don't
+            # want to hold on to the decoder's buffers for
+            # `_sink_latency_secs`, nor draw on the frame the test script has.
+            sample = gst_sample_copy(sample)
         self._frames.appendleft(sample)
 
         while self._frames:
@@ -485,7 +594,10 @@ class SinkPipeline():
                     self.annotations.remove(annotation)
 
         sample = gst_sample_make_writable(sample)
-        img = array_from_sample(sample, readwrite=True)
+        if sample.get_caps().get_structure(0).get_value("format") == "BGR":
+            img = array_from_sample(sample, readwrite=True)
+        else:
+            img = _YUVImage(yuv_planes_from_sample(sample, readwrite=True))
         # Text:
         _draw_text(
             img,
@@ -565,22 +677,272 @@ class NoSinkPipeline():
         pass
 
 
+class FrameBus():
+    """Distributes video frames from the source pipeline to any number of
+    subscribers, such as `stbt.frames` iterators running in different threads.
+
+    Each subscriber has its own bounded ring-buffer so a slow subscriber
+    doesn't affect the others: when its buffer is full, the oldest frame is
+    discarded and counted in `FrameSubscription.dropped`. All subscribers
+    receive the same read-only `Frame` object, so there is no copying.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()  # Protects _subscribers
+        self._subscribers: "set[FrameSubscription]" = set()
+
+    def subscribe(self, buffer_size=1) -> FrameSubscription:
+        subscription = FrameSubscription(self, buffer_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, frame_or_exception):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.put(frame_or_exception)
+
+
+class FrameSubscription():
+    """A subscriber's view of a `FrameBus`. Use it as a context manager, or
+    call `close` when you're done with it.
+
+    :ivar int received: Number of frames delivered to this subscriber's
+        buffer.
+    :ivar int dropped: Number of frames discarded, without being read by
+        `get`, because the buffer was full.
+    """
+    def __init__(self, bus, buffer_size):
+        if buffer_size < 1:
+            raise ValueError("buffer_size must be >= 1 (got %r)"
+                             % (buffer_size,))
+        self._bus = bus
+        self._condition = threading.Condition()  # Protects everything below
+        self._buffer: "deque[Frame]" = deque(maxlen=buffer_size)
+        self._error: Exception | None = None
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, frame_or_exception):
+        with self._condition:
+            if isinstance(frame_or_exception, Exception):
+                self._error = frame_or_exception
+            else:
+                self._error = None
+                self.received += 1
+                if len(self._buffer) == self._buffer.maxlen:
+                    self.dropped += 1
+                self._buffer.append(frame_or_exception)
+            self._condition.notify_all()
+
+    def get(self, timeout_secs=10) -> Frame:
+        """Returns the oldest frame in the buffer, waiting for one to arrive
+        if the buffer is empty.
+
+        :raises NoVideo: If no frames arrive within `timeout_secs`, or if the
+            source pipeline reported an error.
+        """
+        import time
+        end_time = time.time() + timeout_secs
+        with self._condition:
+            while True:
+                if self._buffer:
+                    frame = self._buffer.popleft()
+                    break
+                elif isinstance(self._error, NoVideo):
+                    raise NoVideo(str(self._error))
+                elif self._error is not None:
+                    raise RuntimeError(str(self._error))
+                t = time.time()
+                if t > end_time:
+                    raise NoVideo("No frames received in %ss" % (timeout_secs,))
+                self._condition.wait(end_time - t)
+        return frame
+
+    def close(self):
+        self._bus.unsubscribe(self)
+        if self.dropped:
+            ddebug("Dropped %d of %d frames because the consumer couldn't "
+                   "keep up. See `buffer_size` in the `[frames]` section of "
+                   "stbt.conf." % (self.dropped, self.received))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, _1, _2, _3):
+        self.close()
+
+
+class _FullResolution():
+    """`Frame._full_resolution` for frames captured with `analysis_size`.
+    Converts the matching sample from the full-resolution branch of the
+    source pipeline to a BGR `Frame`, the first time it's called.
+    """
+    def __init__(self, display, time):
+        self._display = weakref.ref(display)
+        self.time = time
+        self._lock = threading.Lock()  # Protects everything below
+        self._sample: Gst.Sample | None = None
+        self._frame: Frame | None = None
+
+    def pin(self, samples):
+        """Keep a reference to our sample so that it's still available after
+        `Display` has discarded it. Call with `Display._full_res_lock` held.
+        """
+        with self._lock:
+            if self._sample is None and self._frame is None:
+                self._sample = self._find(samples)
+
+    def unpin(self):
+        with self._lock:
+            self._sample = None
+
+    def _find(self, samples):
+        for s in samples:
+            if s.time == self.time:
+                return s
+        return None
+
+    def __call__(self) -> Frame | None:
+        with self._lock:
+            if self._frame is not None:
+                return self._frame
+            sample = self._sample
+        if sample is None:
+            # Not holding `self._lock`, because `Display.last_used_frame`
+            # takes the locks in the opposite order.
+            d = self._display()
+            if d is not None:
+                with d._full_res_lock:
+                    sample = self._find(d._full_res_samples)
+        if sample is None:
+            debug("Full-resolution frame for %.3f is no longer available"
+                  % self.time)
+            return None
+        frame = bgr_frame_from_sample(sample)
+        frame.flags.writeable = False
+        with self._lock:
+            if self._frame is None:
+                self._frame = frame
+                self._sample = None
+            return self._frame
+
+
+class _CaptureStatsRecorder():
+    """Records the data for `stbt.capture_stats`.
+
+    The `on_*` methods are called for every frame, so they need to be cheap:
+    They just increment counters and append to fixed-size deques. The
+    percentiles are calculated in `get`.
+    """
+    WINDOW = 1000
+
+    def __init__(self):
+        self._lock = threading.Lock()  # Protects everything below
+        self.frames_received = 0
+        self.frames_dropped = 0
+        self.frames_consumed = 0
+        # Timestamps of recently consumed frames, so we can count each frame
+        # once. A set because with `[frames] buffer_size` > 1 a lagging
+        # consumer can get frames older than the ones that others have seen.
+        self._consumed_times: "set[float]" = set()
+        self._consumed_order: "deque[float]" = deque()
+        self._latencies: "deque[float]" = deque(maxlen=self.WINDOW)
+        self._pull_times: "deque[float]" = deque(maxlen=self.WINDOW)
+
+    def on_received(self, pull_secs):
+        with self._lock:
+            self.frames_received += 1
+            self._pull_times.append(pull_secs)
+
+    def on_dropped(self, *_args):
+        with self._lock:
+            self.frames_dropped += 1
+
+    def on_consumed(self, frame, now=None):
+        if now is None:
+            import time
+            now = time.time()
+        with self._lock:
+            # Several consumers can look at the same frame; only count it once.
+            if frame.time in self._consumed_times:
+                return
+            self._consumed_times.add(frame.time)
+            self._consumed_order.append(frame.time)
+            if len(self._consumed_order) > self.WINDOW:
+                self._consumed_times.discard(self._consumed_order.popleft())
+            self.frames_consumed += 1
+            self._latencies.append(now - frame.time)
+
+    def get(self) -> CaptureStats:
+        with self._lock:
+            latencies = list(self._latencies)
+            pull_times = list(self._pull_times)
+            received = self.frames_received
+            dropped = self.frames_dropped
+            consumed = self.frames_consumed
+
+        if latencies:
+            latency = [float(x) for x in numpy.percentile(
+                latencies, [50, 90, 99, 100])]
+        else:
+            latency = [None] * 4
+        if pull_times:
+            pull = [float(x) for x in numpy.percentile(pull_times, [50, 100])]
+        else:
+            pull = [None] * 2
+        return CaptureStats(received, dropped, consumed,
+                            max(0, received - consumed), *latency, *pull)
+
+
 class Display():
-    def __init__(self, user_source_pipeline, sink_pipeline):
+    def __init__(self, user_source_pipeline, sink_pipeline,
+                 analysis_size=None, capture_format="BGR"):
 
         import time
 
         self._condition = threading.Condition()  # Protects last_frame
+        self.frame_bus = FrameBus()
+        self.capture_stats = _CaptureStatsRecorder()
         self.last_frame = None
-        self.last_used_frame = None
         self.source_pipeline = None
         self.init_time = time.time()
         self.tearing_down = False
 
+        # With `analysis_size` we keep the most recent full-resolution samples
+        # (still in the decoder's format, not converted to BGR) so that
+        # `Frame.full_resolution` can convert them on demand. We only keep a
+        # few: holding on to more buffers could starve the decoder's buffer
+        # pool. The full-resolution branch of the tee can be a frame or two
+        # ahead of the analysis branch, so a frame that the test script holds
+        # on to would soon lose its full-resolution sample; so we also *pin*
+        # the samples of the last couple of frames handed to the test script
+        # (see `last_used_frame`). In particular that's the frame saved as the
+        # screenshot when a test fails.
+        self.analysis_size = analysis_size
+        self._full_res_lock = threading.Lock()  # Protects the 2 below
+        self._full_res_samples: "deque[Gst.Sample]" = deque(maxlen=4)
+        self._pinned: "deque[_FullResolution]" = deque(maxlen=2)
+        self._last_used_frame: Frame | None = None
+
+        if capture_format == "BGR":
+            caps_format = "BGR"
+        elif capture_format == "YUV":
+            caps_format = "{I420,NV12}"
+        else:
+            raise ConfigurationError(
+                "Invalid capture_format %r: Expected BGR or YUV"
+                % (capture_format,))
+        self.capture_format = capture_format
+
         appsink = (
             "appsink name=appsink max-buffers=1 drop=false sync=true "
             "emit-signals=true "
-            "caps=video/x-raw,format=BGR")
+            "caps=video/x-raw,format=%s" % caps_format)
         # Notes on the source pipeline:
         # * _stbt_raw_frames_queue is kept small to reduce the amount of slack
         #   (and thus the latency) of the pipeline.
@@ -590,21 +952,68 @@ class Display():
         #   have enough horse-power to decode the incoming stream and any delays
         #   will be transient otherwise it could start filling up causing
         #   increased latency.
-        self.source_pipeline_description = " ! ".join([
+        # * With `analysis_size`, the decoded video is split by a tee: The
+        #   analysis branch is scaled down *before* converting to BGR, and is
+        #   what the test script sees. The full-resolution branch is only
+        #   converted if necessary to a format that `bgr_frame_from_sample`
+        #   understands, and it's leaky so it never holds up the analysis
+        #   branch.
+        # * With `capture_format=YUV` the appsink accepts I420 or NV12, so
+        #   videoconvert is a no-op (passthrough, no copying) if the decoder
+        #   already outputs one of those formats. See `_LazyFrame`.
+        pipeline = [
             user_source_pipeline,
             'queue name=_stbt_user_data_queue max-size-buffers=0 '
             '    max-size-bytes=0 max-size-time=10000000000',
             "decodebin",
-            'queue name=_stbt_raw_frames_queue max-size-buffers=2',
-            'videoconvert',
-            'video/x-raw,format=BGR',
-            appsink])
+            'queue name=_stbt_raw_frames_queue max-size-buffers=2']
+        if analysis_size is None:
+            pipeline += [
+                'videoconvert',
+                'video/x-raw,format=%s' % caps_format,
+                appsink]
+        else:
+            pipeline += [
+                'tee name=_stbt_tee',
+                'queue name=_stbt_analysis_queue max-size-buffers=1',
+                'videoscale add-borders=false',
+                'videoconvert',
+                'video/x-raw,format=%s,width=%d,height=%d,'
+                'pixel-aspect-ratio=1/1' % (caps_format, *analysis_size),
+                appsink + " "
+                "_stbt_tee. ! queue name=_stbt_full_res_queue "
+                "    max-size-buffers=1 leaky=downstream",
+                'videoconvert',
+                'video/x-raw,format={BGR,I420,NV12}',
+                "appsink name=_stbt_full_res_appsink max-buffers=1 drop=true "
+                "sync=false emit-signals=true"]
+        self.source_pipeline_description = " ! ".join(pipeline)
         self.create_source_pipeline()
 
         self._sink_pipeline = sink_pipeline
 
         debug("source pipeline: %s" % self.source_pipeline_description)
 
+    @property
+    def last_used_frame(self) -> Frame | None:
+        """The last frame handed to the test script, by `get_frame` or
+        `stbt.frames`.
+        """
+        return self._last_used_frame
+
+    @last_used_frame.setter
+    def last_used_frame(self, frame):
+        self._last_used_frame = frame
+        full_resolution = getattr(frame, "_full_resolution", None)
+        if isinstance(full_resolution, _FullResolution):
+            with self._full_res_lock:
+                if full_resolution in self._pinned:
+                    return
+                if len(self._pinned) == self._pinned.maxlen:
+                    self._pinned[0].unpin()
+                self._pinned.append(full_resolution)
+                full_resolution.pin(self._full_res_samples)
+
     def create_source_pipeline(self):
         self.source_pipeline = Gst.parse_launch(
             self.source_pipeline_description)
@@ -615,6 +1024,11 @@ class Display():
         source_bus.add_signal_watch()
         appsink = self.source_pipeline.get_by_name("appsink")
         appsink.connect("new-sample", self.on_new_sample)
+        full_res_appsink = self.source_pipeline.get_by_name(
+            "_stbt_full_res_appsink")
+        if full_res_appsink is not None:
+            full_res_appsink.connect(
+                "new-sample", self.on_new_full_resolution_sample)
 
         # A realtime clock gives timestamps compatible with time.time()
         self.source_pipeline.use_clock(
@@ -624,8 +1038,12 @@ class Display():
         if (self.source_pipeline.set_state(Gst.State.PAUSED) ==
                 Gst.StateChangeReturn.NO_PREROLL):
             # This is a live source, drop frames if we get behind
-            self.source_pipeline.get_by_name('_stbt_raw_frames_queue') \
-                .set_property('leaky', to_unicode('downstream'))
+            raw_frames_queue = self.source_pipeline.get_by_name(
+                '_stbt_raw_frames_queue')
+            raw_frames_queue.set_property('leaky', to_unicode('downstream'))
+            # A leaky queue emits "overrun" just before it discards a buffer
+            raw_frames_queue.connect(
+                "overrun", self.capture_stats.on_dropped)
             self.source_pipeline.get_by_name('appsink') \
                 .set_property('sync', False)
 
@@ -642,19 +1060,25 @@ class Display():
 
         with self._condition:
             while True:
-                if (isinstance(self.last_frame, Frame) and
+                if (isinstance(self.last_frame, (Frame, _LazyFrame)) and
                         self.last_frame.time > since):
-                    self.last_used_frame = self.last_frame
-                    return self.last_frame
+                    frame = self.last_frame
+                    break
                 elif isinstance(self.last_frame, NoVideo):
                     raise NoVideo(str(self.last_frame))
                 elif isinstance(self.last_frame, Exception):
                     raise RuntimeError(str(self.last_frame))
                 t = time.time()
                 if t > end_time:
+                    frame = None
                     break
                 self._condition.wait(end_time - t)
 
+        if frame is not None:
+            self.last_used_frame = frame
+            self.capture_stats.on_consumed(frame)
+            return frame
+
         pipeline = self.source_pipeline
         if pipeline:
             Gst.debug_bin_to_dot_file_with_ts(
@@ -662,26 +1086,69 @@ class Display():
         raise NoVideo("No frames received in %ss" % (timeout_secs,))
 
     def on_new_sample(self, appsink):
+        import time
+        t = time.perf_counter()
         sample = appsink.emit("pull-sample")
+        self.capture_stats.on_received(time.perf_counter() - t)
 
-        running_time = sample.get_segment().to_running_time(
-            Gst.Format.TIME, sample.get_buffer().pts)
-        sample.time = float(appsink.base_time + running_time) / 1e9
+        sample.time = self._sample_time(appsink, sample)
 
         if (sample.time > self.init_time + 31536000 or
                 sample.time < self.init_time - 31536000):  # 1 year
             warn("Received frame with suspicious timestamp: %f. Check your "
                  "source-pipeline configuration." % sample.time)
 
-        frame = array_from_sample(sample)
-        frame.flags.writeable = False
+        if self.capture_format == "YUV":
+            caps = sample.get_caps().get_structure(0)
+            frame = _LazyFrame(
+                lambda: bgr_frame_from_sample(sample),
+                lambda: luma_from_sample(sample),
+                (caps.get_value("height"), caps.get_value("width"), 3),
+                sample.time)
+        else:
+            frame = array_from_sample(sample)
+            frame.flags.writeable = False
+        self._finish_frame(frame)
+        self.tell_user_thread(frame)
+        self._sink_pipeline.on_sample(sample)
+        return Gst.FlowReturn.OK
 
+    def _finish_frame(self, frame):
         # See also: logging.draw_on
         frame._draw_sink = weakref.ref(self._sink_pipeline)
-        self.tell_user_thread(frame)
-        self._sink_pipeline.on_sample(sample)
+        if self.analysis_size is not None:
+            self._set_full_resolution(frame)
+
+    @staticmethod
+    def _sample_time(appsink, sample):
+        running_time = sample.get_segment().to_running_time(
+            Gst.Format.TIME, sample.get_buffer().pts)
+        return float(appsink.base_time + running_time) / 1e9
+
+    def on_new_full_resolution_sample(self, appsink):
+        sample = appsink.emit("pull-sample")
+        # Both branches of the tee have the same timestamps, so this matches
+        # the `time` of the corresponding analysis frame:
+        sample.time = self._sample_time(appsink, sample)
+        with self._full_res_lock:
+            self._full_res_samples.append(sample)
+            # In case the test script got the analysis frame before this
+            # arrived:
+            for full_resolution in self._pinned:
+                full_resolution.pin([sample])
         return Gst.FlowReturn.OK
 
+    def _set_full_resolution(self, frame):
+        pipeline = self.source_pipeline
+        if pipeline is None:  # Tearing down
+            return
+        caps = pipeline.get_by_name("_stbt_tee") \
+            .get_static_pad("sink").get_current_caps().get_structure(0)
+        frame._scale = (frame.width / caps.get_value("width"),
+                        frame.height / caps.get_value("height"))
+
+        frame._full_resolution = _FullResolution(self, frame.time)
+
     def tell_user_thread(self, frame_or_exception):
         # `self.last_frame` is how we communicate from this thread (the GLib
         # main loop) to the main application thread running the user's script.
@@ -690,6 +1157,7 @@ class Display():
         with self._condition:
             self.last_frame = frame_or_exception
             self._condition.notify_all()
+        self.frame_bus.publish(frame_or_exception)
 
     def on_error(self, _bus, message):
         assert message.type == Gst.MessageType.ERROR
@@ -744,10 +1212,8 @@ def _draw_text(numpy_image, text, origin, color, font_scale=1.0):
     (width, height), _ = cv2.getTextSize(
         text, fontFace=cv2.FONT_HERSHEY_DUPLEX, fontScale=font_scale,
         thickness=1)
-    cv2.rectangle(
+    _rectangle(
         numpy_image, (origin[0] - 2, origin[1] + 2),
         (origin[0] + width + 2, origin[1] - height - 2),
         thickness=cv2_compat.FILLED, color=(0, 0, 0))
-    cv2.putText(
-        numpy_image, text, origin, cv2.FONT_HERSHEY_DUPLEX,
-        fontScale=font_scale, color=color, lineType=cv2_compat.LINE_AA)
+    _put_text(numpy_image, text, origin, font_scale, color)
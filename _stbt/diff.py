@@ -1,12 +1,15 @@
 from __future__ import annotations
 
+import math
 import typing
 
 import cv2
 import numpy
 from numpy.typing import NDArray
 
-from .imgutils import Frame, FrameT, crop, _frame_repr, pixel_bounding_box
+from .imgutils import (
+    Frame, FrameT, crop, _frame_repr, _image_region, pixel_bounding_box,
+    _to_grayscale)
 from .logging import debug, ddebug, ImageLogger
 from .mask import load_mask, MaskTypes
 from .types import Region, RegionT, SizeT
@@ -81,6 +84,7 @@ class Differ:
             min_size: SizeT | None = UNSET,  # type:ignore
             threshold: float = UNSET,  # type:ignore
             erode: bool | numpy.ndarray = UNSET,  # type:ignore
+            scale: float = UNSET,  # type:ignore
     ) -> Differ:
         """
         Return a new Differ with the specified parameters replaced.
@@ -130,6 +134,17 @@ class Differ:
         raise NotImplementedError(
             "%s.diff is not implemented" % self.__class__.__name__)
 
+    def diff_any(self, a, b, mask) -> MotionResult:
+        """
+        Like `diff`, but the caller only needs to know whether there is any
+        motion, so implementations may stop comparing as soon as they find
+        differences big enough to count as motion.  The returned `region` may
+        not include all the differences.
+
+        :meta private:
+        """
+        return self.diff(a, b, mask)
+
 
 class BGRDiff(Differ):
     """Compares 2 frames by calculating the color distance between them.
@@ -141,6 +156,11 @@ class BGRDiff(Differ):
     pixel wide or high. If any differences remain, the 2 frames are considered
     different.
 
+    If ``scale`` is less than 1, the frames are downsampled by this factor
+    (for example 0.5 or 0.25) before comparing them. This is much faster, at
+    the cost of missing very small differences. ``min_size`` and the
+    reported `MotionResult.region` are still in full-size frame coordinates.
+
     This is the default diffing algorithm for `detect_motion`,
     `wait_for_motion`, `press_and_wait`, `find_selection_from_background`,
     and `ocr`'s `text_color`.
@@ -151,9 +171,11 @@ class BGRDiff(Differ):
         min_size: SizeT | None = None,
         threshold: int = 25,
         erode: bool | numpy.ndarray = True,
+        scale: float = 1.0,
     ):
         self.min_size = min_size
         self.threshold = threshold
+        self.scale = _check_scale(scale)
 
         if isinstance(erode, numpy.ndarray):  # For power users
             kernel = erode
@@ -168,6 +190,7 @@ class BGRDiff(Differ):
             min_size: SizeT | None = UNSET,  # type:ignore
             threshold: float = UNSET,  # type:ignore
             erode: bool | numpy.ndarray = UNSET,  # type:ignore
+            scale: float = UNSET,  # type:ignore
     ) -> BGRDiff:
         if min_size is UNSET:
             min_size = self.min_size
@@ -175,43 +198,77 @@ class BGRDiff(Differ):
             threshold = self.threshold
         if erode is UNSET:
             erode = self.kernel
-        return self.__class__(min_size, int(threshold), erode)
+        if scale is UNSET:
+            scale = self.scale
+        return self.__class__(min_size, int(threshold), erode, scale)
 
     def preprocess_mask(
             self, mask: MaskTypes, frame_region: Region):
-        return load_mask(mask).to_array(frame_region)
+        mask_pixels, region = load_mask(mask).to_array(frame_region)
+        return _downsample_mask(mask_pixels, self.scale), region
+
+    def preprocess(self, frame, mask):
+        _, region = mask
+        return frame, _downsample(crop(frame, region), self.scale)
 
     def diff(self, a, b, mask):
+        return self._diff(a, b, mask, early_exit=False)
+
+    def diff_any(self, a, b, mask):
+        return self._diff(a, b, mask, early_exit=True)
+
+    def _diff(self, a, b, mask, early_exit):
         mask_pixels, region = mask
-        prev_frame = a
-        frame = b
+        prev_frame, cprev = a
+        frame, cframe = b
 
         imglog = ImageLogger("BGRDiff", region=region,
                              min_size=self.min_size, threshold=self.threshold)
         imglog.imwrite("source", frame)
         imglog.imwrite("previous_frame", prev_frame)
 
-        cframe = crop(frame, region)
-        cprev = crop(prev_frame, region)
-
-        d = _threshold_diff_bgr(cprev, cframe, (self.threshold ** 2) * 3,
-                                imglog, mask_pixels)
-        if mask_pixels is not None:
-            numpy.bitwise_and(d, mask_pixels[:, :, 0], out=d)
-            imglog.imwrite("mask", mask_pixels)
+        small_shape = cframe.shape
+        stop_size = (_downsample_size(self.min_size or (1, 1), small_shape,
+                                      region)
+                     if early_exit else None)
 
-        if imglog.enabled:
-            imglog.imwrite("thresholded", d * 255)
+        if self.threshold > 0:
+            area = _changed_area(cprev, cframe, self.kernel, imglog)
+        else:
+            area = UNSET  # Even identical pixels count as different
+        if area is None:
+            out_region = None
+        elif area is UNSET:
+            out_region = self._fast_bounding_box(cprev, cframe, mask_pixels,
+                                                 imglog, stop_size)
+        else:
+            out_region = self._fast_bounding_box(
+                crop(cprev, area), crop(cframe, area),
+                None if mask_pixels is None else crop(mask_pixels, area),
+                imglog, stop_size)
+            if out_region is not UNSET and out_region:
+                out_region = out_region.translate(area)
+        if out_region is UNSET:
+            d = _threshold_diff_bgr(cprev, cframe, (self.threshold ** 2) * 3,
+                                    imglog, mask_pixels)
+            if mask_pixels is not None:
+                numpy.bitwise_and(d, mask_pixels[:, :, 0], out=d)
+                imglog.imwrite("mask", mask_pixels)
 
-        if self.kernel is not None:
-            d = cv2.morphologyEx(d, cv2.MORPH_OPEN, self.kernel)
             if imglog.enabled:
-                imglog.imwrite("eroded", d * 255)
+                imglog.imwrite("thresholded", d * 255)
+
+            if self.kernel is not None:
+                d = cv2.morphologyEx(d, cv2.MORPH_OPEN, self.kernel)
+                if imglog.enabled:
+                    imglog.imwrite("eroded", d * 255)
+
+            out_region = pixel_bounding_box(d)
 
-        out_region = pixel_bounding_box(d)
         if out_region:
-            # Undo crop:
-            out_region = out_region.translate(region)
+            # Undo downsampling and crop:
+            out_region = _upsample_region(
+                out_region, small_shape, region).translate(region)
 
         motion = bool(out_region and (
             self.min_size is None or
@@ -226,6 +283,115 @@ class BGRDiff(Differ):
         imglog.html(BGRDIFF_HTML, result=result)
         return result
 
+    def _fast_bounding_box(self, a, b, mask_pixels, imglog, stop_size):
+        """Threshold, erode and bounding box in a single pass, if we don't
+        need the intermediate images for debugging and we're using the default
+        kernel. Returns `UNSET` if the fast path isn't available.
+
+        If `stop_size` isn't None we stop as soon as the bounding box is that
+        big, so the region may not include all the differences.
+        """
+        if imglog.enabled:
+            return UNSET
+        if self.kernel is not None and not numpy.array_equal(
+                self.kernel, _CROSS_KERNEL):
+            return UNSET
+        _check_bgr_images(a, b)
+        try:
+            from . import libstbt  # pyright:ignore[reportAttributeAccessIssue]
+            return libstbt.threshold_diff_bgr_bounding_box(
+                a, b, (self.threshold ** 2) * 3, mask_pixels,
+                erode=self.kernel is not None, stop_size=stop_size)
+        except (ImportError, NotImplementedError) as e:
+            debug("BGRDiff missed fast-path: %s" % e)
+            return UNSET
+
+
+_CROSS_KERNEL = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+
+
+def _changed_area(a, b, kernel, imglog) -> Region | None | type[UNSET]:
+    """The part of images `a` and `b` that we need to diff: the bounding box
+    of the pixels that are different at all, plus a margin so that the erode
+    gives the same result as it would on the whole image. Returns None if the
+    images are identical, or `UNSET` to diff the whole image (if we need the
+    intermediate images for debugging, or the fast path isn't available).
+    """
+    if imglog.enabled:
+        return UNSET
+    try:
+        from . import libstbt  # pyright:ignore[reportAttributeAccessIssue]
+        changed = libstbt.changed_bounding_box(a, b)
+    except (ImportError, NotImplementedError) as e:
+        debug("Differ missed changed-area fast-path: %s" % e)
+        return UNSET
+    if changed is None:
+        return None
+    m = 0 if kernel is None else max(kernel.shape) // 2
+    return Region.intersect(
+        _image_region(a), changed.extend(x=-m, y=-m, right=m, bottom=m))
+
+
+def _check_scale(scale: float) -> float:
+    scale = float(scale)
+    if not 0 < scale <= 1:
+        raise ValueError("scale must be > 0 and <= 1, got %r" % scale)
+    return scale
+
+
+def _downsampled_size(image: NDArray[numpy.uint8], scale: float) -> SizeT:
+    h, w = image.shape[:2]
+    return (max(1, round(w * scale)), max(1, round(h * scale)))
+
+
+def _downsample(image: NDArray[numpy.uint8], scale: float) \
+        -> NDArray[numpy.uint8]:
+    """Area-downsample `image` by `scale`."""
+    if scale == 1:
+        return image
+    w, h = _downsampled_size(image, scale)
+    # OpenCV's INTER_AREA is several times faster for halving than for other
+    # factors, so we downsample 4x by halving twice, etc.
+    while image.shape[1] >= w * 2 and image.shape[0] >= h * 2:
+        image = cv2.resize(image, (image.shape[1] // 2, image.shape[0] // 2),
+                           interpolation=cv2.INTER_AREA)
+    if image.shape[:2] != (h, w):
+        image = cv2.resize(image, (w, h), interpolation=cv2.INTER_AREA)
+    return image
+
+
+def _downsample_mask(mask_pixels: NDArray[numpy.uint8] | None, scale: float) \
+        -> NDArray[numpy.uint8] | None:
+    """Downsample a mask from `Mask.to_array`. A downsampled pixel is only
+    masked-in if all the full-size pixels that it covers were masked-in.
+    """
+    if mask_pixels is None or scale == 1:
+        return mask_pixels
+    small = cv2.resize(mask_pixels, _downsampled_size(mask_pixels, scale),
+                       interpolation=cv2.INTER_AREA)
+    small = numpy.where(small == 255, 255, 0).astype(numpy.uint8)
+    return small.reshape(small.shape[:2] + mask_pixels.shape[2:])
+
+
+def _upsample_region(r: Region, small_shape, region: Region) -> Region:
+    """Map region `r` of a downsampled image, with shape `small_shape`, back
+    to the coordinates of the full-size image of size `region`."""
+    h, w = small_shape[:2]
+    if (w, h) == (region.width, region.height):
+        return r
+    fx, fy = region.width / w, region.height / h
+    return Region(x=int(r.x * fx), y=int(r.y * fy),
+                  right=min(region.width, math.ceil(r.right * fx)),
+                  bottom=min(region.height, math.ceil(r.bottom * fy)))
+
+
+def _downsample_size(size: SizeT, small_shape, region: Region) -> SizeT:
+    """A size in the downsampled image (with shape `small_shape`) that
+    `_upsample_region` maps to at least `size` in the full-size image."""
+    h, w = small_shape[:2]
+    return (max(1, math.ceil(size[0] * w / region.width)),
+            max(1, math.ceil(size[1] * h / region.height)))
+
 
 def _threshold_diff_bgr(
         a: NDArray[numpy.uint8],
@@ -235,11 +401,7 @@ def _threshold_diff_bgr(
         mask_pixels: NDArray[numpy.uint8] | None
 ) -> NDArray[numpy.uint8]:
 
-    if a.shape[:2] != b.shape[:2]:
-        raise ValueError("Images must be the same size")
-    if (len(a.shape) < 3 or a.shape[2] != 3 or
-            len(b.shape) < 3 or b.shape[2] != 3):
-        raise ValueError("Images must be 3-channel BGR images")
+    _check_bgr_images(a, b)
     try:
         from . import libstbt  # pyright:ignore[reportAttributeAccessIssue]
         if not imglog.enabled:
@@ -250,6 +412,14 @@ def _threshold_diff_bgr(
     return _threshold_diff_bgr_numpy(a, b, threshold, imglog, mask_pixels)
 
 
+def _check_bgr_images(a, b):
+    if a.shape[:2] != b.shape[:2]:
+        raise ValueError("Images must be the same size")
+    if (len(a.shape) < 3 or a.shape[2] != 3 or
+            len(b.shape) < 3 or b.shape[2] != 3):
+        raise ValueError("Images must be 3-channel BGR images")
+
+
 def _threshold_diff_bgr_numpy(
         a: NDArray[numpy.uint8],
         b: NDArray[numpy.uint8],
@@ -319,6 +489,8 @@ class GrayscaleDiff(Differ):
 
     This was the default diffing algorithm for `wait_for_motion` and
     `press_and_wait` before v34.
+
+    ``scale`` downsamples the frames before comparing them; see `BGRDiff`.
     """
 
     def __init__(
@@ -326,9 +498,11 @@ class GrayscaleDiff(Differ):
         min_size: SizeT | None = None,
         threshold: float = 0.84,
         erode: bool | numpy.ndarray = True,
+        scale: float = 1.0,
     ):
         self.min_size = min_size
         self.threshold = threshold
+        self.scale = _check_scale(scale)
 
         if isinstance(erode, numpy.ndarray):  # For power users
             kernel = erode
@@ -343,6 +517,7 @@ class GrayscaleDiff(Differ):
             min_size: SizeT | None = UNSET,  # type:ignore
             threshold: float = UNSET,  # type:ignore
             erode: bool | numpy.ndarray = UNSET,  # type:ignore
+            scale: float = UNSET,  # type:ignore
     ) -> GrayscaleDiff:
         if min_size is UNSET:
             min_size = self.min_size
@@ -350,15 +525,19 @@ class GrayscaleDiff(Differ):
             threshold = self.threshold
         if erode is UNSET:
             erode = self.kernel
-        return self.__class__(min_size, threshold, erode)
+        if scale is UNSET:
+            scale = self.scale
+        return self.__class__(min_size, threshold, erode, scale)
 
     def preprocess_mask(
             self, mask: MaskTypes, frame_region: Region):
-        return load_mask(mask).to_array(frame_region)
+        mask_pixels, region = load_mask(mask).to_array(frame_region)
+        return _downsample_mask(mask_pixels, self.scale), region
 
     def preprocess(self, frame, mask):
         _, region = mask
-        return frame, cv2.cvtColor(crop(frame, region), cv2.COLOR_BGR2GRAY)
+        return frame, _to_grayscale(
+            frame, region, lambda img: _downsample(img, self.scale))
 
     def diff(self, a, b, mask) -> MotionResult:
         _, prev_frame_gray = a
@@ -371,28 +550,37 @@ class GrayscaleDiff(Differ):
         imglog.imwrite("source", frame)
         imglog.imwrite("gray", frame_gray)
         imglog.imwrite("previous_frame_gray", prev_frame_gray)
+        small_shape = frame_gray.shape
 
-        absdiff = cv2.absdiff(prev_frame_gray, frame_gray)
-        imglog.imwrite("absdiff", absdiff)
-
-        if mask is not None:
-            absdiff = cv2.bitwise_and(absdiff, mask)
-            imglog.imwrite("mask", mask)
-            imglog.imwrite("absdiff_masked", absdiff)
-
-        _, thresholded = cv2.threshold(
-            absdiff, int((1 - self.threshold) * 255), 255,
-            cv2.THRESH_BINARY)
-        imglog.imwrite("absdiff_threshold", thresholded)
-        if self.kernel is not None:
-            thresholded = cv2.morphologyEx(
-                thresholded, cv2.MORPH_OPEN, self.kernel)
-            imglog.imwrite("eroded", thresholded)
+        threshold = int((1 - self.threshold) * 255)
+        if threshold >= 0:
+            area = _changed_area(
+                prev_frame_gray, frame_gray, self.kernel, imglog)
+        else:
+            area = UNSET  # Even identical pixels count as different
+        if area is None:
+            out_region = None
+        else:
+            if area is not UNSET:
+                prev_frame_gray = crop(prev_frame_gray, area)
+                frame_gray = crop(frame_gray, area)
+                if mask is not None:
+                    mask = crop(mask, area)
+            thresholded, out_region = _threshold_diff_gray(
+                prev_frame_gray, frame_gray, threshold,
+                imglog, mask, need_image=self.kernel is not None)
+            if self.kernel is not None:
+                thresholded = cv2.morphologyEx(
+                    thresholded, cv2.MORPH_OPEN, self.kernel)
+                imglog.imwrite("eroded", thresholded)
+                out_region = pixel_bounding_box(thresholded)
+            if out_region and area is not UNSET:
+                out_region = out_region.translate(area)
 
-        out_region = pixel_bounding_box(thresholded)
         if out_region:
-            # Undo crop:
-            out_region = out_region.translate(region)
+            # Undo downsampling and crop:
+            out_region = _upsample_region(
+                out_region, small_shape, region).translate(region)
 
         motion = bool(out_region and (
             self.min_size is None or
@@ -409,6 +597,53 @@ class GrayscaleDiff(Differ):
         return result
 
 
+def _threshold_diff_gray(
+        a: NDArray[numpy.uint8],
+        b: NDArray[numpy.uint8],
+        threshold: int,
+        imglog: ImageLogger,
+        mask: NDArray[numpy.uint8] | None,
+        need_image: bool = True,
+) -> tuple[NDArray[numpy.uint8] | None, Region | None]:
+    """Returns the thresholded absolute difference between grayscale images
+    `a` and `b`, and its bounding box. If `need_image` is False the first
+    value may be None.
+    """
+    try:
+        from . import libstbt  # pyright:ignore[reportAttributeAccessIssue]
+        if not imglog.enabled:
+            return libstbt.threshold_diff_gray(
+                a, b, threshold, mask, output=need_image)
+    except (ImportError, NotImplementedError) as e:
+        debug("GrayscaleDiff missed fast-path: %s" % e)
+
+    return _threshold_diff_gray_numpy(a, b, threshold, imglog, mask)
+
+
+def _threshold_diff_gray_numpy(
+        a: NDArray[numpy.uint8],
+        b: NDArray[numpy.uint8],
+        threshold: int,
+        imglog: ImageLogger | None = None,
+        mask: NDArray[numpy.uint8] | None = None,
+) -> tuple[NDArray[numpy.uint8], Region | None]:
+
+    absdiff = cv2.absdiff(a, b)
+    if imglog is not None:
+        imglog.imwrite("absdiff", absdiff)
+
+    if mask is not None:
+        absdiff = cv2.bitwise_and(absdiff, mask)
+        if imglog is not None:
+            imglog.imwrite("mask", mask)
+            imglog.imwrite("absdiff_masked", absdiff)
+
+    _, thresholded = cv2.threshold(absdiff, threshold, 255, cv2.THRESH_BINARY)
+    if imglog is not None:
+        imglog.imwrite("absdiff_threshold", thresholded)
+    return thresholded, pixel_bounding_box(thresholded)
+
+
 GRAYSCALEDIFF_HTML = """\
     <h4>
       GrayscaleDiff:
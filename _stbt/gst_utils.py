@@ -2,7 +2,9 @@ import ctypes
 import sys
 from functools import reduce
 
+import cv2
 import gi
+import numpy
 
 from .gst_hacks import map_gst_sample, sample_get_size
 from .imgutils import Frame
@@ -17,14 +19,22 @@ def gst_sample_make_writable(sample):
     if sample.get_buffer().mini_object.is_writable():
         return sample
     else:
-        return Gst.Sample.new(
-            sample.get_buffer().copy_region(
-                Gst.BufferCopyFlags.FLAGS | Gst.BufferCopyFlags.TIMESTAMPS |
-                Gst.BufferCopyFlags.META | Gst.BufferCopyFlags.MEMORY, 0,
-                sample.get_buffer().get_size()),
-            sample.get_caps(),
-            sample.get_segment(),
-            sample.get_info())
+        return gst_sample_copy(sample)
+
+
+def gst_sample_copy(sample):
+    """A copy of `sample` with its own (writable) copy of the data."""
+    out = Gst.Sample.new(
+        sample.get_buffer().copy_region(
+            Gst.BufferCopyFlags.FLAGS | Gst.BufferCopyFlags.TIMESTAMPS |
+            Gst.BufferCopyFlags.META | Gst.BufferCopyFlags.MEMORY, 0,
+            sample.get_buffer().get_size()),
+        sample.get_caps(),
+        sample.get_segment(),
+        sample.get_info())
+    if hasattr(sample, 'time'):
+        out.time = sample.time
+    return out
 
 
 def sample_shape(sample):
@@ -81,6 +91,113 @@ def array_from_sample(sample, readwrite=False):
         time=getattr(sample, 'time', None))
 
 
+_YUV_TO_BGR = {
+    "I420": cv2.COLOR_YUV2BGR_I420,
+    "NV12": cv2.COLOR_YUV2BGR_NV12,
+}
+
+
+def bgr_frame_from_sample(sample):
+    """Like `array_from_sample`, but also accepts I420 and NV12 samples,
+    which are converted to BGR.
+    """
+    caps = sample.get_caps().get_structure(0)
+    fmt = caps.get_value("format")
+    if fmt == "BGR":
+        return array_from_sample(sample)
+    return Frame(
+        _yuv_planes_to_bgr(fmt, yuv_planes_from_sample(sample),
+                           caps.get_value("width"), caps.get_value("height")),
+        time=getattr(sample, 'time', None))
+
+
+def luma_from_sample(sample):
+    """The Y plane of an I420 or NV12 sample, as a 2-dimensional `Frame` that
+    shares the sample's memory (no copying).
+    """
+    return Frame(yuv_planes_from_sample(sample)[0],
+                 time=getattr(sample, 'time', None))
+
+
+def _video_layout(sample):
+    """The stride and offset of each plane of a raw video sample.
+
+    From the buffer's `GstVideoMeta` if it has one (for example from a
+    hardware decoder that pads its buffers), otherwise GStreamer's default
+    layout for the caps (which has padding too: for example I420 rows are
+    padded to a multiple of 4 bytes).
+    """
+    gi.require_version("GstVideo", "1.0")
+    from gi.repository import GstVideo  # pylint:disable=wrong-import-position
+
+    meta = GstVideo.buffer_get_video_meta(sample.get_buffer())
+    if meta is not None:
+        return list(meta.stride), list(meta.offset)
+    if hasattr(GstVideo.VideoInfo, "new_from_caps"):  # GStreamer >= 1.20
+        info = GstVideo.VideoInfo.new_from_caps(sample.get_caps())
+    else:
+        info = GstVideo.VideoInfo()
+        info.from_caps(sample.get_caps())
+    return list(info.stride), list(info.offset)
+
+
+def yuv_planes_from_sample(sample, readwrite=False):
+    """Views (without copying) of the planes of an I420 or NV12 sample:
+    ``(Y, U, V)`` for I420, or ``(Y, UV)`` for NV12 where UV has 2 channels.
+    The chroma planes are half the size of the Y plane, rounded up.
+    """
+    caps = sample.get_caps().get_structure(0)
+    fmt = caps.get_value("format")
+    if fmt not in _YUV_TO_BGR:
+        raise NotImplementedError("Can't convert %s samples to BGR" % fmt)
+    width, height = caps.get_value("width"), caps.get_value("height")
+    strides, offsets = _video_layout(sample)
+    data = array_from_sample(sample, readwrite)
+
+    def plane(i, w, h, channels=1):
+        end = offsets[i] + strides[i] * (h - 1) + w * channels
+        if end > data.size:
+            raise ValueError(
+                "%s sample is too small for %ix%i: plane %i ends at %iB > %iB"
+                % (fmt, width, height, i, end, data.size))
+        shape, byte_strides = (h, w), (strides[i], 1)
+        if channels > 1:
+            shape, byte_strides = (h, w, channels), (strides[i], channels, 1)
+        return numpy.lib.stride_tricks.as_strided(
+            data[offsets[i]:], shape, byte_strides, writeable=readwrite)
+
+    cw, ch = (width + 1) // 2, (height + 1) // 2
+    if fmt == "I420":
+        return (plane(0, width, height), plane(1, cw, ch), plane(2, cw, ch))
+    else:
+        return (plane(0, width, height), plane(1, cw, ch, channels=2))
+
+
+def _yuv_planes_to_bgr(fmt, planes, width, height):
+    y = planes[0]
+    if width % 2 or height % 2:
+        # OpenCV only converts even sizes. The chroma planes are already
+        # rounded up, so extend the Y plane to match & crop the result.
+        y = cv2.copyMakeBorder(y, 0, height % 2, 0, width % 2,
+                               cv2.BORDER_REPLICATE)
+    h, w = y.shape
+    if fmt == "NV12":
+        bgr = cv2.cvtColorTwoPlane(y, planes[1], cv2.COLOR_YUV2BGR_NV12)
+    else:
+        # `cvtColor` wants the 3 planes packed one after the other, without
+        # any padding:
+        packed = numpy.empty((h * 3 // 2, w), dtype=numpy.uint8)
+        flat = packed.reshape(-1)
+        n = h * w
+        flat[:n].reshape(h, w)[...] = y
+        flat[n:n * 5 // 4].reshape(h // 2, w // 2)[...] = planes[1]
+        flat[n * 5 // 4:].reshape(h // 2, w // 2)[...] = planes[2]
+        bgr = cv2.cvtColor(packed, cv2.COLOR_YUV2BGR_I420)
+    if (h, w) != (height, width):
+        bgr = numpy.ascontiguousarray(bgr[:height, :width])
+    return bgr
+
+
 def test_that_array_from_sample_readonly_gives_a_readonly_array():
     Gst.init([])
     s = Gst.Sample.new(Gst.Buffer.new_wrapped(b"hello"),
@@ -112,6 +229,49 @@ def test_that_array_from_sample_dimensions_of_array_are_according_to_caps():
     assert a.shape == (3, 4, 3)
 
 
+def test_yuv_samples_with_padding_and_odd_sizes():
+    # GStreamer's default layout pads each row to a multiple of 4 bytes, and
+    # the chroma planes of odd-sized frames are rounded up.
+    rng = numpy.random.default_rng(0)
+    for width, height in [(6, 4), (7, 5)]:
+        cw, ch = (width + 1) // 2, (height + 1) // 2
+        y = rng.integers(16, 235, (height, width), dtype=numpy.uint8)
+        u = rng.integers(16, 240, (ch, cw), dtype=numpy.uint8)
+        v = rng.integers(16, 240, (ch, cw), dtype=numpy.uint8)
+
+        # Expected: Convert the unpadded, even-sized planes.
+        y_even = cv2.copyMakeBorder(y, 0, ch * 2 - height, 0, cw * 2 - width,
+                                    cv2.BORDER_REPLICATE)
+        expected = cv2.cvtColor(
+            numpy.concatenate([y_even.ravel(), u.ravel(), v.ravel()])
+            .reshape(ch * 3, cw * 2), cv2.COLOR_YUV2BGR_I420)[:height, :width]
+
+        def pad(plane, stride):
+            plane = plane.reshape(plane.shape[0], -1)
+            return numpy.pad(
+                plane, ((0, 0), (0, stride - plane.shape[1]))).tobytes()
+
+        def round_up_4(n):
+            return (n + 3) // 4 * 4
+
+        i420 = (pad(y, round_up_4(width)) +
+                (b"\0" * round_up_4(width) if height % 2 else b"") +
+                pad(u, round_up_4(cw)) + pad(v, round_up_4(cw)))
+        nv12 = (pad(y, round_up_4(width)) +
+                (b"\0" * round_up_4(width) if height % 2 else b"") +
+                pad(numpy.dstack([u, v]), round_up_4(width)))
+        for fmt, data in [("I420", i420), ("NV12", nv12)]:
+            sample = Gst.Sample.new(
+                Gst.Buffer.new_wrapped(data),
+                Gst.Caps.from_string("video/x-raw,format=%s,width=%i,height=%i"
+                                     % (fmt, width, height)),
+                None, None)
+            assert numpy.array_equal(luma_from_sample(sample), y)
+            bgr = bgr_frame_from_sample(sample)
+            assert bgr.shape == (height, width, 3)
+            assert numpy.array_equal(bgr, expected), fmt
+
+
 def frames_to_video(outfilename, frames, caps="image/svg",
                     container="ts"):
     """Given a list (or generator) of video frames generates a video and writes
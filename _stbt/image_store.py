@@ -0,0 +1,172 @@
+"""
+A store of decoded reference images, so that `stbt.load_image` (and
+`stbt.match` etc.) don't have to decode the PNG files every time a test runs.
+
+`stbt precompile-images` decodes every PNG in a test-pack into a single file
+called ``.stbt-images`` at the root of the test-pack. `load_image` looks for
+this file in the image's directory and its parents; if the image is in the
+store, and it hasn't been modified since the store was created, the image is
+read from the store without copying: it's a numpy array backed by a read-only
+memory-mapping of the file. Concurrent test processes share the same pages of
+memory.
+
+The file format is:
+
+* 8 bytes: Magic number `MAGIC`.
+* 16 bytes: Offset and size of the index (two little-endian uint64s).
+* The pixel data of each image, aligned to `ALIGNMENT` bytes.
+* The index: JSON of ``{"images": {relative_filename: {...}}}``, where
+  filenames are relative to the directory containing the store, so the
+  test-pack can be moved. Each image records the file's ``mtime_ns`` and
+  ``size`` (we ignore the stored image if these don't match the file on disk),
+  and the ``offset`` and ``shape`` of its pixel data.
+
+Images are stored as `load_image` returns them with the default
+``color_channels=(3, 4)``: 3-channel BGR, or BGRA with the alpha channel
+normalised to 0 or 255. Other values of ``color_channels`` read the PNG as
+usual.
+"""
+
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+import threading
+
+import numpy
+
+from .logging import debug
+
+FILENAME = ".stbt-images"
+MAGIC = b"STBTIMG1"
+ALIGNMENT = 64
+
+_HEADER = struct.Struct("<8sQQ")
+
+
+class ImageStore():
+    def __init__(self, filename):
+        self.filename = filename
+        self.root = os.path.dirname(os.path.abspath(filename))
+        with open(filename, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, index_offset, index_size = _HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError("%s isn't an image store (or it was created by "
+                             "a different version of stb-tester)" % filename)
+        self._index = json.loads(
+            self._mmap[index_offset:index_offset + index_size])["images"]
+
+    def __len__(self):
+        return len(self._index)
+
+    def get(self, absolute_filename, mtime_ns, size) -> numpy.ndarray | None:
+        """Returns the decoded image, or None if it isn't in the store or the
+        file has been modified since the store was created.
+        """
+        entry = self._index.get(
+            os.path.relpath(absolute_filename, self.root))
+        if (entry is None or entry["mtime_ns"] != mtime_ns or
+                entry["size"] != size):
+            return None
+        shape = tuple(entry["shape"])
+        return numpy.frombuffer(
+            self._mmap, dtype=numpy.uint8, count=int(numpy.prod(shape)),
+            offset=entry["offset"]).reshape(shape)
+
+
+_stores: dict[str, ImageStore | None] = {}
+_stores_lock = threading.Lock()
+
+
+def find_store(directory) -> ImageStore | None:
+    """The `ImageStore` in `directory` or its nearest parent directory, if
+    any. Cached, so a store created while this process is running won't be
+    noticed.
+    """
+    with _stores_lock:
+        visited = []
+        store = None
+        d = directory
+        while True:
+            if d in _stores:
+                store = _stores[d]
+                break
+            visited.append(d)
+            filename = os.path.join(d, FILENAME)
+            if os.path.isfile(filename):
+                try:
+                    store = ImageStore(filename)
+                    debug("Using image store %s (%d images)"
+                          % (filename, len(store)))
+                except (OSError, ValueError) as e:
+                    debug("Ignoring image store %s: %s" % (filename, e))
+                break
+            parent = os.path.dirname(d)
+            if parent == d:
+                break
+            d = parent
+        for v in visited:
+            _stores[v] = store
+        return store
+
+
+def get(absolute_filename, mtime_ns, size) -> numpy.ndarray | None:
+    store = find_store(os.path.dirname(absolute_filename))
+    if store is None:
+        return None
+    return store.get(absolute_filename, mtime_ns, size)
+
+
+def build(root, output=None) -> tuple[int, int]:
+    """Decodes every PNG file under the directory `root` into a new store.
+
+    :returns: The number of images stored and their size in bytes.
+    """
+    from .imgutils import _imread
+
+    root = os.path.abspath(root)
+    if output is None:
+        output = os.path.join(root, FILENAME)
+    store_root = os.path.dirname(os.path.abspath(output))
+
+    index = {}
+    tmp = output + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, 0, 0))
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+            for name in sorted(filenames):
+                if not name.lower().endswith(".png"):
+                    continue
+                filename = os.path.join(dirpath, name)
+                st = os.stat(filename)
+                try:
+                    img = _imread(filename, (3, 4))
+                except (IOError, ValueError) as e:
+                    debug("stbt precompile-images: Skipping %s: %s"
+                          % (filename, e))
+                    continue
+                offset = -f.tell() % ALIGNMENT + f.tell()
+                f.seek(offset)
+                f.write(numpy.ascontiguousarray(img).data)
+                index[os.path.relpath(filename, store_root)] = {
+                    "mtime_ns": st.st_mtime_ns,
+                    "size": st.st_size,
+                    "shape": list(img.shape),
+                    "offset": offset,
+                }
+        index_offset = f.tell()
+        index_bytes = json.dumps({"images": index}, sort_keys=True).encode()
+        f.write(index_bytes)
+        data_size = index_offset
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, index_offset, len(index_bytes)))
+    # Atomic, so test processes that are already using the old store can
+    # carry on using it.
+    os.replace(tmp, output)
+    with _stores_lock:
+        _stores.clear()
+    return len(index), data_size
@@ -14,7 +14,12 @@ import inspect
 import itertools
 import json
 import os
+import struct
 import sys
+import threading
+import time
+import zlib
+from collections import namedtuple, OrderedDict
 from contextlib import contextmanager
 from itertools import zip_longest
 
@@ -26,13 +31,12 @@ try:
 except ImportError:
     lmdb = None
 
+from _stbt.config import get_config
 from _stbt.logging import ImageLogger
 from _stbt.utils import mkdir_p, named_temporary_directory, scoped_curdir
 
 
-MAX_CACHE_SIZE_BYTES = 1024 * 1024 * 1024  # 1GiB
 _cache = None
-_cache_full_warning = None
 _enabled = False
 
 
@@ -42,33 +46,109 @@ default_filename = "%s/%s" % (
 
 
 @contextmanager
-def setup_cache(filename=None):
+def setup_cache(filename=None, memory_only=False):
     """Set up the cache. Typically called by stbt-run before running your test.
 
     This is safe to call if lmdb isn't installed; in that case it'll be a
     no-op.
 
+    Results are cached in memory as well as on disk, so that repeated calls
+    with the same arguments (such as `ocr` on a screen that isn't changing,
+    in a `wait_until` loop) don't need to read from disk. The size of the
+    in-memory cache is set by ``memory_size_mb`` in the ``[imgproc_cache]``
+    section of stbt.conf, and the maximum size of the on-disk cache by
+    ``max_size_mb``. When the on-disk cache is nearly full, the least
+    recently used entries are evicted.
+
     :param str filename: Defaults to $XDG_CACHE_HOME/stbt/cache.lmdb (or
         $HOME/.cache/stbt/cache.lmdb if XDG_CACHE_HOME isn't set).
+    :param bool memory_only: Don't use the on-disk cache at all; results are
+        only cached in memory for the lifetime of this context manager.
     """
     if lmdb is None or os.environ.get('STBT_DISABLE_CACHING'):
         yield
         return
 
     global _cache
-    global _cache_full_warning
 
-    if filename is None:
-        filename = default_filename
-    mkdir_p(os.path.dirname(filename) or ".")
-    with lmdb.open(filename, map_size=MAX_CACHE_SIZE_BYTES) as db:
+    memory_size = get_config("imgproc_cache", "memory_size_mb",
+                             type_=int) * 1024 * 1024
+    if memory_only:
         assert _cache is None
         try:
-            _cache = db
-            _cache_full_warning = False
+            _cache = _TieredCache(None, memory_size)
             yield
         finally:
             _cache = None
+        return
+
+    with _open(filename) as db:
+        assert _cache is None
+        try:
+            _cache = _TieredCache(db, memory_size)
+            yield
+        finally:
+            try:
+                _cache.flush()
+            finally:
+                _cache = None
+
+
+def _max_size():
+    return get_config("imgproc_cache", "max_size_mb", type_=int) * 1024 * 1024
+
+
+def _open(filename=None, max_size=None):
+    """Opens the on-disk cache, creating it if necessary.
+
+    Values are stored in the "values" database; the time each value was last
+    read or written is stored under the same key in the "atime" database.
+    """
+    if filename is None:
+        filename = default_filename
+    if max_size is None:
+        max_size = _max_size()
+    mkdir_p(os.path.dirname(filename) or ".")
+    db = lmdb.open(filename, map_size=max_size, max_dbs=len(_DB_NAMES),
+                   max_readers=_MAX_READERS)
+    try:
+        # Free the reader slots of processes that died without closing the
+        # database, so they don't run out when many processes share it.
+        db.reader_check()
+        with db.begin() as txn:
+            legacy = (txn.stat()["entries"] > 0 and
+                      txn.get(_DB_NAMES[0]) is None)
+        if legacy:
+            with db.begin(write=True) as txn:
+                # Created by an older version of stbt, that stored the values
+                # directly in the main database, without access times.
+                txn.drop(db.open_db(None, txn=txn), delete=False)
+        for name in _DB_NAMES:
+            db.open_db(name)
+    except Exception:
+        db.close()
+        raise
+    return db
+
+
+_DB_NAMES = (b"values", b"atime")
+
+# Each concurrent read transaction (across all the processes using the cache)
+# needs a slot in LMDB's lock file. LMDB's default is 126.
+_MAX_READERS = 1024
+
+# See `_TieredCache`.
+_WRITE_BATCH_SECS = 1.0
+_WRITE_BATCH_SIZE = 64
+
+# We only update an entry's access time on disk when reading it if the stored
+# time is older than this, to avoid a write transaction on every cache hit.
+_ATIME_RESOLUTION_SECS = 60 * 60
+
+# When the on-disk cache is more than `_EVICT_AT` full we evict the least
+# recently used entries until it is `_EVICT_TO` full.
+_EVICT_AT = 0.9
+_EVICT_TO = 0.7
 
 
 @contextmanager
@@ -101,9 +181,9 @@ def memoize(additional_fields=None):
 
     * The decorated function's arguments must be simple JSON serialisable
       values or an image in the form of a numpy.ndarray.
-    * The return value from the function must be JSON serialisable and should
-      be round-trippable via JSON. This means that unicode objects should be
-      returned rather than string objects.
+    * The return value from the function must be made of the same types that
+      JSON supports (None, bool, int, float, str, lists and dicts). Tuples
+      (including namedtuples) are returned as lists when read from the cache.
     * For the sake of speed we use a non-cryptographic hash function.  This
       means someone could deliberately cause a hash-collision by carefully
       constructing arguments to your function.  Don't use memoize on functions
@@ -142,12 +222,11 @@ def memoize(additional_fields=None):
             except NotCachable:
                 return f(*args, **kwargs)
 
-            with _cache.begin() as txn:
-                out = txn.get(key)
-            if out is not None:
-                return json.loads(out)
+            out = _cache.get(key)
+            if out is not _MISSING:
+                return out
             output = f(**full_kwargs)
-            _cache_put(key, output)
+            _cache.put(key, output)
             return output
 
         return inner
@@ -177,91 +256,588 @@ def memoize_iterator(additional_fields=None):
                     yield x
                 return
 
-            for i in itertools.count():
-                with _cache.begin() as txn:
-                    out = txn.get(key + str(i).encode())
-                if out is None:
-                    break
-                out_, stop_ = json.loads(out)
-                if stop_:
-                    return
-                yield out_
+            cached = _cache.get(key)
+            if cached is _MISSING:
+                outputs, complete = [], False
+            else:
+                outputs, complete = cached
+            for x in outputs:
+                yield x
+            if complete:
+                return
 
-            skip = i  # pylint:disable=undefined-loop-variable
-            it = f(**full_kwargs)
-            for i in itertools.count():
-                try:
-                    output = next(it)
+            # All the outputs are stored in a single record, which we write
+            # when the iterator is exhausted or when the caller stops iterating
+            # early (`GeneratorExit`). In the latter case we store the partial
+            # results, and next time we run `f` again to get the rest.
+            outputs = list(outputs)
+            skip = len(outputs)
+            try:
+                for i, x in enumerate(f(**full_kwargs)):
                     if i >= skip:
-                        _cache_put(key + str(i).encode(), [output, None])
-                        yield output
-                except StopIteration:
-                    _cache_put(key + str(i).encode(), [None, "StopIteration"])
-                    return
+                        outputs.append(x)
+                        yield x
+                complete = True
+            finally:
+                if complete or len(outputs) > skip:
+                    _cache.put(key, [outputs, complete])
 
         return inner
     return decorator
 
 
-def _cache_put(key, value):
-    try:
-        with _cache.begin(write=True) as txn:
-            txn.put(key, json.dumps(value).encode("utf-8"))
-    except (lmdb.MapFullError, lmdb.DiskError):
-        global _cache_full_warning
-        if not _cache_full_warning:
-            sys.stderr.write(
-                "Image processing cache is full.  This will "
-                "cause degraded performance.  Consider "
-                "deleting the cache file (%s) to purge old "
-                "results\n" % _cache.path())
-            _cache_full_warning = True
+_MISSING = object()
 
 
-class NotCachable(Exception):
-    pass
+class _TieredCache():
+    """An in-memory LRU cache in front of the on-disk LMDB database.
+
+    Values are stored in memory in their decoded form (after a round-trip
+    through `_encode_value`, so that they're the same as values read from
+    disk), so a hit in the in-memory cache doesn't need a LMDB transaction or
+    decoding. This means that callers mustn't modify the returned values.
+
+    The on-disk database can be shared by many processes (for example several
+    ``stbt run`` processes testing different devices on the same host). LMDB
+    only allows one write transaction at a time across all the processes, so
+    we batch writes (new values and access-time updates) and write them in a
+    single transaction every `_WRITE_BATCH_SECS` or `_WRITE_BATCH_SIZE`
+    entries, and when the cache is closed (see `flush`).
+
+    :param db: The `lmdb.Environment` (see `_open`), or None to cache in
+        memory only.
+    :param int memory_size: Maximum size of the in-memory cache, in bytes
+        (measured as the size of the encoded values).
+    """
+    def __init__(self, db, memory_size):
+        self.db = db
+        self.memory_size = memory_size
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (value, nbytes)
+        self._memory_nbytes = 0
+        # Writes that haven't been flushed to disk yet: key -> encoded value,
+        # or None if we only need to update the access time.
+        self._pending = {}
+        self._pending_since = None
+        self._full_warning = False
+
+    def get(self, key):
+        """Returns the cached value, or `_MISSING`."""
+        with self._lock:
+            x = self._memory.get(key)
+            if x is not None:
+                self._memory.move_to_end(key)
+                return x[0]
+            out = self._pending.get(key)
+        if self.db is None:
+            return _MISSING
+        if out is None:
+            with self.db.begin() as txn:
+                values, atimes = _databases(self.db, txn)
+                out = txn.get(key, db=values)
+                atime = txn.get(key, db=atimes)
+            if out is None or not out.startswith(_VALUE_FORMAT):
+                # Missing, or written by an older version of stbt.
+                return _MISSING
+            if (atime is None or
+                    time.time() - _unpack_time(atime) > _ATIME_RESOLUTION_SECS):
+                self._queue_write(key, None)
+        value = _decode_value(out)
+        self._remember(key, value, len(out))
+        return value
+
+    def put(self, key, value):
+        out = _encode_value(value)
+        self._remember(key, _decode_value(out), len(out))
+        if self.db is None:
+            return
+        self._queue_write(key, out)
+
+    def _queue_write(self, key, out):
+        now = time.time()
+        with self._lock:
+            if out is not None or key not in self._pending:
+                self._pending[key] = out
+            if self._pending_since is None:
+                self._pending_since = now
+            flush = (len(self._pending) >= _WRITE_BATCH_SIZE or
+                     now - self._pending_since >= _WRITE_BATCH_SECS)
+        if flush:
+            self.flush()
+
+    def flush(self):
+        """Write any pending values and access times to disk."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._pending_since = None
+        if not pending or self.db is None:
+            return
+        now = _pack_time(time.time())
+        max_size = self.db.info()["map_size"]
+
+        def write(txn):
+            values, atimes = _databases(self.db, txn)
+            for key, out in pending.items():
+                if out is not None:
+                    txn.put(key, out, db=values)
+                elif txn.get(key, db=values) is None:
+                    continue  # Evicted by another process
+                txn.put(key, now, db=atimes)
+            # We check the size and evict in the same transaction, so if
+            # several processes fill the cache at the same time only the first
+            # one evicts.
+            if _used_size(self.db, txn) > max_size * _EVICT_AT:
+                _evict(self.db, txn, max_size * _EVICT_TO)
+
+        self._write(write)
+
+    def _write(self, f):
+        try:
+            # `flush` evicts old entries before the cache is full, but the free
+            # space in the LMDB file can be fragmented, so we might need to
+            # evict more entries to find space for a large value.
+            for target in (_EVICT_TO / 2, 0., None):
+                try:
+                    with self.db.begin(write=True) as txn:
+                        f(txn)
+                    return
+                except lmdb.MapFullError:
+                    if target is None:
+                        raise
+                    with self.db.begin(write=True) as txn:
+                        _evict(self.db, txn,
+                               self.db.info()["map_size"] * target)
+        except (lmdb.MapFullError, lmdb.DiskError):
+            if not self._full_warning:
+                sys.stderr.write(
+                    "Image processing cache is full.  This will "
+                    "cause degraded performance.  Consider "
+                    "running `stbt cache clear` to purge old "
+                    "results from %s\n" % self.db.path())
+                self._full_warning = True
+
+    def _remember(self, key, value, nbytes):
+        if nbytes > self.memory_size:
+            return
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_nbytes -= old[1]
+            self._memory[key] = (value, nbytes)
+            self._memory_nbytes += nbytes
+            while self._memory_nbytes > self.memory_size:
+                _, (_, n) = self._memory.popitem(last=False)
+                self._memory_nbytes -= n
+
+
+# Prefix of every value stored on disk. Change the version number if you change
+# the encoding, so that values written by older versions of stbt are ignored.
+# Values written by stbt v34 and earlier were JSON, which can't start with NUL.
+_VALUE_FORMAT = b"\x00\x01"
+
+# Strings longer than this (such as hOCR output) are compressed.
+_COMPRESS_MIN_BYTES = 4096
+
+_u32 = struct.Struct("<I")
+_i64 = struct.Struct("<q")
+_f64 = struct.Struct("<d")
+
+
+def _encode_value(value):
+    """Encode the return value of a memoized function for storage on disk.
+
+    Supports the same types as JSON (None, bool, int, float, str, lists/tuples
+    and dicts) and, like JSON, tuples are decoded as lists. Unlike JSON we
+    don't need to escape strings (or to unescape them when decoding), and long
+    strings are compressed with zlib.
+    """
+    out = [_VALUE_FORMAT]
+    _encode_value_into(value, out)
+    return b"".join(out)
 
 
-class _ArgsEncoder(json.JSONEncoder):
-    def default(self, o):  # pylint:disable=method-hidden
-        from _stbt.imgutils import Color
-        from _stbt.match import MatchParameters
-        if isinstance(o, ImageLogger):
-            if o.enabled:
-                raise NotCachable()
-            return None
-        elif isinstance(o, set):
-            return sorted(o)
-        elif isinstance(o, Color):
-            return o.hexstring
-        elif isinstance(o, MatchParameters):
-            return {
-                "match_method": o.match_method.value,
-                "match_threshold": o.match_threshold,
-                "confirm_method": o.confirm_method.value,
-                "confirm_threshold": o.confirm_threshold,
-                "erode_passes": o.erode_passes}
-        elif isinstance(o, numpy.ndarray):
-            h = Xxhash64()
-            h.update(numpy.ascontiguousarray(o).data)
-            return (o.shape, h.hexdigest())
+def _encode_value_into(o, out):
+    if isinstance(o, str):
+        b = o.encode("utf-8")
+        if len(b) >= _COMPRESS_MIN_BYTES:
+            b = zlib.compress(b, 1)
+            out.append(b"z")
         else:
-            json.JSONEncoder.default(self, o)
+            out.append(b"s")
+        out.append(_u32.pack(len(b)))
+        out.append(b)
+    elif o is None:
+        out.append(b"n")
+    elif o is True:
+        out.append(b"t")
+    elif o is False:
+        out.append(b"f")
+    elif isinstance(o, int):
+        if -2**63 <= o < 2**63:
+            out.append(b"i")
+            out.append(_i64.pack(o))
+        else:
+            b = str(int(o)).encode()
+            out.append(b"I")
+            out.append(_u32.pack(len(b)))
+            out.append(b)
+    elif isinstance(o, float):
+        out.append(b"d")
+        out.append(_f64.pack(o))
+    elif isinstance(o, (list, tuple)):
+        out.append(b"l")
+        out.append(_u32.pack(len(o)))
+        for x in o:
+            _encode_value_into(x, out)
+    elif isinstance(o, dict):
+        out.append(b"m")
+        out.append(_u32.pack(len(o)))
+        for k, v in o.items():
+            _encode_value_into(k, out)
+            _encode_value_into(v, out)
+    elif isinstance(o, numpy.generic):
+        _encode_value_into(o.item(), out)
+    else:
+        raise TypeError(
+            "Object of type %s can't be stored in the cache"
+            % type(o).__name__)
+
+
+def _decode_value(data):
+    assert data.startswith(_VALUE_FORMAT)
+    value, offset = _decode_value_from(memoryview(data), len(_VALUE_FORMAT))
+    assert offset == len(data)
+    return value
+
+
+def _decode_value_from(data, offset):
+    """Returns the decoded value and the offset of the next value."""
+    tag = data[offset]
+    offset += 1
+    if tag in b"szI":
+        length, = _u32.unpack_from(data, offset)
+        offset += _u32.size
+        b = data[offset:offset + length]
+        if tag == ord("z"):
+            b = zlib.decompress(b)
+        s = str(b, "utf-8")
+        return (int(s) if tag == ord("I") else s), offset + length
+    elif tag == ord("n"):
+        return None, offset
+    elif tag == ord("t"):
+        return True, offset
+    elif tag == ord("f"):
+        return False, offset
+    elif tag == ord("i"):
+        return _i64.unpack_from(data, offset)[0], offset + _i64.size
+    elif tag == ord("d"):
+        return _f64.unpack_from(data, offset)[0], offset + _f64.size
+    elif tag == ord("l"):
+        n, = _u32.unpack_from(data, offset)
+        offset += _u32.size
+        out = []
+        for _ in range(n):
+            x, offset = _decode_value_from(data, offset)
+            out.append(x)
+        return out, offset
+    elif tag == ord("m"):
+        n, = _u32.unpack_from(data, offset)
+        offset += _u32.size
+        d = {}
+        for _ in range(n):
+            k, offset = _decode_value_from(data, offset)
+            d[k], offset = _decode_value_from(data, offset)
+        return d, offset
+    else:
+        raise ValueError("Invalid value in cache: Unknown tag %r" % chr(tag))
+
+
+def _databases(db, txn):
+    # `open_db` is cheap if the database has already been opened. We pass
+    # `txn` because otherwise `open_db` starts its own write transaction, which
+    # would deadlock if we're already in one.
+    return tuple(db.open_db(name, txn=txn) for name in _DB_NAMES)
+
+
+def _pack_time(t):
+    return struct.pack("<d", t)
+
+
+def _unpack_time(data):
+    return struct.unpack("<d", data)[0]
+
+
+def _used_size(db, txn):
+    """Bytes used by the live entries in the on-disk cache."""
+    total = 0
+    for d in (db.open_db(None, txn=txn),) + _databases(db, txn):
+        s = txn.stat(d)
+        total += s["psize"] * (
+            s["branch_pages"] + s["leaf_pages"] + s["overflow_pages"])
+    return total
+
+
+def _entries(db, txn):
+    """Yields ``(atime, key, nbytes)`` for every entry in the on-disk cache.
+
+    ``nbytes`` is an estimate of the disk space used by the entry.
+    """
+    values, atimes = _databases(db, txn)
+    for key, value in txn.cursor(db=values):
+        atime = txn.get(key, db=atimes)
+        yield (0. if atime is None else _unpack_time(atime), key,
+               2 * len(key) + len(value) + 8 + _LMDB_NODE_OVERHEAD)
+
+
+# Per-entry overhead in LMDB's B-tree (node header + page pointer)
+_LMDB_NODE_OVERHEAD = 2 * (8 + 2)
+
+
+def _delete(db, txn, keys):
+    values, atimes = _databases(db, txn)
+    for key in keys:
+        txn.delete(key, db=values)
+        txn.delete(key, db=atimes)
+
+
+def _evict(db, txn, target_size):
+    """Delete the least recently used entries from the on-disk cache until it
+    uses (approximately) ``target_size`` bytes or less. ``txn`` must be a
+    write transaction.
+
+    Returns the number of entries deleted.
+    """
+    to_free = _used_size(db, txn) - target_size
+    if to_free <= 0:
+        return 0
+    keys = []
+    for _, key, nbytes in sorted(_entries(db, txn)):
+        if to_free <= 0:
+            break
+        keys.append(key)
+        to_free -= nbytes
+    _delete(db, txn, keys)
+    return len(keys)
+
+
+def prune(older_than_secs, filename=None, now=None):
+    """Delete entries from the on-disk cache that haven't been used in the
+    last ``older_than_secs`` seconds.
+
+    Returns the number of entries deleted.
+    """
+    if now is None:
+        now = time.time()
+    with _open(filename) as db, db.begin(write=True) as txn:
+        keys = [key for atime, key, _ in _entries(db, txn)
+                if atime < now - older_than_secs]
+        _delete(db, txn, keys)
+    return len(keys)
+
+
+def clear(filename=None):
+    """Delete all the entries from the on-disk cache."""
+    with _open(filename) as db, db.begin(write=True) as txn:
+        for d in _databases(db, txn):
+            txn.drop(d, delete=False)
+
+
+class CacheStats(namedtuple(
+        "CacheStats",
+        "filename entries used_bytes file_bytes max_bytes oldest newest")):
+    """Returned by `stats`. `oldest` and `newest` are the access times (in
+    seconds since the epoch) of the least and most recently used entries, or
+    None if the cache is empty."""
+
+
+def stats(filename=None):
+    with _open(filename) as db, db.begin() as txn:
+        atimes = [atime for atime, _, _ in _entries(db, txn)]
+        return CacheStats(
+            filename=db.path(),
+            entries=len(atimes),
+            used_bytes=_used_size(db, txn),
+            file_bytes=os.path.getsize(os.path.join(db.path(), "data.mdb")),
+            max_bytes=db.info()["map_size"],
+            oldest=min(atimes, default=None),
+            newest=max(atimes, default=None))
+
+
+class NotCachable(Exception):
+    pass
 
 
 def _cache_hash(value):
     # type: (...) -> bytes
+    out = []
+    _encode_args(value, out)
     h = Xxhash64()
+    h.update(b"".join(out))
+    return h.digest()
 
-    class HashWriter():
-        def write(self, data):
-            if isinstance(data, str):
-                data = data.encode("utf-8")
-            h.update(data)
-            return len(data)
 
-    json.dump(value, HashWriter(), cls=_ArgsEncoder, sort_keys=True)
-    return h.digest()
+def _encode_args(o, out):
+    """Serialise the function arguments `o` into `out` (a list of bytes) for
+    hashing by `_cache_hash`.
+
+    We used to use `json.dump` with a custom encoder, but this is on the
+    critical path of every cache hit and JSON serialisation (writing each token
+    to the hash separately) was most of the cost for small images. Each value
+    is prefixed with its type and length so that different arguments can't
+    produce the same bytes. Like JSON, tuples and lists are equivalent.
+    """
+    if isinstance(o, str):
+        b = o.encode("utf-8")
+        out.append(b"s%d:" % len(b))
+        out.append(b)
+    elif o is None:
+        out.append(b"n")
+    elif o is True:
+        out.append(b"t")
+    elif o is False:
+        out.append(b"f")
+    elif isinstance(o, int):
+        out.append(b"i%d;" % o)
+    elif isinstance(o, float):
+        out.append(b"d%s;" % repr(float(o)).encode())
+    elif isinstance(o, (list, tuple)):
+        out.append(b"l%d:" % len(o))
+        for x in o:
+            _encode_args(x, out)
+    elif isinstance(o, dict):
+        out.append(b"m%d:" % len(o))
+        for k in sorted(o):
+            _encode_args(k, out)
+            _encode_args(o[k], out)
+    elif isinstance(o, numpy.ndarray):
+        out.append(b"a%s%s:" % (o.dtype.str.encode(), str(o.shape).encode()))
+        out.append(_ndarray_digest(o))
+    elif isinstance(o, numpy.generic):
+        _encode_args(o.item(), out)
+    else:
+        _encode_args(_encode_object(o), out)
+
+
+def _encode_object(o):
+    from _stbt.imgutils import Color
+    from _stbt.match import MatchParameters, _ImagePyramid, Template
+    if isinstance(o, ImageLogger):
+        if o.enabled:
+            raise NotCachable()
+        return None
+    elif isinstance(o, _ImagePyramid):
+        # Derived from the image that's being searched, which is hashed
+        # separately.
+        return None
+    elif isinstance(o, Template):
+        # The rest of the Template is derived from the image.
+        return o.image
+    elif isinstance(o, set):
+        return sorted(o)
+    elif isinstance(o, Color):
+        return o.hexstring
+    elif isinstance(o, MatchParameters):
+        return {
+            "match_method": o.match_method.value,
+            "match_threshold": o.match_threshold,
+            "confirm_method": o.confirm_method.value,
+            "confirm_threshold": o.confirm_threshold,
+            "erode_passes": o.erode_passes}
+    else:
+        raise TypeError(
+            "Object of type %s can't be used as a cache key"
+            % type(o).__name__)
+
+
+_DIGEST_MEMO_MAX_ENTRIES = 64
+
+
+def _ndarray_digest(a):
+    """Hash the pixels of `a`.
+
+    Frames and Images are read-only, and the same frame is often searched
+    several times (for example by a FrameObject's properties) so we remember
+    the digests on the frame. `a` is typically a new view created by `crop`,
+    so we store the digest on the `Frame` or `Image` that owns the data, keyed
+    by the view's position and layout within it.
+    """
+    from _stbt.imgutils import Frame, Image
+    owner = None
+    base = a
+    while isinstance(base, numpy.ndarray):
+        if base.flags.writeable:
+            owner = None
+            break
+        if isinstance(base, (Frame, Image)):
+            owner = base
+        base = base.base
+
+    if owner is None:
+        h = Xxhash64()
+        h.update_ndarray(a)
+        return h.digest()
+
+    key = (a.ctypes.data - owner.ctypes.data, a.shape, a.strides, a.dtype.str)
+    memo = owner.__dict__.get("_stbt_cache_digests")
+    if memo is None:
+        memo = owner.__dict__["_stbt_cache_digests"] = {}
+    digest = memo.get(key)
+    if digest is None:
+        h = Xxhash64()
+        h.update_ndarray(a)
+        digest = h.digest()
+        if len(memo) >= _DIGEST_MEMO_MAX_ENTRIES:
+            memo.clear()
+        memo[key] = digest
+    return digest
+
+
+def test_cache_hash_of_images():
+    from _stbt.imgutils import Frame
+
+    a = numpy.arange(20 * 30 * 3, dtype=numpy.uint8)
+    a = a.reshape((20, 30, 3)).copy()
+    crop = a[2:12, 5:25]
+    assert not crop.flags.c_contiguous
+    # Hashing a view row-by-row gives the same result as hashing a copy:
+    assert _cache_hash(crop) == _cache_hash(crop.copy())
+    assert _cache_hash(a[::2, ::3]) == _cache_hash(a[::2, ::3].copy())
+    assert _cache_hash(crop) != _cache_hash(a[2:12, 6:26])
+    assert _cache_hash(crop) != _cache_hash(crop.astype(numpy.uint16))
+    assert _cache_hash(crop) != _cache_hash(crop.reshape((20, 10, 3)))
+
+    a.flags.writeable = False
+    frame = Frame(a, time=1234.)
+    assert _cache_hash(frame[2:12, 5:25]) == _cache_hash(crop)
+    assert len(frame._stbt_cache_digests) == 1  # pylint:disable=no-member
+    assert _cache_hash(frame[2:12, 5:25]) == _cache_hash(crop)
+    assert len(frame._stbt_cache_digests) == 1  # pylint:disable=no-member
+    assert _cache_hash(frame[2:12, 6:26]) == _cache_hash(a[2:12, 6:26])
+    assert _cache_hash(frame) == _cache_hash(a)
+
+    # Writeable frames might be modified so we don't remember the digest:
+    frame = Frame(numpy.zeros((10, 10, 3), dtype=numpy.uint8))
+    h = _cache_hash(frame[:5])
+    frame[0, 0, 0] = 1
+    assert _cache_hash(frame[:5]) != h
+    assert "_stbt_cache_digests" not in frame.__dict__
+
+
+def test_cache_hash_of_arguments():
+    assert _cache_hash(["a", 1]) == _cache_hash(("a", 1))
+    assert _cache_hash({"b": 1, "a": 2}) == _cache_hash({"a": 2, "b": 1})
+    assert _cache_hash(["ab", "c"]) != _cache_hash(["a", "bc"])
+    assert _cache_hash([1]) != _cache_hash(["1"])
+    assert _cache_hash([1]) != _cache_hash([1.0])
+    assert _cache_hash([1]) != _cache_hash([True])
+    assert _cache_hash([None]) != _cache_hash([[]])
+    assert _cache_hash([[1], 2]) != _cache_hash([1, [2]])
+    assert _cache_hash(numpy.int64(3)) == _cache_hash(3)
+    try:
+        _cache_hash(object())
+        assert False, "Expected TypeError"
+    except TypeError:
+        pass
 
 
 def test_that_cache_is_disabled_when_debug_match():
@@ -310,11 +886,11 @@ def _check_cache_behaviour(func):
 
 def test_memoize_types():
     # `memoize` isn't guaranteed to return the exact type that was returned,
-    # because it goes through JSON serialisation. This is OK because `memoize`
-    # is only used to cache the results of internal stbt functions, and the
-    # (internal) users of memoize ensure that they handle the cached return
-    # values correctly. Here we test that, at least, common arguments don't
-    # cause any serialisation problems.
+    # because it goes through serialisation (see `_encode_value`). This is OK
+    # because `memoize` is only used to cache the results of internal stbt
+    # functions, and the (internal) users of memoize ensure that they handle
+    # the cached return values correctly. Here we test that, at least, common
+    # arguments don't cause any serialisation problems.
     import stbt_core as stbt
 
     @memoize()
@@ -323,7 +899,7 @@ def test_memoize_types():
 
     @memoize()
     def f2(arg):
-        return str(arg)  # stbt.Color is not JSON serialisable
+        return str(arg)  # stbt.Color can't be stored in the cache
 
     with named_temporary_directory() as tmpdir, \
             setup_cache(tmpdir), enable_caching():
@@ -342,6 +918,32 @@ def test_memoize_types():
         assert f2(stbt.Color("#ff7f00")) == "Color('#ff7f00')"
 
 
+def test_value_encoding():
+    for value in [
+            None, True, False, 0, -1, 2**63 - 1, 2**100, -2**100, 0.5,
+            float("inf"), "", "abc", "\u00a3\u20ac\x00", "x" * 10000,
+            [], [1, [2, None]], {"a": 1, "b": [True, "c"]}, {}]:
+        assert _decode_value(_encode_value(value)) == value
+    assert _decode_value(_encode_value((1, (2, 3)))) == [1, [2, 3]]
+    assert _decode_value(_encode_value(numpy.float32(0.5))) == 0.5
+    assert len(_encode_value("x" * 10000)) < 1000  # Compressed
+    try:
+        _encode_value(object())
+        assert False, "Expected TypeError"
+    except TypeError:
+        pass
+
+    # Values written by older versions of stbt are ignored:
+    with named_temporary_directory() as tmpdir, _open(tmpdir) as db:
+        with db.begin(write=True) as txn:
+            values, _ = _databases(db, txn)
+            txn.put(b"key", b'"json"', db=values)
+        cache = _TieredCache(db, memory_size=0)
+        assert cache.get(b"key") is _MISSING
+        cache.put(b"key", "binary")
+        assert cache.get(b"key") == "binary"
+
+
 def test_memoize_iterator():
     counter = [0]
 
@@ -400,6 +1002,122 @@ def test_memoize_iterator_on_empty_iterator():
         assert counter[0] == 1
 
 
+def test_memory_cache():
+    counter = [0]
+
+    @memoize()
+    def cached_function(arg):
+        counter[0] += 1
+        return [arg]
+
+    with named_temporary_directory() as tmpdir:
+        with setup_cache(tmpdir), enable_caching():
+            assert cached_function(1) == [1]
+            assert counter[0] == 1
+            # Served from memory, not from disk:
+            db, _cache.db = _cache.db, None
+            assert cached_function(1) == [1]
+            assert counter[0] == 1
+            _cache.db = db
+
+        # Nothing in memory, but it's still cached on disk:
+        with setup_cache(tmpdir), enable_caching():
+            assert cached_function(1) == [1]
+            assert counter[0] == 1
+
+        filename = tmpdir + "/memory-only.lmdb"
+        with setup_cache(filename, memory_only=True), enable_caching():
+            assert cached_function(2) == [2]
+            assert cached_function(2) == [2]
+            assert counter[0] == 2
+        assert not os.path.exists(filename)
+
+
+def test_memory_cache_size_limit():
+    cache = _TieredCache(None, memory_size=40)
+    for x in range(10):
+        cache.put(b"%d" % x, "abc")  # 10 bytes encoded
+    assert cache._memory_nbytes == 40
+    assert list(cache._memory) == [b"6", b"7", b"8", b"9"]
+    assert cache.get(b"5") is _MISSING
+    assert cache.get(b"6") == "abc"
+    cache.put(b"10", "abc")
+    assert list(cache._memory) == [b"8", b"9", b"6", b"10"]
+
+    # Too big to cache in memory:
+    cache.put(b"big", "x" * 100)
+    assert cache.get(b"big") is _MISSING
+
+
+def test_that_cache_evicts_least_recently_used_entries():
+    with named_temporary_directory() as tmpdir, \
+            _open(tmpdir, max_size=1024 * 1024) as db:
+        cache = _TieredCache(db, memory_size=0)
+        value = os.urandom(5000).hex()  # Not very compressible
+        for i in range(500):
+            cache.put(b"%08d" % i, value)
+        cache.flush()
+        assert not cache._full_warning
+        with db.begin() as txn:
+            assert _used_size(db, txn) < 1024 * 1024
+        assert cache.get(b"00000000") is _MISSING
+        assert cache.get(b"00000499") == value
+
+
+def _fill_cache_in_subprocess(filename, n):
+    with setup_cache(filename):
+        for i in range(200):
+            _cache.put(b"%d-%d" % (n, i), [n, i])
+            _cache.get(b"%d-%d" % ((n + 1) % 4, i))
+    return n
+
+
+def test_that_cache_can_be_shared_by_several_processes():
+    import multiprocessing
+    with named_temporary_directory() as tmpdir:
+        with multiprocessing.Pool(4) as pool:
+            assert sorted(pool.starmap(
+                _fill_cache_in_subprocess,
+                [(tmpdir, n) for n in range(4)])) == [0, 1, 2, 3]
+        assert stats(tmpdir).entries == 800
+        with setup_cache(tmpdir):
+            assert _cache.get(b"3-199") == [3, 199]
+
+
+def test_prune_and_clear():
+    with named_temporary_directory() as tmpdir:
+        with _open(tmpdir) as db:
+            cache = _TieredCache(db, memory_size=0)
+            for i in range(10):
+                cache.put(b"%08d" % i, i)
+            cache.flush()
+            with db.begin(write=True) as txn:
+                _, atimes = _databases(db, txn)
+                for i in range(5):
+                    txn.put(b"%08d" % i, _pack_time(1000.), db=atimes)
+            # Reading an entry updates its access time:
+            assert cache.get(b"00000000") == 0
+            cache.flush()
+
+        assert stats(tmpdir).entries == 10
+        assert prune(older_than_secs=60 * 60, filename=tmpdir) == 4
+        s = stats(tmpdir)
+        assert s.entries == 6
+        assert s.oldest > 1000.
+
+        clear(tmpdir)
+        assert stats(tmpdir).entries == 0
+
+
+def test_that_old_cache_format_is_discarded():
+    with named_temporary_directory() as tmpdir:
+        with lmdb.open(tmpdir) as db, db.begin(write=True) as txn:
+            txn.put(b"\x01\x02\x03\x04\x05\x06\x07\x08", b'"hello"')
+        assert stats(tmpdir).entries == 0
+        with _open(tmpdir) as db, db.begin() as txn:
+            assert txn.stat(db.open_db(None))["entries"] == len(_DB_NAMES)
+
+
 def test_that_cache_speeds_up_match():
     import stbt_core as stbt
     black = numpy.zeros((1440, 2560, 3), dtype=numpy.uint8)
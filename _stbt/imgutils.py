@@ -2,17 +2,21 @@ from __future__ import annotations
 
 import errno
 import inspect
+import math
 import os
 import re
+import threading
 import typing
 import warnings
-from functools import lru_cache
+from collections import OrderedDict
 from typing import Optional, overload, TypeAlias
 
 import cv2
 import numpy
 import numpy.typing
 
+from . import image_store
+from .config import get_config
 from .logging import ddebug, debug, warn
 from .types import Region
 
@@ -41,9 +45,17 @@ class Frame(numpy.ndarray):
     :ivar int height: The height of the frame, in pixels.
     :ivar Region region: A `Region` corresponding to the full size of the
         frame — that is, ``Region(0, 0, width, height)``.
+
+    If ``analysis_size`` is set in the ``[frames]`` section of
+    :ref:`.stbt.conf`, frames are delivered at that (reduced) resolution. Use
+    `full_resolution` and `full_resolution_region` to get back to the
+    resolution of the video from the device-under-test, for example to save a
+    screenshot.
     """
     def __new__(cls, array, dtype=None, order=None, time: float|None = None,
-                _draw_sink=None):
+                _draw_sink=None, _scale: tuple[float, float]|None = None,
+                _full_resolution=None):
+        array = _to_frame(array)
         obj = numpy.asarray(array, dtype=dtype, order=order).view(cls)
         i = isinstance(array, Frame)
         if time is None and i:
@@ -51,6 +63,15 @@ class Frame(numpy.ndarray):
         else:
             obj.time = time
         obj._draw_sink = _draw_sink or (i and array._draw_sink) or None
+        obj._scale = _scale or (i and array._scale) or (1., 1.)
+        # Callable that returns the full-resolution Frame (or None). Not
+        # propagated by `__array_finalize__` because a crop of this frame
+        # doesn't have the same full-resolution frame.
+        obj._full_resolution = (
+            _full_resolution or (i and array._full_resolution) or None)
+        # The Y plane, if the frame was captured in YUV format. Not
+        # propagated by `__array_finalize__` either. See `_luma`.
+        obj._luma = array._luma if i else None
         return obj
 
     def __array_finalize__(self, obj):
@@ -62,6 +83,9 @@ class Frame(numpy.ndarray):
         else:
             self.time = typing.cast(float, None)
         self._draw_sink = getattr(obj, '_draw_sink', None)  # pylint: disable=attribute-defined-outside-init
+        self._scale = getattr(obj, '_scale', (1., 1.))  # pylint: disable=attribute-defined-outside-init
+        self._full_resolution = None  # pylint: disable=attribute-defined-outside-init
+        self._luma = None  # pylint: disable=attribute-defined-outside-init
 
     def __repr__(self):
         return "<Frame(time=%s)>" % (
@@ -82,6 +106,35 @@ class Frame(numpy.ndarray):
     def region(self) -> Region:
         return Region(0, 0, self.shape[1], self.shape[0])
 
+    def full_resolution(self) -> Frame:
+        """The same video-frame at the full resolution of the video from the
+        device-under-test.
+
+        Returns this frame if it's already at full resolution, or if the
+        full-resolution frame is no longer available.
+        """
+        if self._full_resolution is not None:
+            f = self._full_resolution()
+            if f is not None:
+                return f
+        return self
+
+    def full_resolution_region(self, region: Region) -> Region | None:
+        """Convert a region of this frame to the coordinates of the
+        full-resolution frame (see `full_resolution`). The region is rounded
+        outwards to whole pixels.
+        """
+        sx, sy = self._scale
+        if (sx, sy) == (1., 1.):
+            return region
+        region = Region.intersect(self.region, region)
+        if region is None:
+            return None
+        return Region(x=math.floor(region.x / sx),
+                      y=math.floor(region.y / sy),
+                      right=math.ceil(region.right / sx),
+                      bottom=math.ceil(region.bottom / sy))
+
 
 class Image(numpy.ndarray):
     """An image, possibly loaded from disk.
@@ -179,10 +232,109 @@ def _relative_filename(absolute_filename) -> str|None:
     return relpath
 
 
+class _LazyFrame(numpy.lib.mixins.NDArrayOperatorsMixin):
+    """A video frame captured in YUV format (see ``capture_format`` in the
+    ``[frames]`` section of stbt.conf). `get_frame` and `frames` give these to
+    the test script instead of a `Frame`.
+
+    It has the same attributes and methods as a `Frame`, and it works with
+    numpy functions and operators. The Y plane (`_luma`) and the attributes
+    that don't depend on the pixels (``time``, ``shape``, ``region``, etc.)
+    are available without converting the frame to BGR, so grayscale
+    operations like `is_screen_black` and `GrayscaleDiff` never convert it.
+    It's converted the first time that anything needs the BGR pixels.
+
+    It isn't a `numpy.ndarray`, so OpenCV functions don't accept it. stbt's
+    functions convert it with `_to_frame`; test scripts that call OpenCV
+    directly can use ``stbt.Frame(frame)``.
+    """
+    dtype = numpy.dtype(numpy.uint8)
+    ndim = 3
+
+    def __init__(self, convert, get_luma, shape, time):
+        self.time: float = time
+        self.shape: tuple[int, int, int] = shape
+        self._draw_sink = None
+        self._scale: tuple[float, float] = (1., 1.)
+        self._full_resolution = None
+        self._lock = threading.Lock()  # Protects everything below
+        self._convert = convert
+        self._get_luma = get_luma
+        self._y: "numpy.ndarray | None" = None
+        self._bgr: Frame | None = None
+
+    @property
+    def _luma(self):
+        with self._lock:
+            if self._y is None:
+                # No copy: A view onto the captured frame's memory.
+                self._y = self._get_luma()
+                self._get_luma = None
+            return self._y
+
+    def _frame(self) -> Frame:
+        luma = self._luma
+        with self._lock:
+            if self._bgr is None:
+                frame = Frame(self._convert(), time=self.time,
+                              _draw_sink=self._draw_sink, _scale=self._scale,
+                              _full_resolution=self._full_resolution)
+                frame._luma = luma
+                frame.flags.writeable = False
+                self._bgr = frame
+                self._convert = None
+            return self._bgr
+
+    def __getattr__(self, name):
+        # Only called for attributes that we don't have ourselves, that is,
+        # any other `numpy.ndarray` attribute or method.
+        if name.startswith("__") or name in (
+                "_lock", "_convert", "_get_luma", "_y", "_bgr"):
+            raise AttributeError(name)
+        return getattr(self._frame(), name)
+
+    def __getitem__(self, key):
+        return self._frame()[key]
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __iter__(self):
+        return iter(self._frame())
+
+    def __array__(self, dtype=None, copy=None):
+        a = numpy.asarray(self._frame(), dtype=dtype)
+        return a.copy() if copy else a
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        inputs = tuple(_to_frame(x) for x in inputs)
+        if "out" in kwargs:
+            kwargs["out"] = tuple(_to_frame(x) for x in kwargs["out"])
+        return getattr(ufunc, method)(*inputs, **kwargs)
+
+    size = property(lambda self: math.prod(self.shape))
+    width = Frame.width
+    height = Frame.height
+    region = Frame.region
+    full_resolution = Frame.full_resolution
+    full_resolution_region = Frame.full_resolution_region
+    __repr__ = Frame.__repr__
+    __str__ = Frame.__str__
+
+
+def _to_frame(frame):
+    """Returns the BGR `Frame` if `frame` is a `_LazyFrame`, otherwise
+    `frame` unchanged. Call this before passing a frame to OpenCV.
+    """
+    if isinstance(frame, _LazyFrame):
+        return frame._frame()
+    return frame
+
+
 def _frame_repr(frame):
     if frame is None:
         return "None"
-    if isinstance(frame, (Image, Frame)):
+    if isinstance(frame, (Image, Frame, _LazyFrame)):
         return repr(frame)
     if len(frame.shape) == 3:
         return "<%dx%dx%d>" % (frame.shape[1], frame.shape[0], frame.shape[2])
@@ -375,6 +527,29 @@ def _image_region(image):
     return Region(0, 0, s[1], s[0])
 
 
+def _to_grayscale(frame, region: Region = Region.ALL, downsample=None):
+    """Equivalent to ``cv2.cvtColor(crop(frame, region), cv2.COLOR_BGR2GRAY)``
+    but cheaper if the frame was captured in YUV format (see
+    ``capture_format`` in the ``[frames]`` section of stbt.conf), because we
+    use the frame's Y plane instead of converting the BGR pixels.
+
+    ``downsample`` is an optional function that is applied to the cropped
+    image before the colour conversion.
+    """
+    luma = getattr(frame, "_luma", None)
+    if luma is not None and luma.shape == frame.shape[:2]:
+        img = crop(luma, region)
+        if downsample is not None:
+            img = downsample(img)
+        # The Y plane is "limited range" (16-235). Expand it to 0-255 to match
+        # the BGR frame, which was converted from the same YUV data.
+        return cv2.addWeighted(img, 255 / 219, img, 0, -16 * 255 / 219)
+    img = crop(frame, region)
+    if downsample is not None:
+        img = downsample(img)
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+
 @typing.overload
 def load_image(filename: ImageT) -> Image:
     ...
@@ -456,7 +631,7 @@ def load_image(filename, flags=None, color_channels=None) -> Image:
     elif isinstance(color_channels, int):
         color_channels = (color_channels,)
 
-    obj = filename
+    obj = _to_frame(filename)
     if isinstance(obj, Image):
         filename = obj.filename
         absolute_filename = obj.absolute_filename
@@ -472,7 +647,10 @@ def load_image(filename, flags=None, color_channels=None) -> Image:
             chan[chan < 255] = 0
     elif isinstance(filename, str):
         absolute_filename = find_file(filename)
-        img = _imread(absolute_filename, color_channels)
+        key = _file_cache_key(absolute_filename)
+        img = _image_cache.get(
+            ("imread", color_channels) + key,
+            lambda: _read_image(key, color_channels))
     else:
         raise TypeError("load_image requires a filename or Image")
 
@@ -481,7 +659,18 @@ def load_image(filename, flags=None, color_channels=None) -> Image:
     return img
 
 
-@lru_cache(maxsize=5)
+def _read_image(file_cache_key, color_channels):
+    """Reads the image from the store created by `stbt precompile-images`
+    (see `_stbt.image_store`) if it's there, or decodes it with `_imread`.
+    """
+    absolute_filename, mtime_ns, size = file_cache_key
+    if color_channels == (3, 4):
+        img = image_store.get(absolute_filename, mtime_ns, size)
+        if img is not None:
+            return img
+    return _imread(absolute_filename, color_channels)
+
+
 def _imread(absolute_filename, color_channels):
     if color_channels == (3,):
         flags = cv2.IMREAD_COLOR
@@ -501,6 +690,65 @@ def _imread(absolute_filename, color_channels):
     return img
 
 
+class _ImageCache():
+    """Size-bounded LRU cache of images decoded by `load_image`, and of
+    reference images compiled by `stbt.Template`.
+
+    The maximum size (in megabytes) is configured by ``cache_size_mb`` in the
+    ``[load_image]`` section of .stbt.conf. Values must have an ``nbytes``
+    attribute. Keys should include the file's modification time (see
+    `_file_cache_key`) so that we notice if a file is re-written during a test
+    run.
+    """
+    def __init__(self):
+        self._entries: OrderedDict = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, fn):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[0]
+
+        value = fn()
+        nbytes = value.nbytes
+        max_bytes = get_config(
+            "load_image", "cache_size_mb", type_=float) * 1024 * 1024
+
+        with self._lock:
+            if key in self._entries:
+                self._nbytes -= self._entries.pop(key)[1]
+            if nbytes <= max_bytes:
+                self._entries[key] = (value, nbytes)
+                self._nbytes += nbytes
+            while self._nbytes > max_bytes:
+                _, (_, n) = self._entries.popitem(last=False)
+                self._nbytes -= n
+        return value
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+
+_image_cache = _ImageCache()
+
+
+def _file_cache_key(absolute_filename):
+    st = os.stat(absolute_filename)
+    return (absolute_filename, st.st_mtime_ns, st.st_size)
+
+
 def _convert_color(img, color_channels, absolute_filename):
     if len(img.shape) not in [2, 3]:
         raise ValueError(
@@ -580,7 +828,7 @@ def save_frame(image: FrameT, filename: str):
     Takes an image obtained from `get_frame` or from the `screenshot`
     property of `MatchTimeout` or `MotionTimeout`.
     """
-    cv2.imwrite(filename, image)
+    cv2.imwrite(filename, _to_frame(image))
 
 
 def pixel_bounding_box(img):
@@ -668,14 +916,16 @@ def find_file(filename: str) -> str:
         assert caller
         try:
             caller = caller.f_back  # skip this frame (find_file)
+            checked = set()
             while caller:
-                caller_dir = os.path.abspath(
-                    os.path.dirname(inspect.getframeinfo(caller).filename))
-                caller_path = os.path.join(caller_dir, filename)
-                if os.path.isfile(caller_path):
-                    ddebug("Resolved relative path %r to %r" % (
-                        filename, caller_path))
-                    return caller_path
+                caller_dir = _code_dir(caller.f_code.co_filename)
+                if caller_dir not in checked:
+                    checked.add(caller_dir)
+                    caller_path = os.path.join(caller_dir, filename)
+                    if os.path.isfile(caller_path):
+                        ddebug("Resolved relative path %r to %r" % (
+                            filename, caller_path))
+                        return caller_path
                 caller = caller.f_back
         finally:
             # Avoid circular references between stack frame objects and
@@ -693,6 +943,25 @@ def find_file(filename: str) -> str:
     raise FileNotFoundError(errno.ENOENT, "No such file", filename)
 
 
+_code_dirs: dict[str, str] = {}
+
+
+def _code_dir(code_filename: str) -> str:
+    """The absolute directory of a code object's ``co_filename``.
+
+    Cached because `find_file` calls this for every frame in the stack, every
+    time it's called (for example on every `stbt.match` in a `wait_until`
+    loop). Relative filenames aren't cached because they depend on the
+    current working directory.
+    """
+    d = _code_dirs.get(code_filename)
+    if d is None:
+        d = os.path.abspath(os.path.dirname(code_filename))
+        if os.path.isabs(code_filename):
+            _code_dirs[code_filename] = d
+    return d
+
+
 def limit_time(frames, duration_secs):
     """
     Adapts a frame iterator such that it will return EOS after `duration_secs`
@@ -7,6 +7,8 @@ import platform
 import numpy
 from numpy.typing import NDArray
 
+from .types import Region, SizeT
+
 
 def _find_file(path, root=os.path.dirname(os.path.abspath(__file__))):
     return os.path.join(root, path)
@@ -51,6 +53,62 @@ _libstbt.threshold_diff_bgr.argtypes = [
     ctypes.c_uint16, ctypes.c_uint16
 ]
 
+
+class _BoundingBox(ctypes.Structure):
+    _fields_ = [("x", ctypes.c_uint16),
+                ("y", ctypes.c_uint16),
+                ("right", ctypes.c_uint16),
+                ("bottom", ctypes.c_uint16)]
+
+
+# BoundingBox threshold_diff_gray(
+#     uint8_t *out,
+#     const uint8_t* a, uint16_t line_stride_a,
+#     const uint8_t* b, uint16_t line_stride_b,
+#     const uint8_t* mask, uint16_t line_stride_mask,
+#     uint8_t threshold,
+#     uint16_t width_px, uint16_t height_px
+# )
+_libstbt.threshold_diff_gray.restype = _BoundingBox
+_libstbt.threshold_diff_gray.argtypes = [
+    ctypes.POINTER(ctypes.c_uint8),
+    ctypes.POINTER(ctypes.c_uint8), ctypes.c_uint16,
+    ctypes.POINTER(ctypes.c_uint8), ctypes.c_uint16,
+    ctypes.POINTER(ctypes.c_uint8), ctypes.c_uint16,
+    ctypes.c_uint8,
+    ctypes.c_uint16, ctypes.c_uint16
+]
+
+# BoundingBox threshold_diff_bgr_bounding_box(
+#     const uint8_t* a, uint16_t line_stride_a,
+#     uint8_t* b, uint16_t line_stride_b,
+#     const uint8_t* mask, uint16_t line_stride_mask,
+#     uint32_t threshold_sq, int erode,
+#     uint16_t stop_width, uint16_t stop_height,
+#     uint16_t width_px, uint16_t height_px
+# )
+_libstbt.threshold_diff_bgr_bounding_box.restype = _BoundingBox
+_libstbt.threshold_diff_bgr_bounding_box.argtypes = [
+    ctypes.POINTER(ctypes.c_uint8), ctypes.c_uint16,
+    ctypes.POINTER(ctypes.c_uint8), ctypes.c_uint16,
+    ctypes.POINTER(ctypes.c_uint8), ctypes.c_uint16,
+    ctypes.c_uint32, ctypes.c_int,
+    ctypes.c_uint16, ctypes.c_uint16,
+    ctypes.c_uint16, ctypes.c_uint16
+]
+
+# BoundingBox changed_bounding_box(
+#     const uint8_t* a, uint16_t line_stride_a,
+#     const uint8_t* b, uint16_t line_stride_b,
+#     uint8_t bytes_per_px, uint16_t width_px, uint16_t height_px
+# )
+_libstbt.changed_bounding_box.restype = _BoundingBox
+_libstbt.changed_bounding_box.argtypes = [
+    ctypes.POINTER(ctypes.c_uint8), ctypes.c_uint16,
+    ctypes.POINTER(ctypes.c_uint8), ctypes.c_uint16,
+    ctypes.c_uint8, ctypes.c_uint16, ctypes.c_uint16
+]
+
 PIXEL_DEPTH_BGR = 1
 PIXEL_DEPTH_BGRx = 2
 PIXEL_DEPTH_BGRA = 3
@@ -103,3 +161,128 @@ def threshold_diff_bgr(
         out_array, a_array, a.strides[0], b_array, b.strides[0],
         threshold, a.shape[1], a.shape[0])
     return out
+
+
+def threshold_diff_gray(
+        a: NDArray[numpy.uint8],
+        b: NDArray[numpy.uint8],
+        threshold: int,
+        mask: NDArray[numpy.uint8] | None = None,
+        output: bool = True,
+) -> tuple[NDArray[numpy.uint8] | None, Region | None]:
+    """Returns the thresholded absolute difference of grayscale images `a` and
+    `b` (or None if `output` is False), and its bounding box.
+    """
+    if mask is not None and len(mask.shape) == 3:
+        mask = mask[:, :, 0]
+    for x in (a, b, mask):
+        if x is None:
+            continue
+        if x.dtype != numpy.uint8:
+            raise NotImplementedError("dtype must be uint8")
+        if len(x.shape) != 2 or x.strides[1] != 1:
+            raise NotImplementedError("Pixel data must be contiguous")
+        if x.shape != a.shape:
+            raise ValueError("Images must be the same size")
+    if not 0 <= threshold <= 255:
+        raise NotImplementedError("threshold must be 0-255")
+
+    if output:
+        out = numpy.empty(a.shape, dtype=numpy.uint8)
+        out_array = out.ctypes.data_as(ctypes.POINTER(ctypes.c_uint8))
+    else:
+        out = out_array = None
+    if mask is None:
+        mask_array, mask_stride = None, 0
+    else:
+        mask_array = mask.ctypes.data_as(ctypes.POINTER(ctypes.c_uint8))
+        mask_stride = mask.strides[0]
+
+    bbox = _libstbt.threshold_diff_gray(
+        out_array,
+        a.ctypes.data_as(ctypes.POINTER(ctypes.c_uint8)), a.strides[0],
+        b.ctypes.data_as(ctypes.POINTER(ctypes.c_uint8)), b.strides[0],
+        mask_array, mask_stride,
+        threshold, a.shape[1], a.shape[0])
+    return out, _bbox_to_region(bbox)
+
+
+def threshold_diff_bgr_bounding_box(
+        a: NDArray[numpy.uint8],
+        b: NDArray[numpy.uint8],
+        threshold: int,
+        mask: NDArray[numpy.uint8] | None = None,
+        erode: bool = True,
+        stop_size: SizeT | None = None,
+) -> Region | None:
+    """The bounding box of `threshold_diff_bgr`, masked by `mask`, after a
+    morphological "open" operation with a 3x3 cross-shaped kernel (if `erode`
+    is True). Computed in a single pass without storing the intermediate
+    images.
+
+    If `stop_size` is specified, stop looking as soon as the bounding box is
+    at least `stop_size` (width, height) pixels. The returned region is then
+    the bounding box of the differences found so far, not of all the
+    differences.
+    """
+    if a.dtype != numpy.uint8 or b.dtype != numpy.uint8:
+        raise NotImplementedError("dtype must be uint8")
+    if a.shape[:2] != b.shape[:2]:
+        raise ValueError("Images must be the same size")
+    if b.strides[2] != 1 or a.strides[2] != 1 or \
+            b.strides[1] != 3 or a.strides[1] != 3:
+        raise NotImplementedError("Pixel data must be contiguous")
+    if mask is None:
+        mask_array, mask_stride = None, 0
+    else:
+        if len(mask.shape) == 3:
+            mask = mask[:, :, 0]
+        if mask.dtype != numpy.uint8 or mask.strides[1] != 1:
+            raise NotImplementedError("Mask must be contiguous uint8")
+        if mask.shape != a.shape[:2]:
+            raise ValueError("Mask must be the same size as the images")
+        mask_array = mask.ctypes.data_as(ctypes.POINTER(ctypes.c_uint8))
+        mask_stride = mask.strides[0]
+
+    if stop_size is None:
+        stop_width, stop_height = 0, 0
+    else:
+        stop_width, stop_height = max(stop_size[0], 1), max(stop_size[1], 1)
+
+    bbox = _libstbt.threshold_diff_bgr_bounding_box(
+        a.ctypes.data_as(ctypes.POINTER(ctypes.c_uint8)), a.strides[0],
+        b.ctypes.data_as(ctypes.POINTER(ctypes.c_uint8)), b.strides[0],
+        mask_array, mask_stride, threshold, int(erode),
+        stop_width, stop_height, a.shape[1], a.shape[0])
+    return _bbox_to_region(bbox)
+
+
+def changed_bounding_box(
+        a: NDArray[numpy.uint8],
+        b: NDArray[numpy.uint8],
+) -> Region | None:
+    """The bounding box of the pixels that differ at all between images `a`
+    and `b`, rounded outwards to 32-pixel tiles horizontally; or None if the
+    images are identical.
+    """
+    if a.dtype != numpy.uint8 or b.dtype != numpy.uint8:
+        raise NotImplementedError("dtype must be uint8")
+    if a.shape != b.shape:
+        raise ValueError("Images must be the same size")
+    bytes_per_px = a.shape[2] if len(a.shape) == 3 else 1
+    for x in (a, b):
+        if x.strides[1] != bytes_per_px or (
+                len(x.shape) == 3 and x.strides[2] != 1):
+            raise NotImplementedError("Pixel data must be contiguous")
+
+    bbox = _libstbt.changed_bounding_box(
+        a.ctypes.data_as(ctypes.POINTER(ctypes.c_uint8)), a.strides[0],
+        b.ctypes.data_as(ctypes.POINTER(ctypes.c_uint8)), b.strides[0],
+        bytes_per_px, a.shape[1], a.shape[0])
+    return _bbox_to_region(bbox)
+
+
+def _bbox_to_region(bbox: _BoundingBox) -> Region | None:
+    if bbox.right == 0:
+        return None
+    return Region(x=bbox.x, y=bbox.y, right=bbox.right, bottom=bbox.bottom)
@@ -0,0 +1,168 @@
+"""ctypes wrapper for the parts of libtesseract's C API that we use.
+
+See https://github.com/tesseract-ocr/tesseract/blob/main/include/tesseract/capi.h
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+
+import numpy
+
+
+_libtesseract = None
+
+
+def _lib():
+    """Loads libtesseract on first use, so that importing this module doesn't
+    fail if tesseract isn't installed.
+
+    :raises ImportError: If libtesseract can't be loaded.
+    """
+    global _libtesseract
+    if _libtesseract is not None:
+        return _libtesseract
+
+    libname = ctypes.util.find_library("tesseract")
+    if libname is None:
+        raise ImportError("Failed to find libtesseract")
+    try:
+        lib = ctypes.CDLL(libname)
+    except OSError:
+        raise ImportError("Failed to load %s" % libname)
+
+    # const char* TessVersion();
+    lib.TessVersion.restype = ctypes.c_char_p
+    lib.TessVersion.argtypes = []
+
+    # void TessDeleteText(const char* text);
+    lib.TessDeleteText.restype = None
+    lib.TessDeleteText.argtypes = [ctypes.c_void_p]
+
+    # TessBaseAPI* TessBaseAPICreate();
+    lib.TessBaseAPICreate.restype = ctypes.c_void_p
+    lib.TessBaseAPICreate.argtypes = []
+
+    # void TessBaseAPIDelete(TessBaseAPI* handle);
+    lib.TessBaseAPIDelete.restype = None
+    lib.TessBaseAPIDelete.argtypes = [ctypes.c_void_p]
+
+    # int TessBaseAPIInit4(
+    #     TessBaseAPI* handle, const char* datapath, const char* language,
+    #     TessOcrEngineMode mode, char** configs, int configs_size,
+    #     char** vars_vec, char** vars_values, size_t vars_vec_size,
+    #     BOOL set_only_non_debug_params);
+    lib.TessBaseAPIInit4.restype = ctypes.c_int
+    lib.TessBaseAPIInit4.argtypes = [
+        ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p,
+        ctypes.c_int, ctypes.POINTER(ctypes.c_char_p), ctypes.c_int,
+        ctypes.POINTER(ctypes.c_char_p), ctypes.POINTER(ctypes.c_char_p),
+        ctypes.c_size_t,
+        ctypes.c_int]
+
+    # void TessBaseAPISetPageSegMode(TessBaseAPI* handle, TessPageSegMode mode);
+    lib.TessBaseAPISetPageSegMode.restype = None
+    lib.TessBaseAPISetPageSegMode.argtypes = [
+        ctypes.c_void_p, ctypes.c_int]
+
+    # void TessBaseAPISetImage(
+    #     TessBaseAPI* handle, const unsigned char* imagedata, int width,
+    #     int height, int bytes_per_pixel, int bytes_per_line);
+    lib.TessBaseAPISetImage.restype = None
+    lib.TessBaseAPISetImage.argtypes = [
+        ctypes.c_void_p, ctypes.POINTER(ctypes.c_uint8), ctypes.c_int,
+        ctypes.c_int, ctypes.c_int, ctypes.c_int]
+
+    # int TessBaseAPIRecognize(TessBaseAPI* handle, ETEXT_DESC* monitor);
+    lib.TessBaseAPIRecognize.restype = ctypes.c_int
+    lib.TessBaseAPIRecognize.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+
+    # char* TessBaseAPIGetUTF8Text(TessBaseAPI* handle);
+    # char* TessBaseAPIGetHOCRText(TessBaseAPI* handle, int page_number);
+    # We use c_void_p rather than c_char_p so that we can free the result.
+    lib.TessBaseAPIGetUTF8Text.restype = ctypes.c_void_p
+    lib.TessBaseAPIGetUTF8Text.argtypes = [ctypes.c_void_p]
+    lib.TessBaseAPIGetHOCRText.restype = ctypes.c_void_p
+    lib.TessBaseAPIGetHOCRText.argtypes = [ctypes.c_void_p, ctypes.c_int]
+
+    # void TessBaseAPIClear(TessBaseAPI* handle);
+    lib.TessBaseAPIClear.restype = None
+    lib.TessBaseAPIClear.argtypes = [ctypes.c_void_p]
+
+    _libtesseract = lib
+    return lib
+
+
+def version() -> str:
+    return _lib().TessVersion().decode("utf-8")
+
+
+class TessBaseAPI():
+    """An initialised instance of Tesseract.
+
+    Initialisation (loading the language data) is the expensive part, so
+    instances are intended to be re-used for many images with the same
+    `lang`, `engine` and `variables`. Not thread-safe: Only use an instance
+    from one thread at a time.
+
+    ctypes releases the GIL while calling into libtesseract, so separate
+    instances can run in parallel in different threads.
+    """
+    def __init__(self, lang: str, engine: int, variables: dict[str, str]):
+        self._handle = None
+        self._lib = _lib()
+        self._handle = self._lib.TessBaseAPICreate()
+        if not self._handle:
+            raise MemoryError("TessBaseAPICreate failed")
+
+        keys = (ctypes.c_char_p * len(variables))(
+            *[k.encode("utf-8") for k in variables])
+        values = (ctypes.c_char_p * len(variables))(
+            *[v.encode("utf-8") for v in variables.values()])
+        # datapath=NULL: Use $TESSDATA_PREFIX or the compiled-in default, the
+        # same as the tesseract command-line tool.
+        if self._lib.TessBaseAPIInit4(
+                self._handle, None, lang.encode("utf-8"), int(engine),
+                None, 0, keys, values, len(variables), False) != 0:
+            self.close()
+            raise RuntimeError(
+                "Failed to initialise libtesseract with lang=%r" % (lang,))
+
+    def recognize(self, image: numpy.ndarray, mode: int, hocr: bool) -> str:
+        """OCR `image`, which must be a contiguous 8-bit RGB or grayscale
+        numpy array. Returns text, or hOCR (just the ``ocr_page`` element) if
+        `hocr` is True.
+        """
+        assert image.dtype == numpy.uint8 and image.flags.c_contiguous
+        if len(image.shape) == 2:
+            bytes_per_pixel = 1
+        else:
+            bytes_per_pixel = image.shape[2]
+        self._lib.TessBaseAPISetPageSegMode(self._handle, int(mode))
+        self._lib.TessBaseAPISetImage(
+            self._handle, image.ctypes.data_as(ctypes.POINTER(ctypes.c_uint8)),
+            image.shape[1], image.shape[0], bytes_per_pixel, image.strides[0])
+        try:
+            if self._lib.TessBaseAPIRecognize(self._handle, None) != 0:
+                raise RuntimeError("libtesseract: Recognize failed")
+            if hocr:
+                text = self._lib.TessBaseAPIGetHOCRText(self._handle, 0)
+            else:
+                text = self._lib.TessBaseAPIGetUTF8Text(self._handle)
+            if not text:
+                return ""
+            try:
+                return ctypes.string_at(text).decode("utf-8")
+            finally:
+                self._lib.TessDeleteText(text)
+        finally:
+            self._lib.TessBaseAPIClear(self._handle)
+
+    def close(self):
+        if self._handle:
+            self._lib.TessBaseAPIDelete(self._handle)
+            self._handle = None
+
+    def __del__(self):
+        self.close()
@@ -8,10 +8,15 @@ https://github.com/stb-tester/stb-tester/blob/master/LICENSE for details).
 
 from __future__ import annotations
 
+import concurrent.futures
+import copy
 import enum
 import itertools
-from collections import namedtuple
-from typing import Iterator, Optional
+import os
+import threading
+import weakref
+from collections import namedtuple, OrderedDict
+from typing import Iterable, Iterator, Optional
 
 import cv2
 import numpy
@@ -20,8 +25,9 @@ from . import cv2_compat
 from .config import ConfigurationError, get_config
 from .imgproc_cache import memoize_iterator
 from .imgutils import (
-    Frame, crop, FrameT, _frame_repr, ImageT, _image_region, limit_time,
-    load_image, _validate_region)
+    Frame, crop, FrameT, _file_cache_key, find_file, _frame_repr, Image,
+    _image_cache, ImageT, _image_region, limit_time, load_image, _to_frame,
+    _validate_region)
 from .logging import (_Annotation, ddebug, debug, draw_on, draw_source_region,
                       get_debug_level, ImageLogger)
 from .sqdiff import sqdiff
@@ -235,7 +241,7 @@ class MatchResult():
 
 
 def match(
-    image: ImageT,
+    image: ImageT | Template,
     frame: Optional[FrameT] = None,
     match_parameters: Optional[MatchParameters] = None,
     region: Region = Region.ALL,
@@ -243,7 +249,7 @@ def match(
     """
     Search for an image in a single video frame.
 
-    :type image: string or `numpy.ndarray`
+    :type image: string or `numpy.ndarray` or `Template`
     :param image:
       The image to search for. It can be the filename of a png file on disk, or
       a numpy array containing the pixel data in 8-bit BGR format. If the image
@@ -257,6 +263,9 @@ def match(
       OpenCV) or searching for images captured from the device-under-test
       earlier in the test script.
 
+      It can also be a `stbt.Template`: A reference image that has already
+      been pre-processed for matching.
+
     :type frame: `stbt.Frame` or `numpy.ndarray`
     :param frame:
       If this is specified it is used as the video frame to search in;
@@ -285,7 +294,7 @@ def match(
 
 
 def match_all(
-    image: ImageT,
+    image: ImageT | Template,
     frame: Optional[FrameT] = None,
     match_parameters: Optional[MatchParameters] = None,
     region: Region = Region.ALL,
@@ -323,6 +332,65 @@ def match_all(
             break
 
 
+def match_many(
+    images: Iterable[ImageT | Template],
+    frame: Optional[FrameT] = None,
+    match_parameters: Optional[MatchParameters] = None,
+    region: Region = Region.ALL,
+) -> list[MatchResult]:
+    """
+    Search for several images in a single video frame.
+
+    This gives the same results as calling `match` once for each image, but
+    it's faster because the pre-processing of the video frame is only done
+    once, instead of once per image. This is useful in a `FrameObject` that
+    checks for many different reference images in the same frame.
+
+    :type images: list of (string or `numpy.ndarray`)
+    :param images: The images to search for. See `match`.
+
+    :param frame: See `match`. All the images are searched for in the same
+      frame.
+    :param match_parameters: See `match`.
+    :param region: See `match`.
+
+    :returns:
+      A list of `MatchResult` objects, one for each image, in the same order
+      as ``images``.
+
+    Example:
+
+    .. code-block:: python
+
+        play, pause = stbt.match_many(["play.png", "pause.png"])
+
+    Added in v35.
+    """
+    if match_parameters is None:
+        match_parameters = MatchParameters()
+
+    if frame is None:
+        from stbt_core import get_frame
+        frame = get_frame()
+    frame = _to_frame(frame)
+
+    normed = _norm_frame(frame)
+    input_region = _validate_region(normed, region)
+    pyramid = _pyramid_cache.get(
+        frame, input_region, crop(normed, input_region))
+
+    results = []
+    for image in images:
+        result = next(_match_all(image, frame, match_parameters, region,
+                                 pyramid))
+        if result.match:
+            debug("Match found: %s" % str(result))
+        else:
+            debug("No match found. Closest match: %s" % str(result))
+        results.append(result)
+    return results
+
+
 def _norm_frame(frame: FrameT) -> FrameT:
     """Normalise single channel images to shape (h, w, 3) rather than (h, w) or
     (h, w, 1).  match has the invariant that it behaves the same as if you'd
@@ -365,10 +433,15 @@ def test_norm_frame():
     assert numpy.all(normed[:, :, 0] == normed[:, :, 2])
 
 
-def _match_all(image, frame: Optional[FrameT], match_parameters, region):
+def _match_all(image, frame: Optional[FrameT], match_parameters, region,
+               pyramid=None):
     """
     Generator that yields a sequence of zero or more truthy MatchResults,
     followed by a falsey MatchResult.
+
+    `pyramid` is an `_ImagePyramid` of the cropped & normalised `frame`, shared
+    between calls by `match_many`. If it's None we look it up in
+    `_pyramid_cache`.
     """
     if match_parameters is None:
         match_parameters = MatchParameters()
@@ -376,11 +449,14 @@ def _match_all(image, frame: Optional[FrameT], match_parameters, region):
     if frame is None:
         from stbt_core import get_frame
         frame = get_frame()
+    frame = _to_frame(frame)
 
     # Normalise single channel images to shape (h, w, 3) rather than just (h, w)
+    orig_frame = frame
     frame = _norm_frame(frame)
 
-    t = load_image(image, color_channels=(3, 4))
+    template = _load_template(image)
+    t = template.image
 
     if any(frame.shape[x] < t.shape[x] for x in (0, 1)):
         raise ValueError("Frame %r must be larger than reference image %r"
@@ -419,10 +495,15 @@ def _match_all(image, frame: Optional[FrameT], match_parameters, region):
         region=input_region)
     imglog.imwrite("source", frame)
 
+    cropped = crop(frame, input_region)
+    if pyramid is None:
+        pyramid = _pyramid_cache.get(orig_frame, input_region, cropped)
+    assert pyramid.image.shape == cropped.shape
+
     try:
         for (matched, match_region, first_pass_matched,
              first_pass_certainty) in _find_matches(
-                crop(frame, input_region), t, match_parameters, imglog):
+                cropped, template, match_parameters, imglog, pyramid):
 
             match_region = Region.from_extents(*match_region) \
                                  .translate(input_region)
@@ -443,7 +524,7 @@ def _match_all(image, frame: Optional[FrameT], match_parameters, region):
 
 
 def wait_for_match(
-    image: ImageT,
+    image: ImageT | Template,
     timeout_secs: float = 10,
     consecutive_matches: int = 1,
     match_parameters: Optional[MatchParameters] = None,
@@ -486,11 +567,12 @@ def wait_for_match(
 
     match_count = 0
     last_pos = Position(0, 0)
-    image = load_image(image)
+    template = _load_template(image)
+    image = template.image
     debug("Searching for " + (image.relative_filename or "<Image>"))
     res = None
     for frame in frames:
-        res = match(image, match_parameters=match_parameters,
+        res = match(template, match_parameters=match_parameters,
                     region=region, frame=frame)
         if res.match and (match_count == 0 or res.position == last_pos):
             match_count += 1
@@ -531,12 +613,16 @@ class MatchTimeout(UITestFailure):
 
 
 @memoize_iterator({"version": "33"})
-def _find_matches(image, template, match_parameters, imglog):
+def _find_matches(image, template, match_parameters, imglog, pyramid=None):
     """Our image-matching algorithm.
 
     Runs 2 passes: `_find_candidate_matches` to locate potential matches, then
     `_confirm_match` to discard false positives from the first pass.
 
+    `template` is a `Template`. `pyramid` is an optional `_ImagePyramid` of
+    `image`. It isn't part of the cache key because it's derived entirely from
+    `image`.
+
     Returns an iterator yielding zero or more `(True, position, certainty)`
     tuples for each location where `template` is found within `image`, followed
     by a single `(False, position, certainty)` tuple when there are no further
@@ -544,10 +630,11 @@ def _find_matches(image, template, match_parameters, imglog):
     """
 
     for i, first_pass_matched, region, first_pass_certainty in \
-            _find_candidate_matches(image, template, match_parameters, imglog):
+            _find_candidate_matches(image, template, match_parameters, imglog,
+                                    pyramid):
         confirmed = (
             first_pass_matched and
-            _confirm_match(image, region, template, match_parameters,
+            _confirm_match(image, region, template.image, match_parameters,
                            imwrite=lambda name, img: imglog.imwrite(
                                "match%d-%s" % (i, name), img)))  # pylint:disable=cell-var-from-loop
 
@@ -557,7 +644,8 @@ def _find_matches(image, template, match_parameters, imglog):
             break
 
 
-def _find_candidate_matches(image, template, match_parameters, imglog):
+def _find_candidate_matches(image, template, match_parameters, imglog,
+                            pyramid=None):
     """First pass: Search for `template` in the entire `image`.
 
     This searches the entire image, so speed is more important than accuracy.
@@ -568,6 +656,7 @@ def _find_candidate_matches(image, template, match_parameters, imglog):
     http://opencv-code.com/tutorials/fast-template-matching-with-image-pyramid
     """
 
+    compiled, template = template, template.image
     imglog.imwrite("template", template)
     imglog.set(template_shape=template.shape)
     if template.shape[2] == 4:
@@ -602,17 +691,10 @@ def _find_candidate_matches(image, template, match_parameters, imglog):
         yield (0, False, _image_region(image), 0.)
         return
 
-    if template.shape[2] == 4:
-        # OpenCV wants mask to match template's number of channels
-        mask = cv2.cvtColor(template[:, :, 3], cv2.COLOR_GRAY2BGR)
-        template = template[:, :, 0:3]
-    else:
-        mask = None
-
-    mask_pyramid = _build_pyramid(mask, levels, is_mask=True)
-    template_pyramid = _build_pyramid(template, len(mask_pyramid),
-                                      is_template=True)
-    image_pyramid = _build_pyramid(image, len(template_pyramid))
+    template_pyramid = compiled.levels(levels)
+    if pyramid is None:
+        pyramid = _ImagePyramid(image)
+    image_pyramid = pyramid.levels(len(template_pyramid))
     roi_mask = None  # Initial region of interest: The whole image.
 
     (best_match_position, certainty, heatmap, heatmap_scale, level, matched,
@@ -629,8 +711,9 @@ def _find_candidate_matches(image, template, match_parameters, imglog):
             imglog.imwrite("level%d-%s" % (level, name), img, scale=scale)  # pylint:disable=cell-var-from-loop
 
         heatmap, heatmap_scale = _match_template(
-            image_pyramid[level], template_pyramid[level], mask_pyramid[level],
-            method, roi_mask, level, imwrite)
+            image_pyramid[level], template_pyramid[level].template,
+            template_pyramid[level].mask, method, roi_mask, level, imwrite,
+            template_pyramid[level].mask_nonzero)
 
         # Relax the threshold slightly for scaled-down pyramid levels to
         # compensate for scaling artifacts.
@@ -687,7 +770,8 @@ def _find_candidate_matches(image, template, match_parameters, imglog):
                         width=template.shape[1], height=template.shape[0])
 
 
-def _match_template(image, template, mask, method, roi_mask, level, imwrite):
+def _match_template(image, template, mask, method, roi_mask, level, imwrite,
+                    mask_nonzero=None):
 
     ddebug("Level %d: image %s, template %s" % (
         level, image.shape, template.shape))
@@ -741,7 +825,8 @@ def _match_template(image, template, mask, method, roi_mask, level, imwrite):
         kwargs = {"mask": mask}
     else:
         kwargs = {}  # For OpenCV < 3.0.0
-    for roi in rois:
+
+    def search(roi):
         r = roi.extend(right=template.shape[1] - 1,
                        bottom=template.shape[0] - 1)
         ddebug("Level %d: Searching in %s" % (level, r))
@@ -752,6 +837,19 @@ def _match_template(image, template, mask, method, roi_mask, level, imwrite):
             matches_heatmap[roi.to_slice()],
             **kwargs)
 
+    # Read the setting even if there's only 1 ROI, so that an invalid value
+    # is always reported:
+    executor = _roi_search_executor()
+    if executor is None or len(rois) <= 1:
+        for roi in rois:
+            search(roi)
+    else:
+        # cv2.matchTemplate releases the GIL. ROIs can overlap, but then the
+        # threads write identical values to the overlapping part of the
+        # heatmap.
+        for future in [executor.submit(search, roi) for roi in rois]:
+            future.result()
+
     if method == cv2.TM_SQDIFF:
         # OpenCV's SQDIFF_NORMED normalises by the pixel intensity across
         # the reference image and the source image patch. This doesn't work
@@ -761,12 +859,14 @@ def _match_template(image, template, mask, method, roi_mask, level, imwrite):
         # We still get a number between 0 - 1.
 
         if mask is not None:
+            if mask_nonzero is None:
+                mask_nonzero = numpy.count_nonzero(mask)
             if cv2_compat.version < [4, 4, 0]:
                 # matchTemplateMask normalises source & template image to [0,1].
                 # https://github.com/opencv/opencv/blob/3.2.0/modules/imgproc/src/templmatch.cpp#L840-L917
-                scale = max(1, numpy.count_nonzero(mask))
+                scale = max(1, mask_nonzero)
             else:
-                scale = max(1, numpy.count_nonzero(mask)) * (255 ** 2)
+                scale = max(1, mask_nonzero) * (255 ** 2)
         else:
             scale = template.size * (255 ** 2)
     else:
@@ -783,6 +883,39 @@ def _match_template(image, template, mask, method, roi_mask, level, imwrite):
     return matches_heatmap, scale
 
 
+_roi_search_executor_lock = threading.Lock()
+_roi_search_executor_state: "tuple[int, concurrent.futures.Executor] | None" = (
+    None)
+
+
+def _roi_search_executor() -> "concurrent.futures.Executor | None":
+    """Thread-pool used by `_match_template` to search several ROIs in
+    parallel, or None if disabled.
+
+    Configured by ``roi_search_threads`` in the ``[match]`` section of
+    .stbt.conf: 1 (the default) searches ROIs sequentially; 0 means use one
+    thread per CPU.
+    """
+    global _roi_search_executor_state
+    n = get_config("match", "roi_search_threads", type_=int)
+    if n < 0:
+        raise ConfigurationError("'match.roi_search_threads' must be >= 0")
+    if n == 0:
+        n = os.cpu_count() or 1
+    if n == 1:
+        return None
+    with _roi_search_executor_lock:
+        if (_roi_search_executor_state is None or
+                _roi_search_executor_state[0] != n):
+            # We don't shut down the old pool: Another thread might have just
+            # got it from us and be about to call `submit`. Its threads exit
+            # when it's garbage-collected.
+            _roi_search_executor_state = (
+                n, concurrent.futures.ThreadPoolExecutor(
+                    max_workers=n, thread_name_prefix="stbt-match"))
+        return _roi_search_executor_state[1]
+
+
 def _find_best_match_position(matches_heatmap, scale, threshold, level):
     min_value, _, min_location, _ = cv2.minMaxLoc(matches_heatmap)
     min_value /= scale
@@ -795,6 +928,116 @@ def _find_best_match_position(matches_heatmap, scale, threshold, level):
     return (matched, best_match_position, certainty)
 
 
+class Template():
+    """A reference image, pre-processed ready for `match`.
+
+    Before searching for a reference image, `match` converts its alpha channel
+    (if any) into a mask, and builds downsampled copies of the image and mask
+    (for the first pass of the matching algorithm). A ``Template`` stores the
+    results of this work so that it only needs to be done once.
+
+    You can pass a ``Template`` anywhere that `match`, `match_all`,
+    `match_many`, or `wait_for_match` accept a reference image. For example::
+
+        PLAY = stbt.Template("play.png")
+
+        class Player(stbt.FrameObject):
+            @property
+            def is_playing(self):
+                return bool(stbt.match(PLAY, frame=self._frame))
+
+    Reference images given as filenames are already converted to ``Template``
+    objects behind the scenes, and cached (up to ``cache_size_mb`` megabytes,
+    configured in the ``[load_image]`` section of :ref:`.stbt.conf`), so you
+    only need to create a ``Template`` yourself if you're searching for the
+    same numpy array many times.
+
+    :param image: The reference image: A filename or numpy array, as accepted
+        by `match`.
+
+    :ivar Image image: The reference image, as returned by `load_image`.
+
+    Added in v35.
+    """
+    def __init__(self, image: ImageT | Template):
+        if isinstance(image, Template):
+            image = image.image
+        self.image: Image = load_image(image, color_channels=(3, 4))
+        if self.image.shape[2] == 4:
+            # OpenCV wants mask to match template's number of channels
+            self._mask = cv2.cvtColor(self.image[:, :, 3],
+                                      cv2.COLOR_GRAY2BGR)
+            self._bgr = self.image[:, :, 0:3]
+        else:
+            self._mask = None
+            self._bgr = self.image
+        self._levels: "dict[int, list[_TemplateLevel]]" = {}
+        self._lock = threading.Lock()
+
+        levels = get_config("match", "pyramid_levels", type_=int)
+        if levels > 0:
+            self.levels(levels)
+
+    def levels(self, n) -> "list[_TemplateLevel]":
+        """The pyramid (see `_build_pyramid`) of the reference image, with at
+        most `n` levels.
+        """
+        with self._lock:
+            if n not in self._levels:
+                mask_pyramid = _build_pyramid(self._mask, n, is_mask=True)
+                template_pyramid = _build_pyramid(
+                    self._bgr, len(mask_pyramid), is_template=True)
+                self._levels[n] = [
+                    _TemplateLevel(
+                        t, m, None if m is None else numpy.count_nonzero(m))
+                    for t, m in zip(template_pyramid, mask_pyramid)]
+            return self._levels[n]
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory used, for `_ImageCache`."""
+        n = self.image.nbytes
+        if self._mask is not None:
+            n += self._mask.nbytes
+        for levels in self._levels.values():
+            for level in levels[1:]:
+                n += level.template.nbytes
+                if level.mask is not None:
+                    n += level.mask.nbytes
+        return n
+
+    def _with_filename(self, filename):
+        # Shares the pre-processed data with `self`. `Image.relative_filename`
+        # depends on the test-pack root, so it isn't cached along with the
+        # pre-processed data.
+        t = copy.copy(self)
+        t.image = Image(self.image, filename=filename)
+        return t
+
+    def __repr__(self):
+        return "<Template(image=%r)>" % (self.image,)
+
+
+class _TemplateLevel(
+        namedtuple("_TemplateLevel", "template mask mask_nonzero")):
+    pass
+
+
+def _load_template(image: ImageT | Template) -> Template:
+    """Returns a `Template` for `image`. Templates loaded from files are cached
+    in `_image_cache`.
+    """
+    if isinstance(image, Template):
+        return image
+    if isinstance(image, str):
+        absolute_filename = find_file(image)
+        compiled = _image_cache.get(
+            ("Template",) + _file_cache_key(absolute_filename),
+            lambda: Template(absolute_filename))
+        return compiled._with_filename(image)
+    return Template(image)
+
+
 def _build_pyramid(image, levels, is_template=False, is_mask=False):
     """A "pyramid" is [an image, the same image at 1/2 the size, at 1/4, ...]
 
@@ -838,6 +1081,121 @@ def _build_pyramid(image, levels, is_template=False, is_mask=False):
     return pyramid
 
 
+class _ImagePyramid():
+    """The pyramid (see `_build_pyramid`) of a video-frame, built lazily.
+
+    The levels of a frame's pyramid don't depend on the reference image, so
+    `match_many` shares a single instance between all of the reference images
+    it's searching for.
+    """
+    def __init__(self, image, downsampled=None):
+        self.image = image
+        # Levels 1 and up. These are copies (not views of `image`), so
+        # `_PyramidCache` can keep them without keeping the frame alive.
+        self._downsampled = (
+            downsampled if downsampled is not None else _DownsampledLevels())
+
+    def levels(self, n):
+        """Returns the first `n` levels of the pyramid (or fewer, if the image
+        is too small to downsample that many times).
+        """
+        d = self._downsampled
+        with d.lock:
+            if len(d.levels) + 1 < n:
+                d.levels += _build_pyramid(
+                    d.levels[-1] if d.levels else self.image,
+                    n - len(d.levels))[1:]
+            return [self.image] + d.levels[:n - 1]
+
+
+class _DownsampledLevels():
+    def __init__(self):
+        self.levels = []
+        self.lock = threading.Lock()
+
+
+class _PyramidCache():
+    """Remembers the pyramids of the most recently searched frames.
+
+    A `FrameObject` typically calls `match` many times on the same frame (once
+    per property) so we can save the work of building the frame's pyramid
+    every time.
+
+    Entries are keyed on the identity of the frame object (plus the region
+    searched) so we hold a weak reference to the frame to detect when its
+    `id` has been re-used by a different frame. We only cache read-only frames
+    (such as those returned by `stbt.get_frame` or `stbt.load_image`) because
+    we can't tell whether a writeable frame has been modified since the last
+    time we saw it.
+
+    We only store the downsampled levels (level 0 is a view of the frame), so
+    we don't keep the frame alive, and an entry is dropped when its frame is
+    garbage-collected. At most `maxsize` entries are kept, so the memory used
+    is bounded by `maxsize` × 1/3 of the (normalised, cropped) frame.
+    """
+    def __init__(self, maxsize=4):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Keys of entries whose frame has been garbage-collected. The weakref
+        # callback can run at any time (even in this thread while we're
+        # holding `_lock`) so it just appends here, and `get` removes them.
+        self._dead = []
+
+    def get(self, frame, region, image):
+        """Returns an `_ImagePyramid` for `image`, which is `frame` normalised
+        & cropped to `region`.
+        """
+        if not _is_read_only(frame):
+            return _ImagePyramid(image)
+
+        key = (id(frame), region)
+        with self._lock:
+            while self._dead:
+                ref, dead_key = self._dead.pop()
+                entry = self._entries.get(dead_key)
+                if entry is not None and entry[0] is ref:
+                    del self._entries[dead_key]
+
+            entry = self._entries.get(key)
+            if entry is not None and entry[0]() is frame:
+                self._entries.move_to_end(key)
+                return _ImagePyramid(image, entry[1])
+
+            pyramid = _ImagePyramid(image)
+            try:
+                ref = weakref.ref(
+                    frame, lambda r: self._dead.append((r, key)))
+            except TypeError:
+                return pyramid
+            self._entries[key] = (ref, pyramid._downsampled)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            return pyramid
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_pyramid_cache = _PyramidCache()
+
+
+def _is_read_only(array):
+    """True if neither `array` nor any array it's a view of is writeable."""
+    if not isinstance(array, numpy.ndarray):
+        return False
+    while isinstance(array, numpy.ndarray):
+        if array.flags.writeable:
+            return False
+        array = array.base
+    return True
+
+
 def _upsample(position, levels):
     """Convert position coordinates by the given number of pyramid levels.
 
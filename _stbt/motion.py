@@ -63,7 +63,9 @@ def detect_motion(
 
     :param Differ differ:
         The difference-detection algorithm to use. Defaults to
-        `stbt.BGRDiff()`.
+        `stbt.BGRDiff()`. To compare downsampled frames, which is faster, set
+        ``scale`` (for example 0.5) in the ``[motion]`` section of
+        :ref:`.stbt.conf`; this only applies to the default differ.
 
     :param int noise_threshold:
         Deprecated synonym for ``threshold``. Use ``threshold`` instead.
@@ -123,6 +125,9 @@ def detect_motion(
         differ = detect_motion.differ  # pyright:ignore[reportFunctionMemberAccess]
         assert differ is not None
         differ = differ.replace(threshold=threshold)
+        scale = get_config('motion', 'scale', type_=float)
+        if scale != 1:
+            differ = differ.replace(scale=scale)
     dm = DetectMotion(differ, frame, mask)
     for frame in frames:
         result = dm.diff(frame)
@@ -147,17 +152,28 @@ class DetectMotion():
     - Remember the work done on already-seen frames (e.g. GrayscaleDiff's
       colorspace conversion).
     - The logic for when we update the "reference" frame.
+
+    If the caller only looks at whether there was motion, not at the
+    `MotionResult.region`, pass ``need_region=False`` so that the differ can
+    stop comparing as soon as it finds enough differences (see
+    `Differ.diff_any`).
     """
     def __init__(self, differ: Differ, initial_frame: FrameT,
-                 mask: MaskTypes = Region.ALL):
+                 mask: MaskTypes = Region.ALL, need_region: bool = True):
         self.differ: Differ = differ
+        self.need_region: bool = need_region
         self.mask_tuple = differ.preprocess_mask(
             mask, _image_region(initial_frame))
         self.prev_frame = differ.preprocess(initial_frame, self.mask_tuple)
 
     def diff(self, frame: FrameT) -> MotionResult:
         new_frame = self.differ.preprocess(frame, self.mask_tuple)
-        motion = self.differ.diff(self.prev_frame, new_frame, self.mask_tuple)
+        if self.need_region:
+            motion = self.differ.diff(
+                self.prev_frame, new_frame, self.mask_tuple)
+        else:
+            motion = self.differ.diff_any(
+                self.prev_frame, new_frame, self.mask_tuple)
 
         if motion:
             # Only update the comparison frame if it's different to the previous
@@ -7,16 +7,20 @@ import os
 import re
 import shutil
 import subprocess
+import threading
 import unicodedata
+from contextlib import contextmanager
 from enum import IntEnum
-from typing import Optional
+from typing import Optional, Sequence
 
 import cv2
 import numpy
 
 from . import imgproc_cache
-from .config import get_config
-from .imgutils import Color, ColorT, crop, FrameT, _frame_repr, _validate_region
+from .config import ConfigurationError, get_config
+from .imgutils import (
+    Color, ColorT, crop, FrameT, _frame_repr, _to_frame, _to_grayscale,
+    _validate_region)
 from .logging import debug, draw_source_region, ImageLogger, warn
 from .types import Region
 from .utils import LooseVersion, named_temporary_directory, to_unicode
@@ -303,6 +307,190 @@ def ocr(
     return text
 
 
+def ocr_many(
+    frame: Optional[FrameT],
+    regions: Sequence[Region],
+    mode: OcrMode = OcrMode.PAGE_SEGMENTATION_WITHOUT_OSD,
+    lang: Optional[str] = None,
+    tesseract_config: Optional[dict[str, bool | str | int]] = None,
+    tesseract_user_words: Optional[list[str] | str] = None,
+    tesseract_user_patterns: Optional[list[str] | str] = None,
+    upsample: Optional[bool] = None,
+    text_color: Optional[ColorT] = None,
+    text_color_threshold: Optional[float] = None,
+    engine: Optional[OcrEngine] = None,
+    char_whitelist: Optional[str] = None,
+    corrections: Optional[CorrectionsT] = None,
+) -> list[str]:
+    """Read the text in several regions of the same video frame.
+
+    This is equivalent to ``[stbt.ocr(frame, region, ...) for region in
+    regions]`` but it is much faster when there are many regions, such as
+    every cell of an EPG grid: Instead of running Tesseract once per region,
+    ``ocr_many`` stacks the regions on top of each other (separated by some
+    padding) into a single image, runs Tesseract once, and then splits
+    Tesseract's output back out into the text for each region.
+
+    Because Tesseract sees all the regions at once, its page layout analysis
+    can occasionally give slightly different results than reading each
+    region on its own. For this reason ``mode`` must be one of the modes that
+    does layout analysis (such as the default,
+    ``OcrMode.PAGE_SEGMENTATION_WITHOUT_OSD``), not a mode like
+    ``OcrMode.SINGLE_LINE`` that expects a single line or word.
+
+    :param Frame frame:
+      If this is None, a new frame is grabbed from the device-under-test.
+
+    :param list[Region] regions:
+      The regions of the frame to read.
+
+    All the other parameters are the same as for `stbt.ocr`, and they apply to
+    every region.
+
+    :rtype: list[str]
+    :returns: The text in each region, in the same order as ``regions``.
+
+    Added in v35.
+    """
+    if frame is None:
+        from stbt_core import get_frame
+        frame = get_frame()
+    frame = _to_frame(frame)
+
+    regions = [_validate_region(frame, r) for r in regions]
+    if not regions:
+        return []
+
+    if mode in _OCR_MANY_UNSUPPORTED_MODES:
+        # NB `str(mode)` looks like "OcrMode.SINGLE_LINE"
+        raise ValueError("%s isn't supported by ocr_many" % (mode,))
+
+    if isinstance(tesseract_user_words, (bytes, str)):
+        tesseract_user_words = [tesseract_user_words]
+
+    if isinstance(tesseract_user_patterns, (bytes, str)):
+        tesseract_user_patterns = [tesseract_user_patterns]
+
+    if upsample is None:
+        upsample = get_config("ocr", "upsample", type_=bool)
+
+    _config = dict(tesseract_config or {})
+    _config['tessedit_create_hocr'] = 1
+
+    for region in regions:
+        draw_source_region(frame, region)
+    imglog = ImageLogger("ocr_many", result=None)
+
+    composite, strips = _stack_regions(frame, regions)
+    xml = _tesseract(
+        composite, Region.ALL, mode, lang, _config,
+        tesseract_user_patterns, tesseract_user_words, upsample, text_color,
+        text_color_threshold, engine, char_whitelist, imglog)
+
+    # `_tesseract` scales the image up by a factor of 3 so we must undo this
+    # transformation here.
+    n = 3 if upsample else 1
+    texts = []
+    for text in _hocr_split(xml, [(top * n, bottom * n)
+                                  for top, bottom in strips]):
+        text = text.strip().translate(_ocr_transtab)
+        texts.append(apply_ocr_corrections(text, corrections))
+
+    debug("ocr_many(frame=%s, regions=%r): %r"
+          % (_frame_repr(frame), regions, texts))
+    _log_ocr_image_debug(imglog, "\n\n".join(texts))
+    return texts
+
+
+# These modes treat the whole image as a single line, word or character, so
+# they would merge the text from all the regions given to `ocr_many`.
+_OCR_MANY_UNSUPPORTED_MODES = (
+    OcrMode.ORIENTATION_AND_SCRIPT_DETECTION_ONLY,
+    OcrMode.PAGE_SEGMENTATION_WITHOUT_OSD_OR_OCR,
+    OcrMode.SINGLE_LINE,
+    OcrMode.SINGLE_WORD,
+    OcrMode.SINGLE_WORD_IN_A_CIRCLE,
+    OcrMode.SINGLE_CHARACTER,
+    OcrMode.RAW_LINE,
+)
+
+# Pixels of background colour around each region in `ocr_many`'s composite
+# image, so that Tesseract sees the regions as separate blocks of text.
+_OCR_MANY_PADDING = 10
+
+
+def _stack_regions(frame, regions):
+    """Stack the specified regions of `frame` vertically into a single image.
+
+    Each region is surrounded by `_OCR_MANY_PADDING` pixels of its own
+    background colour (the median colour of the region's border).
+
+    Returns the composite image and, for each region, the (top, bottom) y
+    coordinates of its strip (including padding) in the composite image.
+    Every row of the composite image belongs to exactly one strip.
+    """
+    p = _OCR_MANY_PADDING
+    width = max(r.width for r in regions) + 2 * p
+    crops = []
+    strips = []
+    y = 0
+    for region in regions:
+        c = crop(frame, region)
+        border = numpy.concatenate([c[0], c[-1], c[:, 0], c[:, -1]])
+        background = numpy.median(border, axis=0)
+        c = cv2.copyMakeBorder(
+            c, p, p, p, width - c.shape[1] - p, cv2.BORDER_CONSTANT,
+            value=[float(x) for x in numpy.atleast_1d(background)])
+        crops.append(c)
+        strips.append((y, y + c.shape[0]))
+        y += c.shape[0]
+    return numpy.concatenate(crops), strips
+
+
+def _hocr_split(xml, strips):
+    """Split Tesseract's hOCR output into the text for each strip.
+
+    Each word is assigned to the strip that contains the centre of its
+    bounding box. Returns a list of strings, one per strip, with lines
+    separated by newlines and paragraphs separated by blank lines (like
+    Tesseract's plain-text output).
+    """
+    # For each strip, a list of paragraphs; each paragraph is a list of lines;
+    # each line is a list of words.
+    paragraphs = [[] for _ in strips]
+    if xml:
+        import lxml.etree
+        hocr = lxml.etree.fromstring(xml.encode('utf-8'))
+        for par in hocr.iterfind('.//{*}p'):
+            started = set()  # strips that have text in this paragraph
+            lines = {}  # strip -> the line element we're appending to
+            for word in par.iterfind('.//{*}span'):
+                if 'ocrx_word' not in (word.get('class') or '').split():
+                    continue
+                text = "".join(word.itertext()).strip()
+                if not text:
+                    continue
+                box = _hocr_elem_region(word)
+                i = _strip_index(strips, (box.y + box.bottom) // 2)
+                if i not in started:
+                    paragraphs[i].append([])
+                    started.add(i)
+                if lines.get(i) is not word.getparent():
+                    paragraphs[i][-1].append([])
+                    lines[i] = word.getparent()
+                paragraphs[i][-1][-1].append(text)
+    return ["\n\n".join("\n".join(" ".join(words) for words in lines)
+                        for lines in pars)
+            for pars in paragraphs]
+
+
+def _strip_index(strips, y):
+    for i, (_, bottom) in enumerate(strips):
+        if y < bottom:
+            return i
+    return len(strips) - 1
+
+
 def match_text(
     text: str,
     frame: Optional[FrameT] = None,
@@ -644,7 +832,14 @@ def _tesseract(frame, region, mode, lang, _config, user_patterns, user_words,
                char_whitelist=char_whitelist,
                tesseract_version=tesseract_version)
 
-    frame = crop(frame, region)
+    if text_color is None and getattr(frame, "_luma", None) is not None:
+        # Captured in YUV format (see `capture_format` in the `[frames]`
+        # section of stbt.conf). Tesseract converts the image to grayscale
+        # anyway, so give it the Y plane instead of converting the frame to
+        # BGR.
+        frame = _to_grayscale(frame, region)
+    else:
+        frame = crop(frame, region)
 
     if text_color is not None:
         if upsample:
@@ -653,10 +848,26 @@ def _tesseract(frame, region, mode, lang, _config, user_patterns, user_words,
         frame = ocr.text_color_differ(frame, text_color, text_color_threshold,
                                       imglog)
 
-    return _tesseract_subprocess(frame, mode, lang, _config,  # pylint:disable=unexpected-keyword-arg
-                                 user_patterns, user_words, upsample,
-                                 engine, char_whitelist, imglog,
-                                 tesseract_version, use_cache=True)
+    backend = get_config("ocr", "backend")
+    if backend == "libtesseract" and not imglog.enabled:
+        # We can't get tesseract's debug images (see `tessedit_write_images`)
+        # from libtesseract, so we use the subprocess backend when debugging.
+        if tesseract_version < [4, 0]:
+            raise ConfigurationError(
+                "ocr.backend=libtesseract requires tesseract 4.0 or later "
+                "(you have %s)" % (tesseract_version,))
+        f = _tesseract_libtesseract
+    elif backend in ("subprocess", "libtesseract"):
+        f = _tesseract_subprocess
+    else:
+        raise ConfigurationError(
+            "Invalid value for ocr.backend: %r. Valid values are "
+            "'subprocess' and 'libtesseract'" % (backend,))
+
+    return f(frame, mode, lang, _config,  # pylint:disable=unexpected-keyword-arg
+             user_patterns, user_words, upsample,
+             engine, char_whitelist, imglog,
+             tesseract_version, use_cache=True)
 
 
 def bgr_diff(frame, color, threshold, imglog):
@@ -725,34 +936,22 @@ def _tesseract_subprocess(
                 tesseract_version >= [3, 4]):
             _config['tessedit_create_txt'] = 0
 
+        _check_tesseract_config(_config, user_patterns, user_words,
+                                char_whitelist)
+
         if user_words:
-            if 'user_words_suffix' in _config:
-                raise ValueError(
-                    "You cannot specify 'user_words' and " +
-                    "'tesseract_config[\"user_words_suffix\"]' " +
-                    "at the same time")
             with open('%s/%s.user-words' % (tessdata_dir, lang),
                       'w', encoding='utf-8') as f:
                 f.write('\n'.join(to_unicode(x) for x in user_words))
             _config['user_words_suffix'] = 'user-words'
 
         if user_patterns:
-            if 'user_patterns_suffix' in _config:
-                raise ValueError(
-                    "You cannot specify 'user_patterns' and " +
-                    "'tesseract_config[\"user_patterns_suffix\"]' " +
-                    "at the same time")
             with open('%s/%s.user-patterns' % (tessdata_dir, lang),
                       'w', encoding='utf-8') as f:
                 f.write('\n'.join(to_unicode(x) for x in user_patterns))
             _config['user_patterns_suffix'] = 'user-patterns'
 
         if char_whitelist:
-            if 'tessedit_char_whitelist' in _config:
-                raise ValueError(
-                    "You cannot specify 'char_whitelist' and " +
-                    "'tesseract_config[\"tessedit_char_whitelist\"]' " +
-                    "at the same time")
             _config["tessedit_char_whitelist"] = char_whitelist
 
         if imglog.enabled:
@@ -789,6 +988,143 @@ def _tesseract_subprocess(
                     return f.read()
 
 
+def _check_tesseract_config(_config, user_patterns, user_words,
+                            char_whitelist):
+    for arg, key, value in [
+            ("user_words", "user_words_suffix", user_words),
+            ("user_patterns", "user_patterns_suffix", user_patterns),
+            ("char_whitelist", "tessedit_char_whitelist", char_whitelist)]:
+        if value and key in _config:
+            raise ValueError(
+                "You cannot specify '%s' and 'tesseract_config[\"%s\"]' at "
+                "the same time" % (arg, key))
+
+
+@imgproc_cache.memoize({"version": "33"})
+def _tesseract_libtesseract(
+        frame, mode, lang, _config, user_patterns, user_words, upsample,
+        engine, char_whitelist, imglog, tesseract_version):  # pylint:disable=unused-argument
+    """Equivalent to `_tesseract_subprocess` but using `_tesseract_pool`.
+
+    Returns the same output as the tesseract command-line tool, except for the
+    <title> in the hOCR header (the command-line tool puts the input filename
+    there).
+    """
+
+    _check_tesseract_config(_config, user_patterns, user_words, char_whitelist)
+
+    if upsample:
+        frame = _upsample(frame, imglog)
+
+    hocr = bool(_config.get('tessedit_create_hocr'))
+    variables = {}
+    for k, v in _config.items():
+        if isinstance(v, bool):
+            variables[k] = 'T' if v else 'F'
+        else:
+            variables[k] = to_unicode(v)
+    if char_whitelist:
+        variables["tessedit_char_whitelist"] = char_whitelist
+
+    # The command-line tool reads a PNG, which leptonica loads as RGB (or
+    # grayscale); libtesseract wants the same.
+    if len(frame.shape) == 3 and frame.shape[2] == 3:
+        image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    else:
+        image = numpy.ascontiguousarray(frame)
+        if len(image.shape) == 3:
+            image = image.reshape(image.shape[:2])
+
+    with _tesseract_pool.get(lang, engine, variables, user_words,
+                             user_patterns) as api:
+        text = api.recognize(image, mode, hocr=hocr)
+
+    if hocr:
+        from . import libtesseract
+        text = _HOCR_HEADER % libtesseract.version() + text + _HOCR_FOOTER
+    return text
+
+
+# The header & footer that the tesseract command-line tool's hOCR renderer
+# writes around the output of `TessBaseAPIGetHOCRText`.
+_HOCR_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN"\n'
+    '    "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">\n'
+    '<html xmlns="http://www.w3.org/1999/xhtml" xml:lang="en" lang="en">\n'
+    ' <head>\n'
+    '  <title></title>\n'
+    '  <meta http-equiv="Content-Type" content="text/html;charset=utf-8"/>\n'
+    "  <meta name='ocr-system' content='tesseract %s' />\n"
+    "  <meta name='ocr-capabilities' content='ocr_page ocr_carea ocr_par"
+    " ocr_line ocrx_word ocrp_wconf'/>\n"
+    ' </head>\n'
+    ' <body>\n')
+_HOCR_FOOTER = ' </body>\n</html>\n'
+
+
+class _TesseractPool():
+    """Initialised instances of libtesseract, ready for re-use.
+
+    Initialising tesseract is expensive (it loads the language data) and
+    tesseract's "init-only" configuration variables (such as user words &
+    patterns) can only be set at initialisation, so each instance is tied to
+    a particular configuration. We keep up to ``workers`` (from the ``[ocr]``
+    section of stbt.conf) idle instances, discarding the least recently used.
+    Any number of instances can be in use at the same time, by different
+    threads.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle = collections.OrderedDict()  # key -> list of TessBaseAPI
+
+    @contextmanager
+    def get(self, lang, engine, variables, user_words, user_patterns):
+        from . import libtesseract
+
+        key = (lang, int(engine), tuple(sorted(variables.items())),
+               tuple(user_words or ()), tuple(user_patterns or ()))
+        api = None
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                api = idle.pop()
+                self._idle.move_to_end(key)
+        if api is None:
+            variables = dict(variables)
+            # Tesseract reads the user words & patterns files during
+            # initialisation, so we can delete them straight afterwards.
+            with named_temporary_directory(prefix='stbt-ocr-') as tmp:
+                for name, words in [("user_words", user_words),
+                                    ("user_patterns", user_patterns)]:
+                    if words:
+                        filename = "%s/%s" % (tmp, name)
+                        with open(filename, "w", encoding="utf-8") as f:
+                            f.write('\n'.join(to_unicode(x) for x in words))
+                        variables[name + "_file"] = filename
+                api = libtesseract.TessBaseAPI(lang, engine, variables)
+
+        try:
+            yield api
+        except Exception:
+            api.close()
+            raise
+
+        with self._lock:
+            self._idle.setdefault(key, []).append(api)
+            self._idle.move_to_end(key)
+            n = sum(len(x) for x in self._idle.values())
+            while n > get_config("ocr", "workers", type_=int):
+                old_key, old = next(iter(self._idle.items()))
+                old.pop(0).close()
+                n -= 1
+                if not old:
+                    del self._idle[old_key]
+
+
+_tesseract_pool = _TesseractPool()
+
+
 def _upsample(frame, imglog):
     # We scale image up 3x before feeding it to tesseract as this
     # significantly reduces the error rate by more than 6x in tests.  This
@@ -875,8 +1211,8 @@ def _log_ocr_image_debug(imglog, output=None):
     if not imglog.enabled:
         return
 
-    if imglog.name == "ocr":
-        title = "stbt.ocr"
+    if imglog.name in ("ocr", "ocr_many"):
+        title = "stbt." + imglog.name
         match_text = False  # pylint:disable=redefined-outer-name
     else:
         match_text = True
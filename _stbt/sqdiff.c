@@ -1,5 +1,8 @@
+#include <stddef.h>
 #include <stdint.h>
+#include <stdlib.h>
 #include <assert.h>
+#include <string.h>
 
 enum PixelDepth {
     PIXEL_DEPTH_U8 = 0,
@@ -23,6 +26,27 @@ static void threshold_diff_BGR_line(
     uint16_t len_px, uint32_t threshold_sq
 );
 
+typedef struct _BoundingBox {
+    uint16_t x;
+    uint16_t y;
+    uint16_t right;
+    uint16_t bottom;
+} BoundingBox;
+
+static uint8_t erode_cross_line(
+    uint8_t *out, const uint8_t* up, const uint8_t* cur, const uint8_t* down,
+    uint16_t len_px
+);
+static void add_line_to_bounding_box(
+    BoundingBox *bbox, const uint8_t* line, uint16_t len_px, uint16_t y);
+static int bounding_box_is_at_least(
+    const BoundingBox *bbox, int erode, uint16_t width_px, uint16_t height_px,
+    uint16_t stop_width, uint16_t stop_height);
+static uint8_t threshold_diff_gray_line(
+    uint8_t *out, const uint8_t* a, const uint8_t* b, const uint8_t* mask,
+    uint16_t len_px, uint8_t threshold
+);
+
 typedef struct _SqdiffResult {
     uint64_t total;
     uint32_t count;
@@ -184,15 +208,343 @@ static void threshold_diff_BGR_line(
     uint32_t threshold_sq
 )
 {
-    for (uint16_t n = 0; n < len_px; n++) {
-        int16_t diff_b = a[0] - b[0];
-        int16_t diff_g = a[1] - b[1];
-        int16_t diff_r = a[2] - b[2];
+    /* Indexing (rather than incrementing the pointers) with a size_t counter
+     * lets the compiler vectorise this loop. */
+    for (size_t n = 0; n < len_px; n++) {
+        int32_t diff_b = a[3 * n] - b[3 * n];
+        int32_t diff_g = a[3 * n + 1] - b[3 * n + 1];
+        int32_t diff_r = a[3 * n + 2] - b[3 * n + 2];
         uint32_t sqdiff = diff_b * diff_b + diff_g * diff_g + diff_r * diff_r;
-        uint8_t present = (sqdiff >= threshold_sq) ? 1 : 0;
-        out[0] = present;
-        a += 3;
-        b += 3;
-        out += 1;
+        out[n] = (sqdiff >= threshold_sq) ? 1 : 0;
+    }
+}
+
+/**
+ * The image-processing done by GrayscaleDiff, in a single pass over the
+ * pixels: The absolute difference between two grayscale images, masked,
+ * thresholded, and the bounding box of the pixels that are different.
+ *
+ * a and b are pointers to the first pixel of the first line of the 8-bit
+ * grayscale images.  line_stride_a and line_stride_b are the number of bytes
+ * between the start of one line and the start of the next.
+ *
+ * mask is an 8-bit single-channel image of the same size (with stride
+ * line_stride_mask) where 0 means ignore the differences at that pixel, or
+ * NULL to consider all the pixels.
+ *
+ * Output pixels are 255 if the absolute difference is greater than threshold
+ * (and the mask isn't 0), otherwise 0.  Like cv2.threshold(THRESH_BINARY).
+ * They are written to out, which must be at least width_px * height_px bytes,
+ * or out can be NULL if you only need the bounding box.
+ *
+ * Returns the bounding box of the non-zero output pixels.  If there aren't
+ * any, right and bottom are 0.
+ */
+BoundingBox threshold_diff_gray(
+    uint8_t *out,
+    const uint8_t* a, uint16_t line_stride_a,
+    const uint8_t* b, uint16_t line_stride_b,
+    const uint8_t* mask, uint16_t line_stride_mask,
+    uint8_t threshold,
+    uint16_t width_px, uint16_t height_px
+)
+{
+    BoundingBox bbox = {UINT16_MAX, UINT16_MAX, 0, 0};
+    uint8_t *scratch = NULL;
+    if (out == NULL) {
+        scratch = malloc(width_px ? width_px : 1);
+        assert(scratch);
+    }
+
+    for (uint16_t y = 0; y < height_px; y++) {
+        uint8_t *line = out ? out + y * width_px : scratch;
+        if (threshold_diff_gray_line(line, a, b, mask, width_px, threshold))
+            add_line_to_bounding_box(&bbox, line, width_px, y);
+        a += line_stride_a;
+        b += line_stride_b;
+        if (mask)
+            mask += line_stride_mask;
+    }
+
+    free(scratch);
+    if (bbox.right == 0) {
+        bbox.x = 0;
+        bbox.y = 0;
+    }
+    return bbox;
+}
+
+/* Returns non-zero if any of the output pixels are non-zero. */
+static uint8_t threshold_diff_gray_line(
+    uint8_t *out,
+    const uint8_t* a, const uint8_t* b, const uint8_t* mask,
+    uint16_t len_px,
+    uint8_t threshold
+)
+{
+    /* Written without branches (and with separate loops for the masked and
+     * unmasked cases) so that the compiler can vectorise it. */
+    uint8_t any = 0;
+    if (mask) {
+        for (size_t n = 0; n < len_px; n++) {
+            uint8_t hi = a[n] > b[n] ? a[n] : b[n];
+            uint8_t lo = a[n] > b[n] ? b[n] : a[n];
+            uint8_t v = (uint8_t) -((uint8_t) (hi - lo) > threshold);
+            v &= (uint8_t) -(mask[n] != 0);
+            out[n] = v;
+            any |= v;
+        }
+    } else {
+        for (size_t n = 0; n < len_px; n++) {
+            uint8_t hi = a[n] > b[n] ? a[n] : b[n];
+            uint8_t lo = a[n] > b[n] ? b[n] : a[n];
+            uint8_t v = (uint8_t) -((uint8_t) (hi - lo) > threshold);
+            out[n] = v;
+            any |= v;
+        }
+    }
+    return any;
+}
+
+/**
+ * The image-processing done by BGRDiff, in a single pass over the pixels:
+ * threshold_diff_bgr, then (optionally) a morphological "open" operation with
+ * a 3x3 cross-shaped kernel, and the bounding box of the result.  The
+ * thresholded and eroded images are never stored in full; we keep a rolling
+ * buffer of 3 lines.
+ *
+ * Arguments are as for threshold_diff_bgr, plus:
+ *
+ * mask is an 8-bit single-channel image with stride line_stride_mask, where 0
+ * means ignore the differences at that pixel, or NULL.
+ *
+ * If erode is 0 we skip the "open" operation.
+ *
+ * If stop_width is non-zero we stop as soon as the bounding box is at least
+ * stop_width x stop_height pixels, without looking at the rest of the image.
+ * The returned bounding box is then only the differences found so far.
+ *
+ * Returns the same bounding box as cv2.boundingRect of the result of
+ * cv2.morphologyEx(MORPH_OPEN) with cv2.getStructuringElement(MORPH_ELLIPSE,
+ * (3, 3)) and OpenCV's default border handling.  If there are no differences,
+ * right and bottom are 0.
+ */
+BoundingBox threshold_diff_bgr_bounding_box(
+    const uint8_t* a, uint16_t line_stride_a,
+    uint8_t* b, uint16_t line_stride_b,
+    const uint8_t* mask, uint16_t line_stride_mask,
+    uint32_t threshold_sq, int erode,
+    uint16_t stop_width, uint16_t stop_height,
+    uint16_t width_px, uint16_t height_px
+)
+{
+    BoundingBox bbox = {UINT16_MAX, UINT16_MAX, 0, 0};
+
+    /* Each line has 1 pixel of padding on either side.  The padding and the
+     * line above the top of the image are 1 because erosion treats pixels
+     * outside the image as set. */
+    const size_t padded = (size_t) width_px + 2;
+    uint8_t *buf = malloc(padded * 5);
+    assert(buf);
+    uint8_t *lines[3] = {buf, buf + padded, buf + padded * 2};
+    uint8_t *ones = buf + padded * 3;
+    uint8_t *eroded = buf + padded * 4;
+    for (size_t n = 0; n < padded * 4; n++)
+        buf[n] = 1;
+
+    for (uint32_t y = 0; y <= height_px; y++) {
+        /* Threshold line y into lines[y % 3]; then erode line y - 1, now that
+         * we have the lines above and below it.  For y == height_px the line
+         * below the image is all 1. */
+        uint8_t *cur = lines[y % 3];
+        if (y < height_px) {
+            threshold_diff_BGR_line(cur + 1, a, b, width_px, threshold_sq);
+            if (mask) {
+                for (size_t n = 0; n < width_px; n++)
+                    cur[n + 1] &= (uint8_t) (mask[n] != 0);
+                mask += line_stride_mask;
+            }
+            a += line_stride_a;
+            b += line_stride_b;
+            if (!erode) {
+                uint8_t any = 0;
+                for (size_t n = 0; n < width_px; n++)
+                    any |= cur[n + 1];
+                if (any) {
+                    add_line_to_bounding_box(&bbox, cur + 1, width_px, y);
+                    if (stop_width && bounding_box_is_at_least(
+                            &bbox, erode, width_px, height_px,
+                            stop_width, stop_height))
+                        break;
+                }
+                continue;
+            }
+        } else {
+            if (!erode)
+                break;
+            cur = ones;
+        }
+        if (y == 0)
+            continue;
+        const uint8_t *up = (y >= 2) ? lines[(y - 2) % 3] : ones;
+        const uint8_t *mid = lines[(y - 1) % 3];
+        if (erode_cross_line(eroded, up, mid, cur, width_px)) {
+            add_line_to_bounding_box(&bbox, eroded, width_px, y - 1);
+            if (stop_width && bounding_box_is_at_least(
+                    &bbox, erode, width_px, height_px,
+                    stop_width, stop_height))
+                break;
+        }
+    }
+    free(buf);
+
+    if (bbox.right == 0) {
+        bbox.x = 0;
+        bbox.y = 0;
+    } else if (erode) {
+        /* Dilating with the cross-shaped kernel (the 2nd half of "open")
+         * grows the bounding box by 1 pixel in each direction. */
+        if (bbox.x > 0)
+            bbox.x--;
+        if (bbox.y > 0)
+            bbox.y--;
+        if (bbox.right < width_px)
+            bbox.right++;
+        if (bbox.bottom < height_px)
+            bbox.bottom++;
+    }
+    return bbox;
+}
+
+/* Erode with a 3x3 cross-shaped kernel.  up, cur and down are padded lines
+ * (see above); out isn't padded.  Returns non-zero if any of the output pixels
+ * are non-zero. */
+static uint8_t erode_cross_line(
+    uint8_t *out,
+    const uint8_t* up, const uint8_t* cur, const uint8_t* down,
+    uint16_t len_px
+)
+{
+    uint8_t any = 0;
+    for (size_t n = 0; n < len_px; n++) {
+        uint8_t v = up[n + 1] & down[n + 1] & cur[n] & cur[n + 1] & cur[n + 2];
+        out[n] = v;
+        any |= v;
+    }
+    return any;
+}
+
+/* Extend bbox to include the non-zero pixels of line y.  The line must
+ * contain at least one non-zero pixel. */
+static void add_line_to_bounding_box(
+    BoundingBox *bbox, const uint8_t* line, uint16_t len_px, uint16_t y)
+{
+    uint16_t left = 0, right = len_px;
+    while (line[left] == 0)
+        left++;
+    while (line[right - 1] == 0)
+        right--;
+    if (left < bbox->x)
+        bbox->x = left;
+    if (right > bbox->right)
+        bbox->right = right;
+    if (y < bbox->y)
+        bbox->y = y;
+    bbox->bottom = y + 1;
+}
+
+/* Is the bounding box that threshold_diff_bgr_bounding_box would return
+ * (that is, after growing it by the dilation, if erode is set) at least
+ * stop_width x stop_height pixels?  bbox must not be empty. */
+static int bounding_box_is_at_least(
+    const BoundingBox *bbox, int erode, uint16_t width_px, uint16_t height_px,
+    uint16_t stop_width, uint16_t stop_height)
+{
+    uint32_t x = bbox->x, y = bbox->y, right = bbox->right,
+             bottom = bbox->bottom;
+    if (erode) {
+        x = x > 0 ? x - 1 : 0;
+        y = y > 0 ? y - 1 : 0;
+        right = right < width_px ? right + 1 : width_px;
+        bottom = bottom < height_px ? bottom + 1 : height_px;
+    }
+    return right - x >= stop_width && bottom - y >= stop_height;
+}
+
+#define CHANGED_TILE_WIDTH_PX 32
+
+/**
+ * Find which parts of two images are different at all, so that the more
+ * expensive processing can be limited to that area.  Each line is split into
+ * tiles of CHANGED_TILE_WIDTH_PX pixels, compared with memcmp.  Once we have
+ * found changes we only need to compare the tiles outside the bounding box so
+ * far, plus one comparison of the rest of the line to see whether the line
+ * changed at all; so this is about as fast as memcmp on static images, and
+ * faster than that on changing images.
+ *
+ * a and b are packed images with bytes_per_px bytes per pixel.
+ *
+ * Returns the bounding box of the tiles that are different, or right and
+ * bottom are 0 if the images are identical.
+ */
+BoundingBox changed_bounding_box(
+    const uint8_t* a, uint16_t line_stride_a,
+    const uint8_t* b, uint16_t line_stride_b,
+    uint8_t bytes_per_px, uint16_t width_px, uint16_t height_px
+)
+{
+    BoundingBox bbox = {UINT16_MAX, UINT16_MAX, 0, 0};
+    const uint16_t n_tiles =
+        (width_px + CHANGED_TILE_WIDTH_PX - 1) / CHANGED_TILE_WIDTH_PX;
+    const size_t tile_bytes = (size_t) CHANGED_TILE_WIDTH_PX * bytes_per_px;
+    const size_t line_bytes = (size_t) width_px * bytes_per_px;
+
+    /* Tiles [left, right) are within the bounding box so far. */
+    uint16_t left = n_tiles, right = n_tiles;
+
+    for (uint16_t y = 0; y < height_px; y++) {
+        int changed = 0;
+        for (uint16_t t = 0; t < left; t++) {
+            if (memcmp(a + t * tile_bytes, b + t * tile_bytes,
+                       t + 1 == n_tiles ? line_bytes - t * tile_bytes
+                                        : tile_bytes) != 0) {
+                if (right == n_tiles && left == n_tiles)
+                    right = t + 1;
+                left = t;
+                changed = 1;
+                break;
+            }
+        }
+        for (uint16_t t = n_tiles; t > right; t--) {
+            size_t start = (t - 1) * tile_bytes;
+            if (memcmp(a + start, b + start,
+                       t == n_tiles ? line_bytes - start : tile_bytes) != 0) {
+                right = t;
+                changed = 1;
+                break;
+            }
+        }
+        if (!changed && left < right) {
+            size_t start = left * tile_bytes;
+            size_t end = right == n_tiles ? line_bytes : right * tile_bytes;
+            changed = memcmp(a + start, b + start, end - start) != 0;
+        }
+        if (changed) {
+            if (y < bbox.y)
+                bbox.y = y;
+            bbox.bottom = y + 1;
+        }
+        a += line_stride_a;
+        b += line_stride_b;
+    }
+
+    if (bbox.bottom == 0) {
+        bbox.x = 0;
+        bbox.y = 0;
+    } else {
+        bbox.x = left * CHANGED_TILE_WIDTH_PX;
+        bbox.right = right == n_tiles ? width_px
+                                      : right * CHANGED_TILE_WIDTH_PX;
     }
+    return bbox;
 }
@@ -1,10 +1,12 @@
 import os
+import re
 import sys
 import traceback
 from collections import namedtuple
 from contextlib import contextmanager
 
 from stbt_core import _set_dut_singleton
+from _stbt.imgutils import Frame, _to_frame
 from _stbt.types import UITestFailure
 from _stbt.utils import find_import_name
 
@@ -20,10 +22,15 @@ def _save_screenshot(dut, result_dir, exception, save_jpg, save_png):
         screenshot = dut._display.last_used_frame
     if screenshot is None:
         screenshot = dut.get_frame()
+    screenshot = _to_frame(screenshot)
+    if isinstance(screenshot, Frame):
+        screenshot = screenshot.full_resolution()
 
     if save_png:
-        cv2.imwrite(os.path.join(result_dir, "screenshot.png"), screenshot)
-        sys.stderr.write("Saved screenshot to 'screenshot.png'.\n")
+        filename = os.path.join(result_dir, "screenshot.png")
+        cv2.imwrite(filename, screenshot)
+        sys.stderr.write("Saved screenshot to '%s'.\n"
+                         % os.path.relpath(filename))
 
     if save_jpg:
         cv2.imwrite(
@@ -35,22 +42,27 @@ def _save_screenshot(dut, result_dir, exception, save_jpg, save_png):
 
 @contextmanager
 def video(args, dut):
-    result_dir = os.path.abspath(os.curdir)
-    with _set_dut_singleton(dut), dut:
+    with _set_dut_singleton(dut), dut, \
+            screenshots(args, dut, os.path.abspath(os.curdir)):
+        yield
+
+
+@contextmanager
+def screenshots(args, dut, result_dir):
+    try:
+        yield
+    except Exception as e:
         try:
-            yield
-        except Exception as e:
-            try:
-                _save_screenshot(dut, result_dir, exception=e,
-                                 save_jpg=(args.save_thumbnail != 'never'),
-                                 save_png=(args.save_screenshot != 'never'))
-            except Exception:  # pylint: disable=broad-except
-                pass
-            raise
-        else:
-            _save_screenshot(dut, result_dir, exception=None,
-                             save_jpg=(args.save_thumbnail == 'always'),
-                             save_png=(args.save_screenshot == 'always'))
+            _save_screenshot(dut, result_dir, exception=e,
+                             save_jpg=(args.save_thumbnail != 'never'),
+                             save_png=(args.save_screenshot != 'never'))
+        except Exception:  # pylint: disable=broad-except
+            pass
+        raise
+    else:
+        _save_screenshot(dut, result_dir, exception=None,
+                         save_jpg=(args.save_thumbnail == 'always'),
+                         save_png=(args.save_screenshot == 'always'))
 
 
 def _import_by_filename(filename_):
@@ -106,18 +118,89 @@ def load_test_function(script, args):
         return _TestFunction(script, script, "", 1, fn)
 
 
+def load_test_list(filename):
+    """Reads a file listing one test (``FILE[::TESTCASE]``) per line. Blank
+    lines and lines starting with "#" are ignored. "-" means stdin.
+    """
+    if filename == "-":
+        lines = sys.stdin.readlines()
+    else:
+        with open(filename, encoding="utf-8") as f:
+            lines = f.readlines()
+    return [line.strip() for line in lines
+            if line.strip() and not line.strip().startswith("#")]
+
+
+def run_test_list(args, dut, scripts, results_dir):
+    """Runs each of `scripts` in turn in this process, sharing `dut` (and its
+    video pipeline) between them.
+
+    Each test gets its own directory under `results_dir` for its screenshot,
+    thumbnail and ``exit-status``, and runs with that directory as its
+    current working directory so that any files it writes don't collide with
+    other tests' files. A failure or error in one test doesn't stop the others
+    from running.
+
+    :returns: The worst exit status: 0 if all the tests passed, 1 if any
+        failed, 2 if any had an error.
+    """
+    statuses = []
+    width = len(str(len(scripts)))
+    cwd = os.getcwd()
+    results_dir = os.path.abspath(results_dir)
+    with _set_dut_singleton(dut), dut:
+        dut.get_frame()  # wait until pipeline is rolling
+        for n, script in enumerate(scripts, 1):
+            result_dir = os.path.join(results_dir, "%0*d-%s" % (
+                width, n, re.sub(r"[^A-Za-z0-9_.-]+", "_", script)))
+            os.makedirs(result_dir, exist_ok=True)
+            # Don't let state from the previous test leak into this one's
+            # screenshot or `stbt.last_keypress`:
+            if dut._display:
+                dut._display.last_used_frame = None
+            dut._last_keypress = None
+            filename, sep, funcname = script.partition("::")
+            try:
+                with screenshots(args, dut, result_dir):
+                    os.chdir(result_dir)
+                    try:
+                        test_function = load_test_function(
+                            os.path.join(cwd, filename) + sep + funcname,
+                            args.args)
+                        test_function.call()
+                    finally:
+                        os.chdir(cwd)
+            except Exception as e:  # pylint:disable=broad-except
+                status = _report_failure(script, e)
+            else:
+                status = 0
+                sys.stdout.write("PASS: %s\n" % script)
+            with open(os.path.join(result_dir, "exit-status"), "w",
+                      encoding="utf-8") as f:
+                f.write("%d\n" % status)
+            statuses.append(status)
+    sys.stdout.write("%d passed, %d failed, %d errors\n" % (
+        statuses.count(0), statuses.count(1), statuses.count(2)))
+    return max(statuses, default=0)
+
+
+def _report_failure(script, e):
+    """Call from an ``except`` block. Returns the exit status."""
+    error_message = str(e)
+    if not error_message and isinstance(e, AssertionError):
+        error_message = traceback.extract_tb(sys.exc_info()[2])[-1][3]
+    sys.stdout.write("FAIL: %s: %s: %s\n" % (
+        script, type(e).__name__, error_message))
+    traceback.print_exc(file=sys.stderr)
+    if isinstance(e, (UITestFailure, AssertionError)):
+        return 1  # Failure
+    else:
+        return 2  # Error
+
+
 @contextmanager
 def sane_unicode_and_exception_handling(script):
     try:
         yield
     except Exception as e:  # pylint:disable=broad-except
-        error_message = str(e)
-        if not error_message and isinstance(e, AssertionError):
-            error_message = traceback.extract_tb(sys.exc_info()[2])[-1][3]
-        sys.stdout.write("FAIL: %s: %s: %s\n" % (
-            script, type(e).__name__, error_message))
-        traceback.print_exc(file=sys.stderr)
-        if isinstance(e, (UITestFailure, AssertionError)):
-            sys.exit(1)  # Failure
-        else:
-            sys.exit(2)  # Error
+        sys.exit(_report_failure(script, e))
@@ -17,6 +17,7 @@ import enum
 import warnings
 from typing import cast, Iterator, Optional
 
+from .config import get_config
 from .diff import BGRDiff, Differ
 from .imgutils import Frame
 from .logging import ddebug, debug, draw_on, warn
@@ -81,7 +82,9 @@ def press_and_wait(
         algorithm. See `stbt.detect_motion` for details.
 
     :param differ: The difference-detection algorithm to use. Defaults to
-        `stbt.BGRDiff()`.
+        `stbt.BGRDiff()`. To compare downsampled frames, which is faster, set
+        ``scale`` (for example 0.5) in the ``[press_and_wait]`` section of
+        :ref:`.stbt.conf`; this only applies to the default differ.
 
     :returns:
         A `Transition` object that will evaluate to true if the transition
@@ -214,6 +217,9 @@ class _Transition():
             self.differ = differ
         else:
             self.differ = cast(Differ, press_and_wait.differ)  # type:ignore
+            scale = get_config("press_and_wait", "scale", type_=float)
+            if scale != 1:
+                self.differ = self.differ.replace(scale=scale)
         if min_size is not None:
             self.differ = self.differ.replace(min_size=min_size)
         if threshold is not None:
@@ -223,7 +229,8 @@ class _Transition():
 
     def wait(self, press_result):
         self.expiry_time = press_result.end_time + self.timeout_secs
-        dm = DetectMotion(self.differ, press_result.frame_before, self.mask)
+        dm = DetectMotion(self.differ, press_result.frame_before, self.mask,
+                          need_region=False)
 
         # Wait for animation to start
         for f in self.frames:
@@ -259,7 +266,8 @@ class _Transition():
         if self.expiry_time is None:
             self.expiry_time = initial_frame.time + self.timeout_secs
 
-        dm = DetectMotion(self.differ, initial_frame, self.mask)
+        dm = DetectMotion(self.differ, initial_frame, self.mask,
+                          need_region=False)
 
         first_stable_frame = initial_frame
         while True:
@@ -563,6 +563,46 @@ class Keypress():
                 _frame_repr(self.frame_before)))
 
 
+class CaptureStats(typing.NamedTuple):
+    """Statistics about video capture, returned by `stbt.capture_stats`.
+
+    Counts are cumulative since video capture started. Latencies and timings
+    are in seconds, and are calculated from the most recent 1000 frames (they
+    are ``None`` if there haven't been any frames yet).
+
+    :ivar int frames_received: Frames delivered by the source pipeline to
+        stb-tester.
+    :ivar int frames_dropped: Frames discarded by the source pipeline before
+        they reached stb-tester, because stb-tester was falling behind. This is
+        only counted for live video sources.
+    :ivar int frames_consumed: Frames that the test script (or a function
+        like `stbt.wait_for_match`) looked at, via `stbt.get_frame` or
+        `stbt.frames`.
+    :ivar int frames_skipped: Frames received that the test script never
+        looked at (``frames_received - frames_consumed``).
+    :ivar float latency_p50: Median time from capture of a frame until the
+        test script first looked at it.
+    :ivar float latency_p90: 90th percentile of the same.
+    :ivar float latency_p99: 99th percentile of the same.
+    :ivar float latency_max: Maximum of the same.
+    :ivar float pull_p50: Median time taken to pull a frame from the
+        source pipeline's appsink.
+    :ivar float pull_max: Maximum of the same.
+
+    Added in v35.
+    """
+    frames_received: int
+    frames_dropped: int
+    frames_consumed: int
+    frames_skipped: int
+    latency_p50: Optional[float]
+    latency_p90: Optional[float]
+    latency_p99: Optional[float]
+    latency_max: Optional[float]
+    pull_p50: Optional[float]
+    pull_max: Optional[float]
+
+
 class UITestError(Exception):
     """The test script had an unrecoverable error."""
 
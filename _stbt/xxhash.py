@@ -9,6 +9,8 @@ import binascii
 import ctypes
 import struct
 
+import numpy
+
 _libxxhash = ctypes.CDLL("libxxhash.so.0")
 
 _XXH_errorcode = ctypes.c_int
@@ -69,6 +71,28 @@ class Xxhash64():
         _libxxhash.XXH64_update(
             self._state, address, ctypes.c_size_t(length.value))
 
+    def update_ndarray(self, a, block_size=256 * 1024):
+        """Equivalent to ``update(numpy.ascontiguousarray(a).data)``, but if
+        `a` isn't contiguous (such as a crop of a larger image) we copy and
+        hash `block_size` bytes at a time instead of copying the whole array.
+        This avoids allocating (and page-faulting in) a large temporary array,
+        and the copy stays in the CPU cache. Calling `XXH64_update` for each
+        row without any copy would be slower still because of the overhead of
+        each ctypes call.
+        """
+        if a.flags.c_contiguous or a.ndim < 2:
+            a = numpy.ascontiguousarray(a)
+            _libxxhash.XXH64_update(self._state, a.ctypes.data, a.nbytes)
+            return
+        rows_per_block = max(1, block_size // (a[0].nbytes or 1))
+        buf = numpy.empty((rows_per_block,) + a.shape[1:], dtype=a.dtype)
+        for i in range(0, a.shape[0], rows_per_block):
+            block = a[i:i + rows_per_block]
+            n = block.shape[0]
+            numpy.copyto(buf[:n], block)
+            _libxxhash.XXH64_update(
+                self._state, buf.ctypes.data, n * buf[0].nbytes)
+
     def digest(self):
         return struct.pack(">Q", _libxxhash.XXH64_digest(self._state))
 
@@ -0,0 +1,104 @@
+#!/usr/bin/python3
+
+"""
+Copyright 2026 stb-tester.com Ltd.
+License: LGPL v2.1 or (at your option) any later version (see
+https://github.com/stb-tester/stb-tester/blob/master/LICENSE for details).
+"""
+
+import argparse
+import re
+import sys
+import time
+
+from _stbt import imgproc_cache
+
+
+def error(s):
+    sys.stderr.write("stbt cache: error: %s\n" % s)
+    sys.exit(1)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.prog = "stbt cache"
+    parser.description = """Manage the cache of image-processing results
+        (such as OCR) used by 'stbt run'."""
+    parser.add_argument(
+        "--cache", default=imgproc_cache.default_filename,
+        help="Path for image-processing cache (default: %(default)s)")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+    subparsers.add_parser(
+        "stats", help="Print the size and number of entries of the cache")
+    prune_parser = subparsers.add_parser(
+        "prune", help="Delete entries that haven't been used recently")
+    prune_parser.add_argument(
+        "--older-than", metavar="AGE", type=parse_age, required=True,
+        help="Delete entries that haven't been used in the last AGE. AGE is "
+             "a number followed by s (seconds), m (minutes), h (hours), "
+             "d (days) or w (weeks); for example '30d'")
+    subparsers.add_parser("clear", help="Delete all entries from the cache")
+    args = parser.parse_args(argv[1:])
+
+    if imgproc_cache.lmdb is None:
+        error("Caching isn't available because lmdb isn't installed")
+
+    if args.command == "stats":
+        s = imgproc_cache.stats(args.cache)
+        print("Cache file: %s" % s.filename)
+        print("Entries: %d" % s.entries)
+        print("Size: %s used, %s on disk, %s maximum" % (
+            format_size(s.used_bytes), format_size(s.file_bytes),
+            format_size(s.max_bytes)))
+        if s.entries:
+            print("Least recently used: %s" % format_time(s.oldest))
+            print("Most recently used: %s" % format_time(s.newest))
+    elif args.command == "prune":
+        n = imgproc_cache.prune(args.older_than, args.cache)
+        print("Deleted %d entries" % n)
+    elif args.command == "clear":
+        imgproc_cache.clear(args.cache)
+    else:
+        assert False
+
+
+def parse_age(s):
+    """
+    >>> parse_age("90")
+    90.0
+    >>> parse_age("30d")
+    2592000.0
+    >>> parse_age("1.5h")
+    5400.0
+    """
+    m = re.match(r"^\s*(\d+(?:\.\d*)?)\s*([smhdw]?)\s*$", s)
+    if not m:
+        raise argparse.ArgumentTypeError("Invalid age: %r" % (s,))
+    return float(m.group(1)) * {
+        "": 1, "s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60,
+        "w": 7 * 24 * 60 * 60}[m.group(2)]
+
+
+def format_size(n):
+    """
+    >>> format_size(1023)
+    '1023 B'
+    >>> format_size(1024 * 1024 * 1024)
+    '1.0 GiB'
+    """
+    for unit in ["B", "KiB", "MiB"]:
+        if n < 1024:
+            return ("%d %s" if unit == "B" else "%.1f %s") % (n, unit)
+        n /= 1024.
+    return "%.1f GiB" % n
+
+
+def format_time(t):
+    if t == 0:
+        return "unknown"
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t))
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
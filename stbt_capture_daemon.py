@@ -0,0 +1,241 @@
+#!/usr/bin/python3
+"""
+stbt capture-daemon keeps your video-capture pipeline running between tests.
+
+Starting a capture device (and waiting for it to produce its first frame) can
+take several seconds, and normally every `stbt run` does this from scratch.
+The capture daemon runs your ``global.source_pipeline`` once, decodes it, and
+publishes the decoded frames via shared memory. While it is running it
+configures stb-tester (by modifying ``global.source_pipeline``) to read the
+frames from shared memory, so each `stbt run` gets its first frame almost
+immediately.
+
+EXAMPLE USAGE
+-------------
+
+    stbt capture-daemon run --background
+
+    # These use the capture daemon's video:
+    stbt run tests/epg.py::test_that_epg_opens
+    stbt run tests/epg.py::test_that_epg_closes
+
+    # Stop the capture daemon and restore your previous configuration:
+    stbt capture-daemon stop
+
+Frames are timestamped when the test process receives them, not when the
+capture device captured them. The video format (resolution and frame-rate)
+can't change while the daemon is running: If the source changes format the
+daemon exits, and you should start it again.
+"""
+
+import argparse
+import errno
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+import gi
+
+from _stbt.config import get_config, set_config, xdg_config_dir
+from _stbt.logging import debug
+
+gi.require_version("Gst", "1.0")
+from gi.repository import GLib, Gst  # pylint:disable=wrong-import-order
+
+
+def default_socket_path():
+    return os.path.join(
+        os.environ.get("XDG_RUNTIME_DIR") or xdg_config_dir(),
+        "stbt", "capture-daemon.sock")
+
+
+def daemon_pipeline_description(source_pipeline, socket_path, video_format):
+    # Notes on the pipeline:
+    # * The queues are the same as the ones `Display` uses, see the notes
+    #   there.
+    # * We convert to the format that `Display` wants (BGR, or I420 with
+    #   `capture_format=YUV`) here, so the test process's `videoconvert` is a
+    #   no-op.
+    # * The leaky queue before the shmsink means a test process that stops
+    #   reading frames (e.g. it has been paused in a debugger) can't stall the
+    #   capture device.
+    return " ! ".join([
+        source_pipeline,
+        "queue name=_stbt_user_data_queue max-size-buffers=0 "
+        "    max-size-bytes=0 max-size-time=10000000000",
+        "decodebin",
+        "queue name=_stbt_raw_frames_queue max-size-buffers=2",
+        "videoconvert",
+        "video/x-raw,format=%s" % video_format,
+        "queue max-size-buffers=1 leaky=downstream",
+        "shmsink name=_stbt_shmsink socket-path=%s wait-for-connection=false "
+        "    sync=false" % socket_path])
+
+
+def client_source_pipeline(socket_path, caps):
+    """The ``source_pipeline`` for `stbt run` to read from the daemon."""
+    return "shmsrc socket-path=%s is-live=true do-timestamp=true ! %s" % (
+        socket_path, caps.to_string())
+
+
+def check_bus(bus, timeout_secs):
+    message = bus.timed_pop_filtered(
+        int(timeout_secs * Gst.SECOND),
+        Gst.MessageType.ERROR | Gst.MessageType.EOS)
+    if message is None:
+        return
+    if message.type == Gst.MessageType.ERROR:
+        err, dbg = message.parse_error()
+        raise RuntimeError(
+            "Error from source pipeline: %s: %s\n%s" % (err, err.message, dbg))
+    raise RuntimeError("EOS from source pipeline")
+
+
+def wait_for_caps(pipeline, timeout_secs):
+    pad = pipeline.get_by_name("_stbt_shmsink").get_static_pad("sink")
+    bus = pipeline.get_bus()
+    end_time = time.time() + timeout_secs
+    while time.time() < end_time:
+        caps = pad.get_current_caps()
+        if caps is not None:
+            return caps
+        check_bus(bus, 0.1)
+    raise RuntimeError("No frames received in %ss" % timeout_secs)
+
+
+def run(socket_path, ready=None):
+    source_pipeline = get_config("global", "source_pipeline")
+    if get_config("frames", "capture_format") == "YUV":
+        video_format = "I420"
+    else:
+        video_format = "BGR"
+
+    Gst.init(None)
+    os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    description = daemon_pipeline_description(
+        source_pipeline, socket_path, video_format)
+    debug("capture-daemon pipeline: %s" % description)
+    try:
+        pipeline = Gst.parse_launch(description)
+    except GLib.Error as e:
+        raise RuntimeError("Invalid source_pipeline: %s" % e.message)
+    pipeline.set_state(Gst.State.PLAYING)
+    try:
+        caps = wait_for_caps(pipeline, timeout_secs=10)
+        config = {
+            "source_pipeline": client_source_pipeline(socket_path, caps),
+            "capture_daemon_pid": str(os.getpid()),
+        }
+        for k, v in config.items():
+            set_config("global", k, v)
+        try:
+            if ready is not None:
+                ready()
+            pad = pipeline.get_by_name("_stbt_shmsink").get_static_pad("sink")
+            bus = pipeline.get_bus()
+            while True:
+                # Short timeout so that we can handle SIGTERM:
+                check_bus(bus, 1)
+                new_caps = pad.get_current_caps()
+                if new_caps is not None and not new_caps.is_equal(caps):
+                    raise RuntimeError(
+                        "Video format changed from %s to %s"
+                        % (caps.to_string(), new_caps.to_string()))
+        finally:
+            set_config("global", "source_pipeline", source_pipeline)
+            set_config("global", "capture_daemon_pid", None)
+    finally:
+        pipeline.set_state(Gst.State.NULL)
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        prog="stbt capture-daemon",
+        description="Keep the video-capture pipeline running between tests.",
+        epilog=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="subcommand")
+    run_parser = subparsers.add_parser("run")
+    run_parser.add_argument("-b", "--background", action="store_true",
+                            help="Run capture-daemon in background")
+    run_parser.add_argument(
+        "--socket", metavar="PATH", default=default_socket_path(),
+        help="Where to create the shared-memory control socket (default: "
+             "%(default)s)")
+
+    stop_parser = subparsers.add_parser("stop")
+    stop_parser.add_argument("-f", "--force", action="store_true",
+                             help="Ignore errors")
+
+    args = parser.parse_args(argv[1:])
+
+    if args.subcommand == "run":
+        if get_config("global", "capture_daemon_pid", None):
+            sys.stderr.write(
+                "stbt capture-daemon: error: Already running (pid %s). Run "
+                "'stbt capture-daemon stop' first.\n"
+                % get_config("global", "capture_daemon_pid"))
+            return 1
+
+        # Do run our `finally` teardown blocks on SIGTERM
+        signal.signal(signal.SIGTERM, lambda _signo, _frame: sys.exit(0))
+
+        write_end = None
+        if args.background:
+            read_end, write_end = multiprocessing.Pipe(duplex=False)
+            pid = os.fork()
+            if pid:
+                # Parent - wait for child to be ready
+                write_end.close()
+                try:
+                    read_end.recv()
+                except EOFError:
+                    # Child exited without becoming ready. It has already
+                    # printed the error.
+                    _, status = os.waitpid(pid, 0)
+                    return os.WEXITSTATUS(status) or 1
+                return 0
+            else:
+                # Child
+                read_end.close()
+
+        def ready():
+            if write_end is not None:
+                write_end.send(True)
+                write_end.close()
+
+        try:
+            run(args.socket, ready)
+        except RuntimeError as e:
+            sys.stderr.write("stbt capture-daemon: error: %s\n" % e)
+            return 1
+    elif args.subcommand == "stop":
+        try:
+            pid = get_config("global", "capture_daemon_pid", None)
+            os.kill(int(pid), signal.SIGTERM)
+            while True:
+                try:
+                    os.kill(int(pid), 0)
+                    time.sleep(0.1)
+                except OSError as e:
+                    if e.errno == errno.ESRCH:
+                        return 0
+                    else:
+                        raise
+        except Exception:  # pylint: disable=broad-except
+            if not args.force:
+                raise
+    else:
+        parser.print_usage()
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
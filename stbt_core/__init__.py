@@ -14,71 +14,17 @@ import typing
 from contextlib import contextmanager
 from typing import ContextManager, Iterator, Optional
 
-from _stbt import android
-from _stbt.black import (
-    is_screen_black)
 from _stbt.config import (
     ConfigurationError,
     get_config)
-from _stbt.diff import (
-    BGRDiff,
-    Differ,
-    GrayscaleDiff,
-    MotionResult)
-from _stbt.frameobject import (
-    for_object_repository,
-    FrameObject)
 from _stbt.grid import (
     Grid)
-from _stbt.imgutils import (
-    Color,
-    crop,
-    find_file,
-    Frame,
-    Image,
-    load_image,
-    save_frame)
-from _stbt.keyboard import (
-    Keyboard)
 from _stbt.logging import (
     debug)
-from _stbt.mask import (
-    load_mask,
-    Mask,
-    MaskTypes)
-from _stbt.match import (
-    ConfirmMethod,
-    match,
-    match_all,
-    MatchMethod,
-    MatchParameters,
-    MatchResult,
-    MatchTimeout,
-    wait_for_match)
-from _stbt.motion import (
-    detect_motion,
-    MotionTimeout,
-    wait_for_motion)
 from _stbt.multipress import (
     MultiPress)
-from _stbt.ocr import (
-    apply_ocr_corrections,
-    match_text,
-    ocr,
-    ocr_eq,
-    OcrEngine,
-    OcrMode,
-    set_global_ocr_corrections,
-    TextMatchResult)
-from _stbt.precondition import (
-    as_precondition,
-    PreconditionError)
-from _stbt.transition import (
-    press_and_wait,
-    Transition,
-    TransitionStatus,
-    wait_for_transition_to_end)
 from _stbt.types import (
+    CaptureStats,
     Direction,
     Keypress,
     NoVideo,
@@ -91,11 +37,118 @@ from _stbt.types import (
 from _stbt.wait import (
     wait_until)
 
+# The rest of the API is imported the first time it's used (see `__getattr__`
+# below) because it depends on OpenCV and numpy, which are slow to import.
+# This makes `import stbt_core` fast for tools and unit tests that only need
+# `Region`, `get_config`, etc.
+if typing.TYPE_CHECKING:
+    from _stbt import android
+    from _stbt.black import (
+        is_screen_black)
+    from _stbt.diff import (
+        BGRDiff,
+        Differ,
+        GrayscaleDiff,
+        MotionResult)
+    from _stbt.frameobject import (
+        for_object_repository,
+        FrameObject)
+    from _stbt.imgutils import (
+        Color,
+        crop,
+        find_file,
+        Frame,
+        Image,
+        load_image,
+        save_frame)
+    from _stbt.keyboard import (
+        Keyboard)
+    from _stbt.mask import (
+        load_mask,
+        Mask,
+        MaskTypes)
+    from _stbt.match import (
+        ConfirmMethod,
+        match,
+        match_all,
+        match_many,
+        MatchMethod,
+        MatchParameters,
+        MatchResult,
+        MatchTimeout,
+        Template,
+        wait_for_match)
+    from _stbt.motion import (
+        detect_motion,
+        MotionTimeout,
+        wait_for_motion)
+    from _stbt.ocr import (
+        apply_ocr_corrections,
+        match_text,
+        ocr,
+        ocr_eq,
+        ocr_many,
+        OcrEngine,
+        OcrMode,
+        set_global_ocr_corrections,
+        TextMatchResult)
+    from _stbt.precondition import (
+        as_precondition,
+        PreconditionError)
+    from _stbt.transition import (
+        press_and_wait,
+        Transition,
+        TransitionStatus,
+        wait_for_transition_to_end)
+
+_LAZY_IMPORTS = {
+    "_stbt.black": ["is_screen_black"],
+    "_stbt.diff": ["BGRDiff", "Differ", "GrayscaleDiff", "MotionResult"],
+    "_stbt.frameobject": ["for_object_repository", "FrameObject"],
+    "_stbt.imgutils": ["Color", "crop", "find_file", "Frame", "Image",
+                       "load_image", "save_frame"],
+    "_stbt.keyboard": ["Keyboard"],
+    "_stbt.mask": ["load_mask", "Mask", "MaskTypes"],
+    "_stbt.match": ["ConfirmMethod", "match", "match_all", "match_many",
+                    "MatchMethod", "MatchParameters", "MatchResult",
+                    "MatchTimeout", "Template", "wait_for_match"],
+    "_stbt.motion": ["detect_motion", "MotionTimeout", "wait_for_motion"],
+    "_stbt.ocr": ["apply_ocr_corrections", "match_text", "ocr", "ocr_eq",
+                  "ocr_many", "OcrEngine", "OcrMode",
+                  "set_global_ocr_corrections", "TextMatchResult"],
+    "_stbt.precondition": ["as_precondition", "PreconditionError"],
+    "_stbt.transition": ["press_and_wait", "Transition", "TransitionStatus",
+                         "wait_for_transition_to_end"],
+}
+_LAZY_NAMES = {name: module
+               for module, names in _LAZY_IMPORTS.items()
+               for name in names}
+
+
+def __getattr__(name):
+    import importlib
+    if name == "android":
+        value = importlib.import_module("_stbt.android")
+    elif name in _LAZY_NAMES:
+        value = getattr(importlib.import_module(_LAZY_NAMES[name]), name)
+    else:
+        raise AttributeError(
+            "module %r has no attribute %r" % (__name__, name))
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+
 __all__ = [
     "android",
     "apply_ocr_corrections",
     "as_precondition",
     "BGRDiff",
+    "capture_stats",
+    "CaptureStats",
     "Color",
     "ConfigurationError",
     "ConfirmMethod",
@@ -125,6 +178,7 @@ __all__ = [
     "MaskTypes",
     "match",
     "match_all",
+    "match_many",
     "match_text",
     "MatchMethod",
     "MatchParameters",
@@ -136,6 +190,7 @@ __all__ = [
     "NoVideo",
     "ocr",
     "ocr_eq",
+    "ocr_many",
     "OcrEngine",
     "OcrMode",
     "PDU",
@@ -149,6 +204,7 @@ __all__ = [
     "save_frame",
     "set_global_ocr_corrections",
     "Size",
+    "Template",
     "TextMatchResult",
     "Transition",
     "TransitionStatus",
@@ -161,10 +217,10 @@ __all__ = [
 ]
 
 
-from _stbt.imgutils import ImageT
 from _stbt.types import KeyT, RegionT
 if typing.TYPE_CHECKING:
     import _stbt.core
+    from _stbt.imgutils import ImageT
 
 
 TEST_PACK_ROOT: "str|None" = None
@@ -337,10 +393,32 @@ def get_frame() -> Frame:
     To save a frame to disk pass it to :ocv:pyfunc:`cv2.imwrite`. Note that any
     file you write to the current working directory will appear as an artifact
     in the test-run results.
+
+    If ``capture_format = YUV`` is set in the ``[frames]`` section of
+    ``.stbt.conf``, the frame isn't converted to BGR until something uses its
+    pixels, and it isn't a ``numpy.ndarray``. Stb-tester's APIs and numpy
+    accept it, but to pass it to OpenCV functions like ``cv2.imwrite`` use
+    ``stbt.Frame(frame)`` first.
     """
     return _dut.get_frame()
 
 
+def capture_stats() -> CaptureStats:
+    """Statistics about the video capture: How many frames were received from
+    the device-under-test, how many were dropped or never looked at by the
+    test script, and how long it took for the test script to see them.
+
+    This is useful for checking whether the test host can keep up with the
+    video, for example when running several tests in parallel on the same
+    host.
+
+    :rtype: stbt.CaptureStats
+
+    Added in v35.
+    """
+    return _dut.capture_stats()
+
+
 # Internal
 # ===========================================================================
 
@@ -374,6 +452,10 @@ class UnconfiguredDeviceUnderTest():
         raise RuntimeError(
             "stbt.get_frame isn't configured to run on your hardware")
 
+    def capture_stats(self, *args, **kwargs):
+        raise RuntimeError(
+            "stbt.capture_stats isn't configured to run on your hardware")
+
 
 _dut: "_stbt.core.DeviceUnderTest | UnconfiguredDeviceUnderTest" = (
     UnconfiguredDeviceUnderTest())
@@ -0,0 +1,48 @@
+#!/usr/bin/python3
+
+"""
+Copyright 2026 stb-tester.com Ltd.
+License: LGPL v2.1 or (at your option) any later version (see
+https://github.com/stb-tester/stb-tester/blob/master/LICENSE for details).
+"""
+
+import argparse
+import os
+import sys
+
+from _stbt import image_store
+
+
+def error(s):
+    sys.stderr.write("stbt precompile-images: error: %s\n" % s)
+    sys.exit(1)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.prog = "stbt precompile-images"
+    parser.description = """Decode all the PNG images in a test-pack into a
+        single file, '%s', that 'stbt run' reads the images from (without
+        decoding them again) as long as the PNG files haven't been modified.
+        Run this again after you check out a different version of your
+        test-pack.""" % image_store.FILENAME
+    parser.add_argument(
+        "--output", metavar="FILE",
+        help="Where to write the store (default: '%s' in DIRECTORY). Images "
+             "are only read from the store if it's in the same directory as "
+             "the image, or a parent directory." % image_store.FILENAME)
+    parser.add_argument(
+        "directory", nargs="?", default=".",
+        help="The root of your test-pack (default: the current directory)")
+    args = parser.parse_args(argv[1:])
+
+    if not os.path.isdir(args.directory):
+        error("%s isn't a directory" % args.directory)
+
+    output = args.output or os.path.join(args.directory, image_store.FILENAME)
+    n, size = image_store.build(args.directory, output)
+    print("Stored %d images (%.1f MiB) in %s" % (n, size / 1024 / 1024, output))
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -14,7 +14,8 @@ import _stbt.core
 from _stbt import imgproc_cache
 from _stbt.config import get_config
 from _stbt.logging import debug, init_logger
-from _stbt.stbt_run import (load_test_function,
+from _stbt.stbt_run import (load_test_function, load_test_list,
+                            run_test_list,
                             sane_unicode_and_exception_handling, video)
 
 
@@ -24,7 +25,18 @@ def main(argv):
     parser.description = 'Run an stb-tester test script'
     add_arguments(parser.add_argument)
     parser.add_argument(
-        'script', metavar='FILE[::TESTCASE]', help=(
+        '--test-list', metavar='FILE', help=(
+            "Run all the tests listed in FILE (one FILE[::TESTCASE] per line, "
+            "or '-' for stdin) one after another in this process, re-using "
+            "the video pipeline, remote control and caches. Each test runs "
+            "in a separate directory under --results-dir, where its "
+            "screenshot, thumbnail and exit-status are saved"))
+    parser.add_argument(
+        '--results-dir', metavar='DIR', default='.', help=(
+            "With --test-list, where to create each test's results directory "
+            "(default: the current directory)"))
+    parser.add_argument(
+        'script', metavar='FILE[::TESTCASE]', nargs='?', help=(
             "The python test script to run. Optionally specify a python "
             "function name to run that function; otherwise only the script's "
             "top-level will be executed."))
@@ -33,14 +45,27 @@ def main(argv):
         help='Additional arguments passed on to the test script (in sys.argv)')
 
     args = parser.parse_args(argv[1:])
+    if (args.script is None) == (args.test_list is None):
+        parser.error("Specify either FILE[::TESTCASE] or --test-list")
     init_logger()
     debug("Arguments:\n" + "\n".join([
         "%s: %s" % (k, v) for k, v in args.__dict__.items()]))
 
+    if args.test_list is not None:
+        scripts = load_test_list(args.test_list)
+        dut = _stbt.core.new_device_under_test_from_config(args)
+        with sane_unicode_and_exception_handling(args.test_list), \
+                imgproc_cache.setup_cache(filename=args.cache,
+                                          memory_only=args.memory_cache_only), \
+                imgproc_cache.enable_caching(args.cache_match):
+            return run_test_list(args, dut, scripts, args.results_dir)
+
     dut = _stbt.core.new_device_under_test_from_config(args)
     with sane_unicode_and_exception_handling(args.script), \
             video(args, dut), \
-            imgproc_cache.setup_cache(filename=args.cache):
+            imgproc_cache.setup_cache(filename=args.cache,
+                                      memory_only=args.memory_cache_only), \
+            imgproc_cache.enable_caching(args.cache_match):
         dut.get_frame()  # wait until pipeline is rolling
         test_function = load_test_function(args.script, args.args)
         test_function.call()
@@ -50,6 +75,16 @@ def add_arguments(add_argument):
     add_argument(
         '--cache', default=imgproc_cache.default_filename,
         help="Path for image-processing cache (default: %(default)s")
+    add_argument(
+        '--memory-cache-only', action='store_true',
+        help="Only cache image-processing results in memory, for the duration "
+             "of the test run; don't read or write the on-disk cache")
+    add_argument(
+        '--cache-match', action='store_true',
+        default=get_config('imgproc_cache', 'cache_match', type_=bool),
+        help="Cache the results of stbt.match (stbt.ocr is always cached). "
+             "Default is 'cache_match' in the [imgproc_cache] section of "
+             "stbt.conf")
     add_argument(
         '--save-screenshot', default='on-failure',
         choices=['always', 'on-failure', 'never'],
@@ -98,12 +133,17 @@ def pytest_sessionstart(session):
     session.dut = dut
     session.video = video(args, dut)
     session.video.__enter__()
-    session.imgproc_cache = imgproc_cache.setup_cache(filename=args.cache)
+    session.imgproc_cache = imgproc_cache.setup_cache(
+        filename=args.cache, memory_only=args.memory_cache_only)
     session.imgproc_cache.__enter__()
+    session.enable_caching = imgproc_cache.enable_caching(
+        args.cache_match)
+    session.enable_caching.__enter__()
     dut.get_frame()  # wait until pipeline is rolling
 
 
 def pytest_sessionfinish(session):
+    session.enable_caching.__exit__(None, None, None)
     session.imgproc_cache.__exit__(None, None, None)
     session.video.__exit__(None, None, None)
 
@@ -0,0 +1,56 @@
+#!/usr/bin/python3
+
+"""Measures the latency of an `imgproc_cache` hit, which is dominated by
+hashing the arguments (`_cache_hash`) when the result is already in the
+in-memory cache. Usage:
+
+    ./tests/run_cache_hash_benchmark.py
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                "..")))
+import stbt_core as stbt
+from _stbt import imgproc_cache
+from _stbt.utils import named_temporary_directory
+sys.path.pop(0)
+
+
+@imgproc_cache.memoize()
+def cached_function(frame, region, lang, config):  # pylint:disable=unused-argument
+    return "hello"
+
+
+def main():
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    frame = stbt.load_image("images/1080p/appletv.png")
+    frame.flags.writeable = False
+    frame = stbt.Frame(frame, time=1234.)
+
+    cases = [
+        ("full frame", stbt.Region.ALL),
+        ("half frame", stbt.Region(x=0, y=0, width=960, height=1080)),
+        ("small crop", stbt.Region(x=150, y=450, right=450, bottom=510)),
+    ]
+
+    print("case,min,avg")
+    with named_temporary_directory() as tmpdir, \
+            imgproc_cache.setup_cache(tmpdir), \
+            imgproc_cache.enable_caching():
+        for name, region in cases:
+            # pylint:disable=cell-var-from-loop
+            def f():
+                # A new view each time, like `_tesseract` gets from `crop`:
+                return cached_function(
+                    stbt.crop(frame, region), region, "eng",
+                    {"tessedit_create_hocr": 1})
+            f()  # Prime the cache
+            times = timeit.repeat(f, number=1, repeat=200)
+            print("%s,%f,%f" % (name, min(times), sum(times) / len(times)))
+
+
+if __name__ == "__main__":
+    main()
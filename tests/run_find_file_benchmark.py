@@ -0,0 +1,48 @@
+#!/usr/bin/python3
+
+"""Measures the per-call overhead of resolving a reference image's filename,
+which dominates `stbt.match` with a small reference image in a small region.
+Usage:
+
+    ./tests/run_find_file_benchmark.py
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                "..")))
+import stbt_core as stbt
+sys.path.pop(0)
+
+
+def nested(depth, f):
+    """Calls `f` `depth` frames further down the stack, like a test that calls
+    `stbt.match` from a helper function or a FrameObject property."""
+    if depth == 0:
+        return f()
+    return nested(depth - 1, f)
+
+
+def main():
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    frame = stbt.load_image("buttons.png")
+    region = stbt.Region(x=153, y=0, right=308, bottom=55)
+
+    print("function,stack_depth,min,avg,max")
+    functions = [
+        ("find_file", lambda: stbt.find_file("button.png")),
+        ("match", lambda: stbt.match("button.png", frame, region=region)),
+    ]
+    for name, f in functions:
+        for depth in [0, 20]:
+            # pylint:disable=cell-var-from-loop
+            times = timeit.repeat(lambda: nested(depth, f),
+                                  number=1, repeat=1000)
+            print("%s,%d,%f,%f,%f" % (name, depth, min(times),
+                                      sum(times) / len(times), max(times)))
+
+
+if __name__ == "__main__":
+    main()
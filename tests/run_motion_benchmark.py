@@ -0,0 +1,55 @@
+#!/usr/bin/python3
+
+"""Measures the per-frame cost of `BGRDiff` on static, changing and noisy
+screens, with and without the early-exit mode that `press_and_wait` uses.
+Usage:
+
+    ./tests/run_motion_benchmark.py
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                "..")))
+import stbt_core as stbt
+from _stbt.motion import DetectMotion
+sys.path.pop(0)
+
+
+def main():
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    frame = stbt.load_image("images/1080p/appletv.png")
+    changed = frame.copy()
+    changed[450:510, 150:450] = 255 - changed[450:510, 150:450]
+    frames = [
+        ("static", frame.copy()),
+        ("changing", changed),
+        # Small differences (below the threshold) everywhere, like the noise
+        # from an analogue capture:
+        ("noisy", frame ^ 1),
+    ]
+
+    print("screen,differ,need_region,min,avg,max")
+    differs = [
+        ("BGRDiff()", stbt.BGRDiff()),
+        ("BGRDiff(min_size=50x50)", stbt.BGRDiff(min_size=(50, 50))),
+    ]
+    for differ_name, differ in differs:
+        for name, f in frames:
+            for need_region in [True, False]:
+                # A new DetectMotion each time, because it updates its
+                # reference frame when it sees motion:
+                # pylint:disable=cell-var-from-loop
+                times = timeit.repeat(
+                    lambda: DetectMotion(
+                        differ, frame, need_region=need_region).diff(f),
+                    number=1, repeat=50)
+                print("%s,%s,%s,%f,%f,%f" % (
+                    name, differ_name, need_region, min(times),
+                    sum(times) / len(times), max(times)))
+
+
+if __name__ == "__main__":
+    main()
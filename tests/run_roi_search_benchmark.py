@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+
+"""Measures how `stbt.match` scales with `[match] roi_search_threads`.
+
+Searches 1080p frames for references cropped out of the frame, so that the
+downsampled pyramid levels find plenty of candidate ROIs for the full-size
+level to search. Usage:
+
+    ./tests/run_roi_search_benchmark.py [threads ...]
+
+`speedup` is relative to `roi_search_threads=1`. `max_speedup` is the
+speedup that Amdahl's law predicts with that many threads if *all* the time
+in `cv2.matchTemplate` were parallelised, so it's an upper bound. Running
+more threads than `os.cpu_count()` can't help, so this needs a multi-core
+machine to show any scaling.
+"""
+
+import os
+import sys
+import timeit
+
+import cv2
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                "..")))
+import stbt_core as stbt
+from _stbt.config import _config_init
+sys.path.pop(0)
+
+
+FRAME = "images/1080p/appletv.png"
+REFERENCES = [
+    # frame, region of the frame to use as the reference image
+    (FRAME, stbt.Region(x=150, y=450, right=450, bottom=510)),
+    (FRAME, stbt.Region(x=900, y=700, right=1020, bottom=740)),
+    (FRAME, stbt.Region(x=60, y=60, right=100, bottom=100)),
+]
+
+
+def main(argv):
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    threads = [int(x) for x in argv[1:]] or sorted(
+        {1, 2, 4, os.cpu_count() or 1})
+
+    print("# os.cpu_count() = %s" % os.cpu_count())
+    print("reference,threads,min,avg,max,speedup,max_speedup")
+    for fname, region in REFERENCES:
+        frame = stbt.load_image(fname)
+        template = stbt.Template(stbt.crop(frame, region))
+        parallel_fraction = _match_template_fraction(template, frame)
+        # pylint:disable=cell-var-from-loop
+        baseline = min(timeit.repeat(
+            lambda: list(stbt.match_all(template, frame)),
+            number=1, repeat=20))
+        for n in threads:
+            _config_init().set("match", "roi_search_threads", str(n))
+            times = timeit.repeat(
+                lambda: list(stbt.match_all(template, frame)),
+                number=1, repeat=20)
+            print("%s %s,%d,%f,%f,%f,%.2f,%.2f" % (
+                os.path.basename(fname), region, n, min(times),
+                sum(times) / len(times), max(times), baseline / min(times),
+                1 / (1 - parallel_fraction + parallel_fraction / n)))
+
+
+def _match_template_fraction(template, frame):
+    """Fraction of `match_all`'s time spent in `cv2.matchTemplate`."""
+    _config_init().set("match", "roi_search_threads", "1")
+    orig = cv2.matchTemplate
+    spent = [0.]
+
+    def match_template(*args, **kwargs):
+        t = timeit.default_timer()
+        try:
+            return orig(*args, **kwargs)
+        finally:
+            spent[0] += timeit.default_timer() - t
+
+    cv2.matchTemplate = match_template
+    try:
+        total = timeit.timeit(lambda: list(stbt.match_all(template, frame)),
+                              number=20)
+    finally:
+        cv2.matchTemplate = orig
+    return spent[0] / total
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,50 @@
+# Run with ./run-tests.sh
+
+fill_cache() {
+    $python - <<-EOF
+	from _stbt import imgproc_cache
+
+	@imgproc_cache.memoize()
+	def f(x):
+	    return x
+
+	with imgproc_cache.setup_cache("$PWD/cache.lmdb"):
+	    with imgproc_cache.enable_caching():
+	        for x in range($1):
+	            f(x)
+	EOF
+}
+
+test_that_stbt_cache_stats_counts_entries() {
+    fill_cache 5 || fail "Failed to fill cache"
+    stbt cache --cache=cache.lmdb stats >stats.log || fail "stbt cache failed"
+    cat stats.log
+    grep -q "^Entries: 5$" stats.log || fail "Wrong number of entries"
+}
+
+test_that_stbt_cache_prune_deletes_old_entries() {
+    fill_cache 5 || fail "Failed to fill cache"
+    stbt cache --cache=cache.lmdb prune --older-than=1h >prune.log ||
+        fail "stbt cache prune failed"
+    cat prune.log
+    grep -q "^Deleted 0 entries$" prune.log || fail "Deleted recent entries"
+
+    sleep 1
+    stbt cache --cache=cache.lmdb prune --older-than=0s >prune.log ||
+        fail "stbt cache prune failed"
+    cat prune.log
+    grep -q "^Deleted 5 entries$" prune.log || fail "Didn't delete entries"
+}
+
+test_that_stbt_cache_clear_deletes_all_entries() {
+    fill_cache 5 || fail "Failed to fill cache"
+    stbt cache --cache=cache.lmdb clear || fail "stbt cache clear failed"
+    stbt cache --cache=cache.lmdb stats >stats.log || fail "stbt cache failed"
+    cat stats.log
+    grep -q "^Entries: 0$" stats.log || fail "Cache wasn't cleared"
+}
+
+test_that_stbt_cache_rejects_invalid_age() {
+    ! stbt cache --cache=cache.lmdb prune --older-than=yesterday ||
+        fail "stbt cache should have failed"
+}
@@ -0,0 +1,46 @@
+# Run with ./run-tests.sh
+
+with_capture_daemon()
+{
+    stbt capture-daemon run --background --socket "$PWD/capture.sock" ||
+        fail "stbt capture-daemon failed to start"
+    trap "stbt capture-daemon stop -f" EXIT
+}
+
+test_that_capture_daemon_configures_stbt_run_to_use_its_video()
+{
+    with_capture_daemon
+    stbt config global.source_pipeline | grep -q "^shmsrc " ||
+        fail "source_pipeline wasn't configured"
+
+    cat > test.py <<-EOF &&
+	import stbt_core as stbt
+	stbt.wait_for_match("$testdir/videotestsrc-redblue.png")
+	EOF
+    stbt run -v test.py &&
+    stbt run -v test.py
+}
+
+test_that_capture_daemon_stop_restores_the_config()
+{
+    local source_pipeline="$(stbt config global.source_pipeline)"
+    with_capture_daemon
+    local pid="$(stbt config global.capture_daemon_pid)"
+    kill -0 "$pid" || fail "setup failed"
+    stbt capture-daemon stop || fail "stop failed"
+    ! kill -0 "$pid" || fail "capture-daemon wasn't killed"
+    [ -z "$(stbt config global.capture_daemon_pid)" ] ||
+        fail "capture_daemon_pid wasn't reset"
+    [ "$(stbt config global.source_pipeline)" = "$source_pipeline" ] ||
+        fail "source_pipeline wasn't restored"
+    [ ! -e capture.sock ] || fail "Socket wasn't removed"
+}
+
+test_that_capture_daemon_fails_with_a_broken_source_pipeline()
+{
+    set_config global.source_pipeline "idontexist"
+    ! stbt capture-daemon run --background --socket "$PWD/capture.sock" ||
+        fail "stbt capture-daemon should have failed"
+    [ -z "$(stbt config global.capture_daemon_pid)" ] ||
+        fail "capture_daemon_pid shouldn't be set"
+}
@@ -0,0 +1,26 @@
+# Run with ./run-tests.sh
+
+test_that_stbt_precompile_images_stores_the_test_packs_images() {
+    mkdir -p test-pack/images test-pack/.git
+    cp "$testdir"/videotestsrc-redblue.png "$testdir"/button.png \
+        test-pack/images/
+    cp "$testdir"/button.png test-pack/.git/
+    stbt precompile-images test-pack >precompile.log ||
+        fail "stbt precompile-images failed"
+    cat precompile.log
+    grep -q "^Stored 2 images (.*) in test-pack/.stbt-images$" precompile.log ||
+        fail "Wrong number of images"
+
+    $python - <<-EOF || fail "Image wasn't read from the store"
+	from unittest import mock
+	import stbt_core as stbt
+	with mock.patch("_stbt.imgutils._imread") as m:
+	    stbt.load_image("$PWD/test-pack/images/button.png")
+	    assert not m.called
+	EOF
+}
+
+test_that_stbt_precompile_images_rejects_missing_directory() {
+    ! stbt precompile-images idontexist ||
+        fail "stbt precompile-images should have failed"
+}
@@ -219,6 +219,28 @@ test_save_video() {
         test.py
 }
 
+test_save_video_with_capture_format_yuv() {
+    cat > record.py <<-EOF &&
+	import time
+	import stbt_core as stbt
+	stbt.draw_text("Test", duration_secs=60)
+	time.sleep(2)
+	EOF
+    set_config frames.capture_format "YUV" &&
+    set_config run.save_video "video.webm" &&
+    stbt run -v record.py &&
+    cat > test.py <<-EOF &&
+	from stbt_core import wait_for_match
+	wait_for_match("$testdir/videotestsrc-redblue.png")
+	wait_for_match("$testdir/draw-text.png")
+	EOF
+    set_config frames.capture_format "BGR" &&
+    set_config run.save_video "" &&
+    $timeout 10 stbt run -v --control none \
+        --source-pipeline 'filesrc location=video.webm' \
+        test.py
+}
+
 test_that_verbosity_level_is_read_from_config_file() {
     set_config global.verbose "2" &&
     touch test.py &&
@@ -376,3 +376,69 @@ test_that_stbt_run_doesnt_import_unrelated_files() {
         fail "test.py was run but I asked for test2.py"
     fi
 }
+
+test_that_stbt_run_runs_a_list_of_tests_in_one_process() {
+    cat > test.py <<-EOF
+	import os
+	import stbt_core as stbt
+	def test_that_passes():
+	    open("pid", "w").write(str(os.getpid()))
+	    stbt.wait_for_match("$testdir/videotestsrc-redblue.png")
+	def test_that_fails():
+	    stbt.wait_for_match(
+	        "$testdir/videotestsrc-redblue-flipped.png", timeout_secs=0)
+	def test_that_errors():
+	    open("pid", "w").write(str(os.getpid()))
+	    raise RuntimeError("Oh no")
+	EOF
+    cat > tests.txt <<-EOF
+	# A comment
+	test.py::test_that_fails
+
+	test.py::test_that_errors
+	test.py::test_that_passes
+	EOF
+    local ret
+    stbt run -v --test-list tests.txt --results-dir results
+    ret=$?
+    [[ $ret == 2 ]] || fail "Unexpected return code $ret"
+    assert_log "FAIL: test.py::test_that_fails: MatchTimeout"
+    assert_log "FAIL: test.py::test_that_errors: RuntimeError: Oh no"
+    assert_log "PASS: test.py::test_that_passes"
+    assert_log "1 passed, 1 failed, 1 errors"
+    [ "$(cat results/3-test.py_test_that_passes/pid)" = \
+      "$(cat results/2-test.py_test_that_errors/pid)" ] ||
+        fail "Tests ran in different processes"
+
+    [ "$(cat results/1-test.py_test_that_fails/exit-status)" = 1 ] &&
+    [ "$(cat results/2-test.py_test_that_errors/exit-status)" = 2 ] &&
+    [ "$(cat results/3-test.py_test_that_passes/exit-status)" = 0 ] ||
+        fail "Wrong exit-status"
+    [ -f results/1-test.py_test_that_fails/screenshot.png ] &&
+    [ -f results/2-test.py_test_that_errors/screenshot.png ] &&
+    ! [ -f results/3-test.py_test_that_passes/screenshot.png ] &&
+    ! [ -f screenshot.png ] || fail "Screenshots not saved per test"
+}
+
+test_that_stbt_run_requires_a_script_or_a_test_list() {
+    echo "test.py" > tests.txt
+    ! stbt run -v || fail "stbt run without a script should have failed"
+    ! stbt run -v --test-list tests.txt test.py ||
+        fail "stbt run with a script and --test-list should have failed"
+}
+
+test_that_stbt_run_saves_full_resolution_screenshot_with_analysis_size() {
+    set_config frames.analysis_size "160x120"
+    cat > test.py <<-EOF
+	import time
+	import stbt_core as stbt
+	assert stbt.get_frame().shape == (120, 160, 3)
+	time.sleep(1)  # Long enough for newer frames to arrive
+	assert False
+	EOF
+    ! stbt run -v test.py &&
+    $python <<-EOF || fail "Screenshot wasn't saved at full resolution"
+	import cv2
+	assert cv2.imread("screenshot.png").shape == (240, 320, 3)
+	EOF
+}
@@ -50,6 +50,41 @@ def test_that_slicing_a_Frame_is_still_a_Frame():
     assert f4.height == 720
 
 
+def test_frame_full_resolution():
+    full = stbt.Frame(numpy.zeros((2160, 3840, 3), dtype=numpy.uint8),
+                      time=1234)
+    f = stbt.Frame(numpy.zeros((720, 1280, 3), dtype=numpy.uint8),
+                   time=1234, _scale=(1 / 3, 1 / 3),
+                   _full_resolution=lambda: full)
+    assert f.full_resolution() is full
+    assert f.full_resolution_region(stbt.Region(10, 20, 100, 50)) == \
+        stbt.Region(30, 60, 300, 150)
+    # Rounded outwards, and clipped to the frame:
+    f2 = stbt.Frame(f, _scale=(0.4, 0.4))
+    assert f2.full_resolution_region(stbt.Region(1, 1, right=3, bottom=3)) \
+        == stbt.Region(2, 2, right=8, bottom=8)
+    assert f2.full_resolution_region(
+        stbt.Region(1200, 700, 200, 200)) == \
+        stbt.Region(3000, 1750, right=3200, bottom=1800)
+    assert f2.full_resolution_region(stbt.Region(2000, 0, 10, 10)) is None
+
+    # A crop keeps the scale but isn't the same image as the full-resolution
+    # frame:
+    f3 = f[10:20, 10:20]
+    assert f3._scale == (1 / 3, 1 / 3)
+    assert f3.full_resolution() is f3
+
+    # The full-resolution frame is no longer available:
+    f4 = stbt.Frame(f, _full_resolution=lambda: None)
+    assert f4.full_resolution() is f4
+
+    # Not scaled:
+    f5 = stbt.Frame(numpy.zeros((720, 1280, 3), dtype=numpy.uint8))
+    assert f5.full_resolution() is f5
+    assert f5.full_resolution_region(stbt.Region(10, 20, 100, 50)) == \
+        stbt.Region(10, 20, 100, 50)
+
+
 def test_that_load_image_looks_in_callers_directory(test_pack_root):  # pylint:disable=unused-argument
     # See also the test with the same name in
     # ./subdirectory/test_load_image_from_subdirectory.py
@@ -148,6 +183,69 @@ def test_load_image_twice():
     assert numpy.all(img == img2)
 
 
+def test_that_load_image_notices_when_file_changes(tmp_path):
+    filename = str(tmp_path / "image.png")
+    cv2.imwrite(filename, numpy.zeros((10, 10, 3), dtype=numpy.uint8))
+    assert stbt.load_image(filename).max() == 0
+
+    cv2.imwrite(filename, numpy.full((10, 10, 3), 255, dtype=numpy.uint8))
+    st = os.stat(filename)
+    os.utime(filename, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000000))
+    assert stbt.load_image(filename).min() == 255
+
+
+def test_load_image_from_image_store(tmp_path):
+    from _stbt import image_store
+    from _stbt.imgutils import _imread
+
+    (tmp_path / "images").mkdir()
+    for f in ["videotestsrc-grayscale.png", "with-alpha-partially-opaque.png",
+              "videotestsrc-full-frame.png"]:
+        shutil.copy(_find_file(f), tmp_path / "images" / f)
+    (tmp_path / "images/not-an-image.png").write_bytes(b"hello")
+    assert image_store.build(str(tmp_path))[0] == 3
+
+    for f in ["videotestsrc-grayscale.png", "with-alpha-partially-opaque.png",
+              "videotestsrc-full-frame.png"]:
+        filename = str(tmp_path / "images" / f)
+        expected = _imread(filename, (3, 4))
+        with mock.patch("_stbt.imgutils._imread") as m:
+            img = stbt.load_image(filename)
+            assert not m.called
+        assert numpy.array_equal(img, expected)
+        assert isinstance(img, stbt.Image)
+        assert img.absolute_filename == filename
+        assert not img.flags.writeable
+
+    # Other color_channels aren't in the store:
+    filename = str(tmp_path / "images/videotestsrc-full-frame.png")
+    assert stbt.load_image(filename, color_channels=(1,)).shape[2] == 1
+
+    # Modified since the store was created:
+    cv2.imwrite(filename, numpy.full((10, 10, 3), 255, dtype=numpy.uint8))
+    st = os.stat(filename)
+    os.utime(filename, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000000))
+    assert stbt.load_image(filename).shape == (10, 10, 3)
+
+
+def test_that_image_cache_is_size_bounded():
+    from _stbt.config import _config_init
+    from _stbt.imgutils import _ImageCache
+
+    _config_init().set("load_image", "cache_size_mb", "1")
+    cache = _ImageCache()
+    for i in range(10):
+        cache.get(i, lambda: numpy.zeros((512, 512), dtype=numpy.uint8))
+    assert len(cache) == 4
+    assert cache.nbytes == 4 * 512 * 512
+
+    # Bigger than the whole cache:
+    big = cache.get(
+        "big", lambda: numpy.zeros((2048, 1024), dtype=numpy.uint8))
+    assert big.shape == (2048, 1024)
+    assert len(cache) == 4
+
+
 def test_that_load_image_with_nonexistent_image_raises_ioerror():
     with pytest.raises(FileNotFoundError,
                        match=r"\[Errno 2\] No such file: 'idontexist.png'"):
@@ -352,6 +450,117 @@ def test_is_screen_black_region_parameter():
         stbt.is_screen_black(frame, mask=region, region=region)
 
 
+def _yuv_frame(filename):
+    """Simulates a frame captured with `capture_format = YUV`."""
+    from _stbt.imgutils import Frame
+    img = stbt.load_image(filename)
+    i420 = cv2.cvtColor(img, cv2.COLOR_BGR2YUV_I420)
+    frame = Frame(cv2.cvtColor(i420, cv2.COLOR_YUV2BGR_I420), time=1234)
+    frame._luma = i420[:frame.height]
+    return frame
+
+
+def test_to_grayscale_with_yuv_frame():
+    from _stbt.imgutils import _to_grayscale
+
+    frame = _yuv_frame("images/1080p/appletv.png")
+    for region in [stbt.Region.ALL, stbt.Region(200, 400, 300, 100)]:
+        expected = cv2.cvtColor(stbt.crop(frame, region), cv2.COLOR_BGR2GRAY)
+        actual = _to_grayscale(frame, region)
+        assert actual.shape == expected.shape
+        # Only saturated colours are different, because of clipping in the
+        # YUV -> BGR conversion:
+        diff = cv2.absdiff(actual, expected)
+        assert numpy.count_nonzero(diff > 1) < diff.size / 100
+
+    # A crop doesn't have the luma plane of the full frame:
+    assert frame[10:20, 10:20]._luma is None
+    assert stbt.Frame(frame)._luma is frame._luma
+
+    assert stbt.is_screen_black(_yuv_frame("almost-black.png"), threshold=3)
+    assert not stbt.is_screen_black(_yuv_frame("almost-black.png"),
+                                    threshold=2)
+
+
+def _lazy_yuv_frame(img, conversions):
+    """Simulates a frame that `get_frame` returns with `capture_format = YUV`.
+    Appends to `conversions` each time it's converted to BGR."""
+    from _stbt.imgutils import _LazyFrame
+    i420 = cv2.cvtColor(img, cv2.COLOR_BGR2YUV_I420)
+    bgr = cv2.cvtColor(i420, cv2.COLOR_YUV2BGR_I420)
+
+    def convert():
+        conversions.append(1)
+        return bgr.copy()
+
+    return _LazyFrame(convert, lambda: i420[:img.shape[0]], img.shape,
+                      time=1234)
+
+
+def test_that_grayscale_operations_dont_convert_yuv_frames(monkeypatch):
+    from _stbt.motion import DetectMotion
+
+    img = stbt.load_image("images/1080p/appletv.png")
+    moved = img.copy()
+    moved[100:200, 100:300] = 255
+    conversions = []
+    black = _lazy_yuv_frame(stbt.load_image("almost-black.png"), conversions)
+    a = _lazy_yuv_frame(img, conversions)
+    b = _lazy_yuv_frame(moved, conversions)
+
+    def fail(*_args, **_kwargs):
+        raise AssertionError("Unexpected call to cv2.cvtColor")
+    monkeypatch.setattr(cv2, "cvtColor", fail)
+
+    assert stbt.is_screen_black(black, threshold=3)
+    assert not stbt.is_screen_black(a)
+
+    detector = DetectMotion(stbt.GrayscaleDiff(), a)
+    result = detector.diff(b)
+    assert result.motion
+    assert result.region.contains(stbt.Region(100, 100, 200, 100))
+    assert not detector.diff(b).motion
+
+    assert a.time == 1234
+    assert a.width == 1920
+    assert a.height == 1080
+    assert a.region == stbt.Region(0, 0, 1920, 1080)
+    assert repr(a) == "<Frame(time=1234.000)>"
+
+    assert conversions == []
+
+
+def test_that_yuv_frames_are_converted_once_when_bgr_pixels_are_needed(
+        tmp_path):
+    img = stbt.load_image("images/1080p/appletv.png")
+    conversions = []
+    frame = _lazy_yuv_frame(img, conversions)
+    expected = frame._frame()  # pylint:disable=protected-access
+    conversions.clear()
+
+    frame = _lazy_yuv_frame(img, conversions)
+    assert isinstance(frame[10:20, 10:20], stbt.Frame)
+    assert numpy.array_equal(frame[10:20, 10:20], expected[10:20, 10:20])
+    assert numpy.array_equal(frame, expected)
+    assert (frame == expected).all()
+    assert frame.mean() == expected.mean()
+    assert numpy.asarray(frame).shape == (1080, 1920, 3)
+
+    f = stbt.Frame(frame)
+    assert isinstance(f, stbt.Frame)
+    assert f.time == 1234
+    assert not f.flags.writeable
+    assert numpy.array_equal(f, expected)
+
+    assert stbt.match(stbt.crop(expected, stbt.Region(200, 400, 300, 100)),
+                      frame=frame)
+    stbt.save_frame(frame, str(tmp_path / "frame.png"))
+    assert numpy.array_equal(stbt.load_image(str(tmp_path / "frame.png")),
+                             expected)
+
+    assert conversions == [1]
+
+
 class C():
     """A class with a single property, used by the tests."""
     def __init__(self, prop):
@@ -528,3 +737,51 @@ def test_that_wait_until_doesnt_compare_return_values(mock_time):
 
 def _find_file(path, root=os.path.dirname(os.path.abspath(__file__))):
     return os.path.join(root, path)
+
+
+def test_that_importing_stbt_core_doesnt_import_opencv():
+    # `import stbt_core` should be fast for tools & unit tests that don't
+    # need image processing. See `__getattr__` in stbt_core/__init__.py.
+    import subprocess
+    out = subprocess.check_output([
+        sys.executable, "-c",
+        "import sys, stbt_core\n"
+        "stbt_core.Region(0, 0, 10, 10)\n"
+        "print(sorted(m for m in ['cv2', 'numpy', '_stbt.match'] "
+        "if m in sys.modules))"],
+        cwd=os.path.join(os.path.dirname(__file__), ".."), text=True)
+    assert out.strip() == "[]"
+
+
+def test_stbt_core_import_time():
+    # Regression test for the time taken by `import stbt_core`, as reported
+    # by `python -X importtime`. It was ~230ms when it imported OpenCV &
+    # numpy eagerly, and is ~60ms without. The threshold is generous to
+    # allow for slow CI machines; take the best of 3 runs to reduce noise.
+    import re
+    import subprocess
+
+    def import_time_us():
+        out = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import stbt_core"],
+            cwd=os.path.join(os.path.dirname(__file__), ".."),
+            capture_output=True, text=True, check=True).stderr
+        m = re.search(r"^import time:\s+\d+ \|\s+(\d+) \| stbt_core$", out,
+                      re.MULTILINE)
+        assert m, out
+        return int(m.group(1))
+
+    best = min(import_time_us() for _ in range(3))
+    print("import stbt_core: %.1fms" % (best / 1000))
+    assert best < 150000
+
+
+def test_that_all_of_stbt_core_can_be_imported():
+    for name in stbt.__all__:
+        assert getattr(stbt, name) is not None, name
+    assert stbt.match is stbt.__dict__["match"]
+    assert "match" in dir(stbt)
+    with pytest.raises(AttributeError):
+        stbt.no_such_thing  # pylint:disable=pointless-statement,no-member
+    with pytest.raises(ImportError):
+        from stbt_core import no_such_thing  # pylint:disable=unused-import,no-name-in-module
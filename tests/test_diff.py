@@ -1,8 +1,13 @@
+import math
+from unittest import mock
+
+import cv2
 import numpy
+import pytest
 
 import stbt_core as stbt
 from _stbt import diff, libstbt
-from _stbt.imgutils import crop
+from _stbt.imgutils import crop, Frame, pixel_bounding_box
 from _stbt.motion import DetectMotion
 
 # Note: BGRDiff is also tested by `test_press_and_wait*`.
@@ -65,7 +70,269 @@ def test_bgrdiff_c_equivalence():
     assert_np_eq(bgrdiff(crop(f1, r), f2, 36), ZEROS[:10, :10])
 
 
+def test_grayscalediff_c_equivalence():
+    rng = numpy.random.default_rng(0)
+    f1 = rng.integers(0, 256, (720, 1280), dtype=numpy.uint8)
+    f1[30:40, 70:80] = 100
+    f1[700, 3] = 0
+    f2 = f1.copy()
+    f2[30:40, 70:80] += rng.integers(0, 60, (10, 10), dtype=numpy.uint8)
+    f2[35, 75] = 160
+    f2[700, 3] = 255
+    mask = numpy.full((720, 1280, 1), 255, dtype=numpy.uint8)
+    mask[690:, :10] = 0
+
+    def graydiff(a, b, threshold, mask=None):
+        n_image, n_region = diff._threshold_diff_gray_numpy(
+            a, b, threshold, mask=mask)
+        c_image, c_region = libstbt.threshold_diff_gray(a, b, threshold, mask)
+        assert_np_eq(n_image, c_image)
+        assert n_region == c_region
+        _, c_region = libstbt.threshold_diff_gray(
+            a, b, threshold, mask, output=False)
+        assert n_region == c_region
+        return c_region
+
+    assert graydiff(f1, f1, 0) is None
+    assert graydiff(f1, f2, 0) == stbt.Region(x=3, y=30, right=80, bottom=701)
+    assert graydiff(f1, f2, 40) == stbt.Region(
+        x=3, y=30, right=80, bottom=701)
+    assert graydiff(f1, f2, 40, mask) == stbt.Region(
+        x=70, y=30, right=80, bottom=40)
+    assert graydiff(f1, f2, 254) == stbt.Region(
+        x=3, y=700, right=4, bottom=701)
+    assert graydiff(f1, f2, 255) is None
+
+    # With cropping (different strides):
+    r = stbt.Region(65, 25, 10, 10)
+    assert graydiff(crop(f1, r), crop(f2, r).copy(), 0) == stbt.Region(
+        x=5, y=5, right=10, bottom=10)
+    assert graydiff(crop(f1, r), crop(f2, r), 0, crop(mask, r)) == \
+        stbt.Region(x=5, y=5, right=10, bottom=10)
+
+    # And the whole GrayscaleDiff, with and without the fast path:
+    frame1 = stbt.load_image("images/diff/xfinity-search-keyboard-1.png")
+    frame2 = stbt.load_image("images/diff/xfinity-search-keyboard-2.png")
+    frame2 = frame2.copy()
+    frame2[300:320, 400:450] = 255 - frame2[300:320, 400:450]
+    for differ in [stbt.GrayscaleDiff(), stbt.GrayscaleDiff(erode=False)]:
+        fast = DetectMotion(differ, frame1).diff(frame2)
+        with mock.patch.object(libstbt, "threshold_diff_gray",
+                               side_effect=NotImplementedError):
+            slow = DetectMotion(differ, frame1).diff(frame2)
+        assert fast.region == slow.region
+        assert fast.motion == slow.motion
+
+
+def test_bgrdiff_bounding_box_c_equivalence():
+    rng = numpy.random.default_rng(0)
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+
+    def bbox(a, b, threshold, mask, erode):
+        d = diff._threshold_diff_bgr_numpy(a, b, threshold)
+        if mask is not None:
+            d &= mask[:, :, 0]
+        if erode:
+            d = cv2.morphologyEx(d, cv2.MORPH_OPEN, kernel)
+        expected = pixel_bounding_box(d)
+        actual = libstbt.threshold_diff_bgr_bounding_box(
+            a, b, threshold, mask, erode)
+        assert actual == expected
+        return actual
+
+    for _ in range(200):
+        h, w = rng.integers(1, 40, 2)
+        a = rng.integers(0, 256, (h, w, 3), dtype=numpy.uint8)
+        # Sparse differences, so that erosion removes some of them:
+        b = numpy.where(rng.random((h, w, 1)) < rng.random(), 255 - a, a)
+        mask = numpy.where(rng.random((h, w, 1)) < 0.9, 255, 0).astype(
+            numpy.uint8)
+        for m in (None, mask):
+            for erode in (True, False):
+                bbox(a, b, 25 ** 2 * 3, m, erode)
+
+    # Differences touching the edges of the frame:
+    a = numpy.zeros((10, 10, 3), dtype=numpy.uint8)
+    b = a.copy()
+    b[0:2, 8:10] = 255
+    assert bbox(a, b, 1, None, True) == stbt.Region(x=8, y=0, right=10,
+                                                    bottom=2)
+    b[9, 0:2] = 255
+    assert bbox(a, b, 1, None, True) == stbt.Region(x=8, y=0, right=10,
+                                                    bottom=2)
+    assert bbox(a, b, 1, None, False) == stbt.Region(x=0, y=0, right=10,
+                                                     bottom=10)
+
+    # With cropping (different strides):
+    a = rng.integers(0, 256, (100, 120, 3), dtype=numpy.uint8)
+    b = a.copy()
+    b[40:50, 30:35] = 255 - b[40:50, 30:35]
+    r = stbt.Region(20, 30, 50, 40)
+    assert bbox(crop(a, r), crop(b, r).copy(), 25 ** 2 * 3, None, True) == \
+        stbt.Region(x=10, y=10, right=15, bottom=20)
+
+    # And the whole BGRDiff, with and without the fast path:
+    frame1 = stbt.load_image("images/diff/xfinity-search-keyboard-1.png")
+    frame2 = stbt.load_image("images/diff/xfinity-search-keyboard-2.png")
+    for differ in [stbt.BGRDiff(), stbt.BGRDiff(erode=False)]:
+        for mask in [stbt.Region.ALL, stbt.Region(x=0, y=0, width=110,
+                                                  height=720)]:
+            fast = DetectMotion(differ, frame1, mask=mask).diff(frame2)
+            with mock.patch.object(libstbt, "threshold_diff_bgr_bounding_box",
+                                   side_effect=NotImplementedError):
+                slow = DetectMotion(differ, frame1, mask=mask).diff(frame2)
+            assert fast.region == slow.region
+            assert fast.motion == slow.motion
+
+
+def test_bgrdiff_early_exit():
+    rng = numpy.random.default_rng(0)
+    for _ in range(200):
+        h, w = rng.integers(1, 40, 2)
+        a = rng.integers(0, 256, (h, w, 3), dtype=numpy.uint8)
+        b = numpy.where(rng.random((h, w, 1)) < rng.random(), 255 - a, a)
+        full = libstbt.threshold_diff_bgr_bounding_box(a, b, 25 ** 2 * 3)
+        for stop_size in [(1, 1), (3, 2), (10, 10), (w, h)]:
+            early = libstbt.threshold_diff_bgr_bounding_box(
+                a, b, 25 ** 2 * 3, stop_size=stop_size)
+            if full is None:
+                assert early is None
+                continue
+            # We only found some of the differences, but they're big enough:
+            assert early is not None
+            assert full.contains(early)
+            assert (early.width >= stop_size[0] and
+                    early.height >= stop_size[1]) == \
+                (full.width >= stop_size[0] and full.height >= stop_size[1])
+            if early != full:
+                assert early.width >= stop_size[0]
+                assert early.height >= stop_size[1]
+
+    frame1 = stbt.load_image("images/diff/xfinity-search-keyboard-1.png")
+    frame2 = stbt.load_image("images/diff/xfinity-search-keyboard-2.png")
+    for differ in [stbt.BGRDiff(), stbt.BGRDiff(erode=False),
+                   stbt.BGRDiff(min_size=(20, 10)),
+                   stbt.BGRDiff(min_size=(50, 50))]:
+        full = DetectMotion(differ, frame1).diff(frame2)
+        early = DetectMotion(differ, frame1, need_region=False).diff(frame2)
+        assert early.motion == full.motion
+        if full.region is None:
+            assert early.region is None
+        else:
+            assert full.region.contains(early.region)
+
+
+def test_changed_bounding_box():
+    rng = numpy.random.default_rng(0)
+    for _ in range(1000):
+        h, w = rng.integers(1, 100, 2)
+        shape = (h, w, 3) if rng.random() < 0.5 else (h, w)
+        a = rng.integers(0, 256, shape, dtype=numpy.uint8)
+        b = a.copy()
+        for _ in range(rng.integers(0, 4)):
+            y, x = rng.integers(0, h), rng.integers(0, w)
+            b[y, x] ^= 1
+        changed = a != b
+        if changed.ndim == 3:
+            changed = changed.any(axis=2)
+        expected = pixel_bounding_box(changed.astype(numpy.uint8))
+        if expected is not None:
+            # Rounded outwards to 32-pixel tiles horizontally:
+            expected = stbt.Region(
+                x=expected.x // 32 * 32, y=expected.y,
+                right=min(w, (expected.right + 31) // 32 * 32),
+                bottom=expected.bottom)
+        assert libstbt.changed_bounding_box(a, b) == expected
+
+
+def test_diff_changed_area_equivalence():
+    rng = numpy.random.default_rng(0)
+    frame1 = stbt.load_image("images/1080p/appletv.png")
+    differs = [
+        stbt.BGRDiff(), stbt.BGRDiff(erode=False), stbt.BGRDiff(threshold=0),
+        stbt.BGRDiff(erode=numpy.ones((5, 5), dtype=numpy.uint8)),
+        stbt.BGRDiff(scale=0.5),
+        stbt.GrayscaleDiff(), stbt.GrayscaleDiff(erode=False),
+        stbt.GrayscaleDiff(erode=numpy.ones((5, 5), dtype=numpy.uint8)),
+    ]
+    frames = [frame1.copy()]
+    for _ in range(20):
+        f = frame1.copy()
+        for _ in range(rng.integers(1, 4)):
+            x, y = rng.integers(0, 1900), rng.integers(0, 1060)
+            w, h = rng.integers(1, 20, 2)
+            f[y:y + h, x:x + w] = rng.integers(0, 256, 3)
+        frames.append(f)
+
+    for differ in differs:
+        for mask in [stbt.Region.ALL, ~stbt.Region(x=0, y=0, width=300,
+                                                   height=1080)]:
+            for f in frames:
+                fast = DetectMotion(differ, frame1, mask).diff(f)
+                with mock.patch.object(libstbt, "changed_bounding_box",
+                                       side_effect=NotImplementedError):
+                    slow = DetectMotion(differ, frame1, mask).diff(f)
+                assert fast.region == slow.region
+                assert fast.motion == slow.motion
+
+
+def test_diff_scale():
+    frame1 = stbt.load_image("images/1080p/appletv.png")
+    frame2 = frame1.copy()
+    frame2[451:509, 151:449] = 255 - frame2[451:509, 151:449]
+
+    for differ in [stbt.BGRDiff(), stbt.GrayscaleDiff(threshold=0.95)]:
+        for scale in [1, 0.5, 0.25, 0.3]:
+            d = differ.replace(scale=scale)
+            for mask, expected in [
+                    (stbt.Region.ALL,
+                     stbt.Region(x=151, y=451, right=449, bottom=509)),
+                    (stbt.Region(x=100, y=400, right=400, bottom=600),
+                     stbt.Region(x=151, y=451, right=400, bottom=509)),
+                    (~stbt.Region(x=0, y=0, width=300, height=1080),
+                     stbt.Region(x=300, y=451, right=449, bottom=509))]:
+                result = DetectMotion(d, frame1, mask).diff(frame2)
+                assert result.motion
+                # Regions are in full-size frame coordinates, accurate to
+                # ~1 pixel of the downsampled frame:
+                slack = math.ceil(1 / scale)
+                assert result.region.extend(
+                    x=-slack, y=-slack, right=slack, bottom=slack).contains(
+                        expected)
+                assert expected.extend(
+                    x=-slack, y=-slack, right=slack, bottom=slack).contains(
+                        result.region)
+
+                assert not DetectMotion(d.replace(min_size=(310, 70)), frame1,
+                                        mask).diff(frame2)
+                early = DetectMotion(d.replace(min_size=(200, 50)), frame1,
+                                     mask, need_region=False).diff(frame2)
+                assert early.motion == (expected.width >= 200)
+
+    with pytest.raises(ValueError):
+        stbt.BGRDiff(scale=0)
+    with pytest.raises(ValueError):
+        stbt.GrayscaleDiff(scale=2)
+
+
 def assert_np_eq(a, b):
     assert a.dtype == b.dtype
     assert a.shape == b.shape
     assert numpy.all(a == b)
+
+
+def test_grayscalediff_with_yuv_frame():
+    def yuv_frame(img):
+        i420 = cv2.cvtColor(img, cv2.COLOR_BGR2YUV_I420)
+        f = Frame(cv2.cvtColor(i420, cv2.COLOR_YUV2BGR_I420))
+        f._luma = i420[:f.shape[0]]
+        return f
+
+    a = stbt.load_image("images/1080p/appletv.png")
+    b = a.copy()
+    b[450:510, 150:450] = 255 - b[450:510, 150:450]
+    for differ in [stbt.GrayscaleDiff(), stbt.GrayscaleDiff(scale=0.5)]:
+        expected = DetectMotion(differ, Frame(a)).diff(Frame(b))
+        actual = DetectMotion(differ, yuv_frame(a)).diff(yuv_frame(b))
+        assert expected.motion and actual.motion
+        assert actual.region == expected.region
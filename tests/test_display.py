@@ -0,0 +1,41 @@
+import time
+
+from _stbt.core import Display, NoSinkPipeline
+
+
+def test_full_resolution_frame_is_kept_for_the_last_used_frames():
+    display = Display(
+        "videotestsrc is-live=true ! "
+        "video/x-raw,format=I420,width=640,height=480,framerate=30/1",
+        NoSinkPipeline(), analysis_size=(320, 240))
+    with display:
+        frames = [display.get_frame()]
+        for _ in range(2):
+            frames.append(display.get_frame(since=frames[-1].time))
+        for f in frames:
+            assert f.shape == (240, 320, 3)
+            assert f._scale == (0.5, 0.5)
+
+        # Long enough for `Display` to discard the full-resolution samples of
+        # the frames it hasn't handed to the test script (see
+        # `Display._full_res_samples`):
+        time.sleep(0.5)
+
+        # The last 2 frames that the test script used are pinned:
+        for f in frames[1:]:
+            full = f.full_resolution()
+            assert full.shape == (480, 640, 3)
+            assert full.time == f.time
+            assert not full.flags.writeable
+            assert f.full_resolution() is full  # Cached
+
+        # Older frames are returned at the analysis resolution:
+        assert frames[0].full_resolution() is frames[0]
+
+        # A frame that wasn't handed to the test script by `get_frame` isn't
+        # pinned:
+        time.sleep(0.1)
+        unused = display.last_frame
+        assert unused.time > frames[-1].time
+        time.sleep(0.5)
+        assert unused.full_resolution() is unused
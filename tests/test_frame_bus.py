@@ -0,0 +1,178 @@
+import threading
+import time
+
+import numpy
+import pytest
+
+from _stbt.core import _CaptureStatsRecorder, FrameBus
+from _stbt.imgutils import Frame
+from _stbt.types import NoVideo
+
+
+def _frame(t):
+    f = Frame(numpy.zeros((2, 2, 3), dtype=numpy.uint8), time=t)
+    f.flags.writeable = False
+    return f
+
+
+def test_that_every_subscriber_gets_every_frame():
+    bus = FrameBus()
+    with bus.subscribe(10) as a, bus.subscribe(10) as b:
+        frames = [_frame(t) for t in range(5)]
+        for f in frames:
+            bus.publish(f)
+        for s in [a, b]:
+            received = [s.get(timeout_secs=0) for _ in range(5)]
+            # Zero-copy: Every subscriber gets the same object.
+            assert all(x is y for x, y in zip(received, frames))
+            assert s.received == 5
+            assert s.dropped == 0
+
+
+def test_that_slow_subscriber_drops_oldest_frames():
+    bus = FrameBus()
+    with bus.subscribe(2) as slow, bus.subscribe(10) as fast:
+        for t in range(5):
+            bus.publish(_frame(t))
+        assert [slow.get(0).time, slow.get(0).time] == [3, 4]
+        assert slow.dropped == 3
+        assert [fast.get(0).time for _ in range(5)] == [0, 1, 2, 3, 4]
+        assert fast.dropped == 0
+
+
+def test_that_unsubscribed_subscribers_dont_receive_frames():
+    bus = FrameBus()
+    s = bus.subscribe()
+    s.close()
+    bus.publish(_frame(0))
+    assert s.received == 0
+    with pytest.raises(NoVideo):
+        s.get(timeout_secs=0)
+
+
+def test_that_get_waits_for_next_frame():
+    bus = FrameBus()
+    with bus.subscribe() as s:
+        t = threading.Timer(0.1, lambda: bus.publish(_frame(1)))
+        t.start()
+        try:
+            assert s.get(timeout_secs=10).time == 1
+        finally:
+            t.join()
+
+
+def test_that_errors_are_raised_after_buffered_frames():
+    bus = FrameBus()
+    with bus.subscribe(10) as s:
+        bus.publish(_frame(0))
+        bus.publish(NoVideo("EOS from source pipeline"))
+        assert s.get(0).time == 0
+        with pytest.raises(NoVideo, match="EOS"):
+            s.get(0)
+
+        bus.publish(_frame(1))
+        assert s.get(0).time == 1
+
+
+def test_that_buffer_size_must_be_positive():
+    with pytest.raises(ValueError):
+        FrameBus().subscribe(0)
+
+
+def test_frame_bus_timeout():
+    with FrameBus().subscribe() as s:
+        start = time.time()
+        with pytest.raises(NoVideo, match="No frames received"):
+            s.get(timeout_secs=0.1)
+        assert time.time() - start >= 0.1
+
+
+class _FakeDisplay():
+    def __init__(self):
+        self.frame_bus = FrameBus()
+        self.capture_stats = _CaptureStatsRecorder()
+        self.last_frame = _frame(0)
+        self.last_used_frame = None
+
+    def get_frame(self, timeout_secs=10, since=None):  # pylint:disable=unused-argument
+        self.last_used_frame = self.last_frame
+        return self.last_frame
+
+    def publish(self, f):
+        self.last_frame = f
+        self.frame_bus.publish(f)
+
+
+def test_that_concurrent_frames_iterators_see_the_same_frames():
+    from _stbt.config import _config_init
+    from _stbt.core import DeviceUnderTest
+
+    _config_init().set("frames", "buffer_size", "100")
+    display = _FakeDisplay()
+    dut = DeviceUnderTest(display=display)
+    a = dut.frames()
+    b = dut.frames()
+    assert next(a).time == 0
+    assert next(b).time == 0
+    for t in range(1, 6):
+        display.publish(_frame(t))
+    assert [next(a).time for _ in range(5)] == [1, 2, 3, 4, 5]
+    assert [next(b).time for _ in range(5)] == [1, 2, 3, 4, 5]
+
+
+def test_capture_stats():
+    stats = _CaptureStatsRecorder()
+    s = stats.get()
+    assert s.frames_received == 0
+    assert s.latency_p50 is None
+    assert s.pull_max is None
+
+    for t in range(10):
+        stats.on_received(pull_secs=0.001 * t)
+    stats.on_dropped()
+    frames = [_frame(t) for t in range(10)]
+    stats.on_consumed(frames[2], now=2.5)
+    stats.on_consumed(frames[2], now=2.6)  # Same frame, another consumer
+    stats.on_consumed(frames[9], now=10.)
+    # A lagging consumer (`buffer_size` > 1) gets older frames after newer
+    # ones have been seen:
+    stats.on_consumed(frames[1], now=10.1)
+    stats.on_consumed(frames[2], now=10.2)
+
+    s = stats.get()
+    assert s.frames_received == 10
+    assert s.frames_dropped == 1
+    assert s.frames_consumed == 3
+    assert s.frames_skipped == 7
+    assert s.latency_p50 == pytest.approx(1.)
+    assert s.latency_max == pytest.approx(9.1)
+    assert s.pull_p50 == pytest.approx(0.0045)
+    assert s.pull_max == pytest.approx(0.009)
+
+
+def test_that_frames_iterator_records_consumed_frames():
+    from _stbt.core import DeviceUnderTest
+
+    display = _FakeDisplay()
+    dut = DeviceUnderTest(display=display)
+    frames = dut.frames()
+    next(frames)
+    display.publish(_frame(1))
+    next(frames)
+    assert dut.capture_stats().frames_consumed == 1
+
+
+def test_that_frames_iterator_records_last_used_frame():
+    # `stbt run` saves `last_used_frame` as the screenshot if the test fails,
+    # so it should be the last frame that `wait_for_match` etc. looked at.
+    from _stbt.core import DeviceUnderTest
+
+    display = _FakeDisplay()
+    dut = DeviceUnderTest(display=display)
+    frames = dut.frames()
+    assert next(frames).time == 0
+    assert display.last_used_frame.time == 0
+    for t in range(1, 3):
+        display.publish(_frame(t))
+        assert next(frames).time == t
+        assert display.last_used_frame.time == t
@@ -1,7 +1,9 @@
+import gc
 import os
 import random
 import re
 import timeit
+import weakref
 
 import cv2
 import numpy
@@ -524,6 +526,182 @@ def test_that_match_fast_path_is_equivalent():
             assert orig_m.image == fast_m.image
 
 
+@pytest.mark.parametrize("region", [
+    stbt.Region.ALL,
+    stbt.Region(x=0, y=200, right=400, bottom=300),
+])
+def test_that_match_many_is_equivalent_to_match(region):
+    frame = stbt.load_image("buttons-on-blue-background.png")
+    images = [
+        "button-transparent.png",
+        "button.png",
+        "completely-transparent.png",
+        black(10, 10),
+    ]
+    results = stbt.match_many(images, frame=frame, region=region)
+    assert len(results) == len(images)
+    for image, many in zip(images, results):
+        single = stbt.match(image, frame=frame, region=region)
+        assert many.match == single.match
+        assert many.region == single.region
+        assert many.first_pass_result == single.first_pass_result
+        assert (many.frame == single.frame).all()
+        assert (many.image == single.image).all()
+
+
+def test_that_match_reuses_pyramid_of_read_only_frame(monkeypatch):
+    from _stbt import match as match_module
+    match_module._pyramid_cache.clear()
+    calls = []
+    orig_build_pyramid = match_module._build_pyramid
+
+    def _build_pyramid(image, levels, **kwargs):
+        if not kwargs:
+            calls.append(image.shape)
+        return orig_build_pyramid(image, levels, **kwargs)
+
+    monkeypatch.setattr(match_module, "_build_pyramid", _build_pyramid)
+
+    frame = stbt.load_image("buttons-on-blue-background.png")
+    assert not frame.flags.writeable
+    for _ in range(3):
+        assert stbt.match("button-transparent.png", frame=frame)
+    assert len(calls) == 1
+    list(stbt.match_all("button-transparent.png", frame=frame))
+    assert len(calls) == 1
+
+    # Different region, so different pyramid:
+    stbt.match("button-transparent.png", frame=frame,
+               region=stbt.Region(0, 0, 400, 300))
+    assert len(calls) == 2
+
+    # Writeable frames could be modified between calls so we don't cache them:
+    writeable = frame.copy()
+    stbt.match("button-transparent.png", frame=writeable)
+    stbt.match("button-transparent.png", frame=writeable)
+    assert len(calls) == 4
+
+
+def test_that_pyramid_cache_doesnt_keep_frames_alive():
+    from _stbt import match as match_module
+    match_module._pyramid_cache.clear()
+
+    def read_only_frame():
+        f = stbt.load_image("buttons-on-blue-background.png").copy()
+        f.flags.writeable = False
+        return f
+
+    frame = read_only_frame()
+    assert stbt.match("button-transparent.png", frame=frame)
+    assert len(match_module._pyramid_cache) == 1
+    ref = weakref.ref(frame)
+    del frame
+    gc.collect()
+    assert ref() is None
+
+    frame = read_only_frame()
+    assert stbt.match("button-transparent.png", frame=frame)
+    assert len(match_module._pyramid_cache) == 1
+
+
+def test_that_match_sees_modifications_to_writeable_frame():
+    frame = stbt.load_image("buttons-on-blue-background.png").copy()
+    assert stbt.match("button-transparent.png", frame=frame)
+    frame[:] = 0
+    assert not stbt.match("button-transparent.png", frame=frame)
+
+
+@pytest.mark.parametrize("image", [
+    "button-transparent.png",
+    "button.png",
+    "completely-transparent.png",
+])
+def test_that_match_with_template_is_equivalent_to_match(image):
+    frame = stbt.load_image("buttons-on-blue-background.png")
+    template = stbt.Template(image)
+    assert template.image.filename == image
+    single = stbt.match(image, frame=frame)
+    compiled = stbt.match(template, frame=frame)
+    assert compiled.match == single.match
+    assert compiled.region == single.region
+    assert compiled.first_pass_result == single.first_pass_result
+    assert compiled.image.filename == image
+    assert (compiled.image == single.image).all()
+
+    assert ([m.region for m in stbt.match_all(template, frame=frame)] ==
+            [m.region for m in stbt.match_all(image, frame=frame)])
+    assert [m.region for m in stbt.match_many([template], frame=frame)] == [
+        single.region]
+
+
+def test_that_match_reuses_template_pyramid(monkeypatch):
+    from _stbt import match as match_module
+    calls = []
+    orig_build_pyramid = match_module._build_pyramid
+
+    def _build_pyramid(image, levels, **kwargs):
+        if kwargs.get("is_template"):
+            calls.append(image.shape)
+        return orig_build_pyramid(image, levels, **kwargs)
+
+    monkeypatch.setattr(match_module, "_build_pyramid", _build_pyramid)
+
+    frame = stbt.load_image("buttons-on-blue-background.png")
+    template = stbt.Template(black(10, 10))
+    assert len(calls) == 1
+    for _ in range(3):
+        stbt.match(template, frame=frame)
+    assert len(calls) == 1
+
+    # Templates loaded from a file are cached:
+    for _ in range(3):
+        stbt.match("button-partly-transparent.png", frame=frame)
+    assert len(calls) <= 2
+
+
+@pytest.mark.parametrize("frame,image", [
+    ("images/performance/18-redundant-regions-frame.png",
+     "images/performance/18-redundant-regions-reference.png"),
+    ("images/performance/lots-of-text-frame.png",
+     "images/performance/lots-of-text-reference.png"),
+    ("buttons-on-blue-background.png", "button-transparent.png"),
+])
+def test_that_roi_search_threads_gives_the_same_result(frame, image):
+    from _stbt.config import _config_init
+    frame = stbt.load_image(frame)
+    expected = list(stbt.match_all(image, frame=frame))
+    _config_init().set("match", "roi_search_threads", "4")
+    actual = list(stbt.match_all(image, frame=frame))
+    assert [(m.match, m.region, m.first_pass_result) for m in actual] == [
+        (m.match, m.region, m.first_pass_result) for m in expected]
+
+
+def test_that_negative_roi_search_threads_raises():
+    from _stbt.config import _config_init
+    _config_init().set("match", "roi_search_threads", "-1")
+    frame = stbt.load_image("buttons-on-blue-background.png")
+    with pytest.raises(stbt.ConfigurationError):
+        stbt.match("button-transparent.png", frame=frame)
+
+    # Nearly the same size as the frame, so there's only 1 ROI to search:
+    frame = stbt.load_image("button.png")
+    image = stbt.crop(frame, stbt.Region(0, 0, frame.width - 1,
+                                         frame.height - 1))
+    with pytest.raises(stbt.ConfigurationError):
+        stbt.match(image, frame=frame)
+
+
+def test_that_old_roi_search_executor_still_works_after_config_change():
+    from _stbt.config import _config_init
+    from _stbt.match import _roi_search_executor
+    _config_init().set("match", "roi_search_threads", "2")
+    old = _roi_search_executor()
+    _config_init().set("match", "roi_search_threads", "3")
+    assert _roi_search_executor() is not old
+    # Another thread could still be using the old one:
+    assert old.submit(lambda: 1).result() == 1
+
+
 def test_merge_regions():
     regions = [stbt.Region(*x) for x in [
         (153, 156, 16, 4), (121, 155, 25, 5), (14, 117, 131, 32),
@@ -292,6 +292,46 @@ def test_that_text_location_is_recognised():
         test(text, region, False)
 
 
+@requires_tesseract
+def test_ocr_many():
+    frame = load_image("ocr/menu.png")
+    texts, regions, _ = zip(*iterate_menu())
+    assert stbt.ocr_many(frame, regions) == list(texts)
+    assert stbt.ocr_many(frame, []) == []
+    with pytest.raises(ValueError):
+        stbt.ocr_many(frame, regions, mode=stbt.OcrMode.SINGLE_LINE)
+
+
+def test_ocr_many_splits_hocr_by_region():
+    from _stbt.ocr import _hocr_split, _stack_regions
+
+    frame = load_image("ocr/menu.png")
+    composite, strips = _stack_regions(
+        frame, [stbt.Region(0, 0, 100, 20), stbt.Region(0, 0, 50, 40)])
+    assert composite.shape == (100, 120, 3)
+    assert strips == [(0, 40), (40, 100)]
+
+    def word(text, y):
+        return ("<span class='ocrx_word' title='bbox 10 %d 50 %d'>%s</span>"
+                % (y, y + 10, text))
+
+    xml = (
+        "<html xmlns='http://www.w3.org/1999/xhtml'><body>"
+        "<div class='ocr_page'>"
+        "<p class='ocr_par'>"
+        "<span class='ocr_line'>%s %s</span>"
+        "<span class='ocr_line'>%s</span>"
+        "<span class='ocr_line'>%s</span>"
+        "</p>"
+        "<p class='ocr_par'><span class='ocr_line'>%s</span></p>"
+        "</div></body></html>" % (
+            word("Kerala", 10), word("Prawn", 10), word("Curry", 30),
+            word("Jerk", 55), word("Chicken", 80)))
+    assert _hocr_split(xml, strips) == ["Kerala Prawn\nCurry",
+                                        "Jerk\n\nChicken"]
+    assert _hocr_split("", strips) == ["", ""]
+
+
 @requires_tesseract
 def test_upsample_default_value():
     image = load_image("ocr/Operacja Napoleon.png")
@@ -448,6 +488,60 @@ def test_that_ocr_engine_has_an_effect():
         assert "sillyness" in stbt.ocr(f)
 
 
+def _have_libtesseract():
+    from _stbt import libtesseract
+    try:
+        libtesseract.version()
+        return True
+    except ImportError:
+        return False
+
+
+# Unlike `requires_tesseract` this mustn't raise `SkipTest` at import time,
+# because that would skip every test in this file.
+requires_libtesseract = pytest.mark.skipif(
+    not _have_libtesseract(), reason="libtesseract isn't installed")
+
+
+@requires_tesseract
+@requires_libtesseract
+@pytest.mark.parametrize("image,kwargs", [
+    # pylint: disable=line-too-long
+    ("Connection-status--white-on-dark-blue.png", {}),
+    ("Connection-status--white-on-dark-blue.png", {"region": stbt.Region(x=210, y=0, width=120, height=40)}),
+    ("UJJM--white-text-on-gray-boxes.png", {"mode": stbt.OcrMode.SINGLE_LINE}),
+    ("unicode.png", {"lang": "eng+deu"}),
+    ("unicode.png", {"tesseract_user_words": ["Röthlisberger"]}),
+    ("small.png", {"char_whitelist": "0123456789"}),
+    ("small.png", {"upsample": False}),
+])
+def test_that_libtesseract_backend_gives_the_same_results(image, kwargs):
+    f = load_image("ocr/" + image)
+    expected = stbt.ocr(f, **kwargs)
+    with temporary_config({"ocr.backend": "libtesseract"}):
+        assert stbt.ocr(f, **kwargs) == expected
+        # And again, with an already-initialised instance:
+        assert stbt.ocr(f, **kwargs) == expected
+
+
+@requires_tesseract
+@requires_libtesseract
+def test_match_text_with_libtesseract_backend():
+    f = load_image("ocr/menu.png")
+    expected = stbt.match_text("Onion Bhaji", f)
+    with temporary_config({"ocr.backend": "libtesseract"}):
+        result = stbt.match_text("Onion Bhaji", f)
+    assert result.match == expected.match
+    assert result.region == expected.region
+
+
+@requires_tesseract
+def test_that_invalid_ocr_backend_raises():
+    with temporary_config({"ocr.backend": "carrier-pigeon"}):
+        with pytest.raises(stbt.ConfigurationError):
+            stbt.ocr(load_image("ocr/small.png"))
+
+
 @requires_tesseract
 def test_that_cache_speeds_up_ocr():
     with named_temporary_directory() as tmpdir, \
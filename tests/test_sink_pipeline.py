@@ -0,0 +1,39 @@
+import cv2
+import numpy
+import pytest
+
+from _stbt.core import _draw_annotation, _draw_text, _YUVImage
+from _stbt.logging import _Annotation
+from _stbt.types import Region
+
+
+@pytest.mark.parametrize("fmt", ["I420", "NV12"])
+def test_that_annotations_drawn_on_yuv_look_the_same_as_on_bgr(fmt):
+    width, height = 640, 360
+    bgr = numpy.full((height, width, 3), (40, 120, 200), dtype=numpy.uint8)
+    i420 = cv2.cvtColor(bgr, cv2.COLOR_BGR2YUV_I420)
+    y = i420[:height]
+    u, v = i420[height:].reshape(2, height // 2, width // 2)
+    if fmt == "I420":
+        yuv = _YUVImage((y, u, v))
+    else:
+        yuv = _YUVImage((y, numpy.dstack([u, v])))
+
+    annotation = _Annotation(time=0, region=Region(100, 100, 200, 100),
+                             label="label", colour=(0, 255, 0))
+    for img in [bgr, yuv]:
+        _draw_text(img, "12:34:56.78", (10, 30), (255, 255, 255))
+        _draw_annotation(img, annotation)
+
+    if fmt == "I420":
+        out = cv2.cvtColor(numpy.concatenate([y, u, v], axis=None)
+                           .reshape(height * 3 // 2, width),
+                           cv2.COLOR_YUV2BGR_I420)
+    else:
+        out = cv2.cvtColorTwoPlane(yuv.luma, yuv.chroma[0],
+                                   cv2.COLOR_YUV2BGR_NV12)
+    # Only differs at the edges of the annotations because of the chroma
+    # subsampling:
+    diff = cv2.absdiff(out, bgr)
+    assert numpy.percentile(diff, 99) <= 2
+    assert diff.mean() < 1
@@ -4,6 +4,7 @@ import pytest
 from numpy import isclose
 
 import stbt_core as stbt
+from _stbt.config import _config_init
 from _stbt.logging import scoped_debug_level
 from _stbt.transition import Transition
 from _stbt.types import Keypress
@@ -103,6 +104,22 @@ def test_press_and_wait(global_differ, min_size):
     assert transition.frame.max() == 0
 
 
+@pytest.mark.parametrize("scale", ["0.5", "0.25"])
+def test_press_and_wait_scale(global_differ, scale):
+    _config_init().set("press_and_wait", "scale", scale)
+    _stbt = FakeDeviceUnderTest()
+    for min_size in [None, (20, 20)]:
+        transition = stbt.press_and_wait("white", min_size=min_size,
+                                         stable_secs=0.1, _dut=_stbt)
+        assert transition.status == stbt.TransitionStatus.COMPLETE
+        assert transition.frame.min() == 255
+
+        transition = stbt.press_and_wait("ball", min_size=min_size,
+                                         timeout_secs=0.2, stable_secs=0.1,
+                                         _dut=_stbt)
+        assert transition.status == stbt.TransitionStatus.STABLE_TIMEOUT
+
+
 @pytest.mark.parametrize("min_size", [None, (20, 20)])
 def test_press_and_wait_start_timeout(global_differ, min_size):
     transition = stbt.press_and_wait("black", min_size=min_size,